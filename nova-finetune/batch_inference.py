@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+"""
+Bedrock batch inference (model invocation jobs) for large test sets.
+
+The test split is written straight to a model-invocation-job input JSONL
+(one {"recordId", "modelInput"} record per sample), uploaded, submitted and
+polled; the job's .out records are then stream-parsed back into the result
+format used by NovaProTester.
+
+Service interactions sit behind BatchBackend. BedrockBatchBackend talks to S3
+and the bedrock control plane; LocalBatchBackend runs the same job contract
+against a local directory and any client with converse(), for offline runs.
+"""
+
+import json
+import shutil
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+BATCH_POLL_SECONDS = 60
+BATCH_MIN_RECORDS = 100  # Bedrock's minimum records per job
+TERMINAL_JOB_STATUSES = ("Completed", "PartiallyCompleted", "Failed", "Stopped", "Expired")
+
+# Converse inferenceConfig key -> Nova invoke-model (messages-v1) inferenceConfig key
+INFERENCE_CONFIG_KEYS = {
+    "maxTokens": "max_new_tokens",
+    "topP": "top_p",
+    "temperature": "temperature",
+    "stopSequences": "stopSequences",
+}
+
+
+def split_s3_uri(uri: str) -> Tuple[str, str]:
+    """Split s3://bucket/key into (bucket, key)."""
+    if not uri.startswith("s3://"):
+        raise ValueError(f"Not an S3 URI: {uri}")
+    bucket, _, key = uri[5:].partition('/')
+    return bucket, key
+
+
+def converse_to_model_input(request: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Convert converse() keyword arguments to a Nova invoke-model body.
+
+    The inference parameters are renamed from the Converse spelling
+    (maxTokens, topP) to the invoke-model one (max_new_tokens, top_p).
+
+    Args:
+        request: Request built by NovaProTester.build_converse_request
+
+    Returns:
+        modelInput for a batch record
+    """
+    return {
+        "schemaVersion": "messages-v1",
+        "system": request["system"],
+        "messages": request["messages"],
+        "inferenceConfig": {INFERENCE_CONFIG_KEYS.get(key, key): value
+                            for key, value in request["inferenceConfig"].items()}
+    }
+
+
+def model_input_to_converse(model_id: str, model_input: Dict[str, Any]) -> Dict[str, Any]:
+    """Convert a Nova invoke-model body back to converse() keyword arguments."""
+    converse_keys = {value: key for key, value in INFERENCE_CONFIG_KEYS.items()}
+    return {
+        "modelId": model_id,
+        "messages": model_input["messages"],
+        "system": model_input.get("system", []),
+        "inferenceConfig": {converse_keys.get(key, key): value
+                            for key, value in model_input.get("inferenceConfig", {}).items()}
+    }
+
+
+class BatchBackend(ABC):
+    """Interface to a batch inference service."""
+
+    @abstractmethod
+    def upload_input(self, local_path: Path, input_uri: str):
+        """Upload the job input file to input_uri."""
+
+    @abstractmethod
+    def submit_job(self, job_name: str, model_id: str, input_uri: str, output_uri: str) -> str:
+        """Submit a job and return its identifier."""
+
+    @abstractmethod
+    def get_job_status(self, job_id: str) -> Tuple[str, Optional[str]]:
+        """Return (status, message) of a job."""
+
+    @abstractmethod
+    def iter_output_lines(self, job_id: str, output_uri: str, input_name: str) -> Iterator[str]:
+        """Yield the lines of the job's output records."""
+
+
+class BedrockBatchBackend(BatchBackend):
+    """Model invocation jobs through the bedrock control plane and S3."""
+
+    def __init__(self, bedrock_client, s3_client, role_arn: str):
+        """
+        Initialize backend.
+
+        Args:
+            bedrock_client: Boto3 "bedrock" client
+            s3_client: Boto3 S3 client
+            role_arn: Service role Bedrock assumes to read input and write output
+        """
+        self.bedrock = bedrock_client
+        self.s3 = s3_client
+        self.role_arn = role_arn
+
+    def upload_input(self, local_path: Path, input_uri: str):
+        bucket, key = split_s3_uri(input_uri)
+        self.s3.upload_file(str(local_path), bucket, key)
+
+    def submit_job(self, job_name: str, model_id: str, input_uri: str, output_uri: str) -> str:
+        response = self.bedrock.create_model_invocation_job(
+            jobName=job_name,
+            roleArn=self.role_arn,
+            modelId=model_id,
+            inputDataConfig={"s3InputDataConfig": {"s3Uri": input_uri, "s3InputFormat": "JSONL"}},
+            outputDataConfig={"s3OutputDataConfig": {"s3Uri": output_uri}}
+        )
+        return response["jobArn"]
+
+    def get_job_status(self, job_id: str) -> Tuple[str, Optional[str]]:
+        response = self.bedrock.get_model_invocation_job(jobIdentifier=job_id)
+        return response["status"], response.get("message")
+
+    def iter_output_lines(self, job_id: str, output_uri: str, input_name: str) -> Iterator[str]:
+        # Output lands in <output prefix>/<job id>/<input file name>.out
+        bucket, prefix = split_s3_uri(output_uri.rstrip('/') + '/')
+        key = f"{prefix}{job_id.split('/')[-1]}/{input_name}.out"
+        body = self.s3.get_object(Bucket=bucket, Key=key)['Body']
+        for line in body.iter_lines():
+            if line:
+                yield line.decode('utf-8')
+
+
+class LocalBatchBackend(BatchBackend):
+    """Local stand-in running jobs in a background thread against a converse() client."""
+
+    def __init__(self, client, work_dir: Path):
+        """
+        Initialize backend.
+
+        Args:
+            client: Client with converse() (e.g. StubConverseClient)
+            work_dir: Directory standing in for S3; s3://bucket/key maps to work_dir/bucket/key
+        """
+        self.client = client
+        self.work_dir = work_dir
+        self.jobs: Dict[str, Dict[str, Any]] = {}
+
+    def _local_path(self, uri: str) -> Path:
+        bucket, key = split_s3_uri(uri)
+        return self.work_dir / bucket / key
+
+    def upload_input(self, local_path: Path, input_uri: str):
+        target = self._local_path(input_uri)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        shutil.copyfile(local_path, target)
+
+    def _run(self, job: Dict[str, Any]):
+        job["status"] = "InProgress"
+        output_dir = self._local_path(job["output_uri"].rstrip('/') + '/' + job["id"])
+        output_dir.mkdir(parents=True, exist_ok=True)
+        input_path = self._local_path(job["input_uri"])
+        try:
+            with open(input_path, 'r', encoding='utf-8') as fin, \
+                    open(output_dir / (input_path.name + '.out'), 'w', encoding='utf-8') as fout:
+                for line in fin:
+                    record = json.loads(line)
+                    output = dict(record)
+                    try:
+                        response = self.client.converse(
+                            **model_input_to_converse(job["model_id"], record["modelInput"]))
+                        output["modelOutput"] = {name: response[name] for name in
+                                                 ("output", "stopReason", "usage") if name in response}
+                    except Exception as e:
+                        output["error"] = {"errorCode": 400, "errorMessage": str(e)}
+                    fout.write(json.dumps(output, ensure_ascii=False) + '\n')
+            job["status"] = "Completed"
+        except Exception as e:
+            job["status"], job["message"] = "Failed", str(e)
+
+    def submit_job(self, job_name: str, model_id: str, input_uri: str, output_uri: str) -> str:
+        job_id = uuid.uuid4().hex[:12]
+        job = {"id": job_id, "name": job_name, "model_id": model_id, "input_uri": input_uri,
+               "output_uri": output_uri, "status": "Submitted", "message": None}
+        self.jobs[job_id] = job
+        threading.Thread(target=self._run, args=(job,), daemon=True).start()
+        return job_id
+
+    def get_job_status(self, job_id: str) -> Tuple[str, Optional[str]]:
+        job = self.jobs[job_id]
+        return job["status"], job["message"]
+
+    def iter_output_lines(self, job_id: str, output_uri: str, input_name: str) -> Iterator[str]:
+        path = self._local_path(output_uri.rstrip('/') + '/' + job_id) / (input_name + '.out')
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    yield line.rstrip('\n')
+
+
+def write_batch_input(samples: List[Tuple[Dict[str, Any], str, str, str]],
+                      input_path: Path) -> Dict[str, Tuple[str, str, str]]:
+    """
+    Write samples as model-invocation-job input records.
+
+    Args:
+        samples: (converse request, image URI, expected label, user prompt)
+        input_path: Local JSONL file to write
+
+    Returns:
+        recordId -> (image URI, expected label, user prompt)
+    """
+    records = {}
+    with open(input_path, 'w', encoding='utf-8') as f:
+        for i, (request, image_uri, expected_label, user_prompt) in enumerate(samples):
+            record_id = f"{i:011d}"
+            records[record_id] = (image_uri, expected_label, user_prompt)
+            f.write(json.dumps({"recordId": record_id,
+                                "modelInput": converse_to_model_input(request)},
+                               ensure_ascii=False) + '\n')
+    return records
+
+
+def run_batch_job(backend: BatchBackend, model_id: str, samples: List[Tuple[Dict[str, Any], str, str, str]],
+                  input_uri: str, output_uri: str, make_result: Callable[..., Dict],
+                  local_dir: Path = Path("."), poll_seconds: float = BATCH_POLL_SECONDS) -> List[Dict]:
+    """
+    Evaluate samples with one batch inference job.
+
+    Args:
+        backend: Batch service backend
+        model_id: Model ID or ARN
+        samples: (converse request, image URI, expected label, user prompt)
+        input_uri: S3 URI of the job input file (ends in .jsonl)
+        output_uri: S3 prefix for the job output
+        make_result: Builds a result from (image URI, user prompt, expected label,
+            raw prediction, request metrics)
+        local_dir: Directory for the local copy of the input file
+        poll_seconds: Seconds between status polls
+
+    Returns:
+        Results in sample order
+    """
+    if len(samples) < BATCH_MIN_RECORDS:
+        print(f"Warning: Bedrock batch jobs need at least {BATCH_MIN_RECORDS} records, "
+              f"got {len(samples)}")
+
+    input_name = input_uri.rstrip('/').split('/')[-1]
+    input_path = local_dir / input_name
+    records = write_batch_input(samples, input_path)
+    backend.upload_input(input_path, input_uri)
+
+    job_name = f"nova-eval-{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+    job_id = backend.submit_job(job_name, model_id, input_uri, output_uri)
+    print(f"Submitted batch job {job_name} ({len(records)} records): {job_id}")
+
+    last_status = None
+    while True:
+        status, message = backend.get_job_status(job_id)
+        if status != last_status:
+            print(f"Batch job status: {status}" + (f" ({message})" if message else ""))
+            last_status = status
+        if status in TERMINAL_JOB_STATUSES:
+            break
+        time.sleep(poll_seconds)
+
+    if status not in ("Completed", "PartiallyCompleted"):
+        raise RuntimeError(f"Batch job {job_id} ended with status {status}: {message}")
+
+    # Stream-parse output records; records without output count as errors
+    predictions: Dict[str, str] = {}
+    usage: Dict[str, Dict[str, Any]] = {}
+    for line in backend.iter_output_lines(job_id, output_uri, input_name):
+        record = json.loads(line)
+        try:
+            text = record["modelOutput"]["output"]["message"]["content"][0]["text"]
+            predictions[record["recordId"]] = text.strip().lower()
+        except (KeyError, IndexError, TypeError):
+            print(f"Error in batch record {record.get('recordId')}: {record.get('error')}")
+            continue
+        tokens = record["modelOutput"].get("usage", {})
+        usage[record["recordId"]] = {"input_tokens": tokens.get("inputTokens"),
+                                     "output_tokens": tokens.get("outputTokens")}
+
+    return [make_result(image_uri, user_prompt, expected_label,
+                        predictions.get(record_id, "error"), usage.get(record_id))
+            for record_id, (image_uri, expected_label, user_prompt) in records.items()]
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Benchmark the precompiled sample emitter against the json.dumps path.
+
+That both paths produce byte-identical JSONL lines is covered by
+tests/test_generate_dataset.py.
+"""
+
+import argparse
+import json
+import random
+import time
+from typing import List, Tuple
+
+from generate_dataset import (BUCKET_NAME, BUCKET_OWNER_ID, CATEGORIES,
+                              S3_PREFIX, DatasetGenerator)
+
+RANDOM_SEED = 42
+
+
+def build_keys(count: int) -> List[Tuple[str, str]]:
+    """Build (s3_key, category) pairs for the benchmark."""
+    keys = []
+    for i in range(count):
+        category = CATEGORIES[i % len(CATEGORIES)]
+        extension = ".png" if i % 3 == 0 else ".jpg"
+        keys.append((f"{S3_PREFIX}/{category}/{category}_{i:07d}{extension}", category))
+    return keys
+
+
+def dumps_path(generator: DatasetGenerator, keys: List[Tuple[str, str]]) -> List[str]:
+    """Serialize samples with create_conversation_sample and json.dumps."""
+    return [json.dumps(generator.create_conversation_sample(s3_key, category), ensure_ascii=False)
+            for s3_key, category in keys]
+
+
+def emitter_path(generator: DatasetGenerator, keys: List[Tuple[str, str]]) -> List[str]:
+    """Serialize samples with the precompiled emitter."""
+    emit = generator.emitter.emit
+    return [emit(s3_key, category) for s3_key, category in keys]
+
+
+def benchmark(name: str, func, generator: DatasetGenerator,
+              keys: List[Tuple[str, str]], seed: int, repeat: int) -> float:
+    """Run a serialization path and return the best lines per second."""
+    best = 0.0
+    for _ in range(repeat):
+        random.seed(seed)
+        start = time.perf_counter()
+        func(generator, keys)
+        elapsed = time.perf_counter() - start
+        best = max(best, len(keys) / elapsed)
+    print(f"{name:>12}: {best:>12,.0f} lines/s")
+    return best
+
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(
+        description="Benchmark precompiled sample emission against json.dumps")
+    parser.add_argument("--count", type=int, default=200000,
+                        help="Number of samples to serialize per run (default: 200000)")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="Benchmark repetitions, best run is reported (default: 3)")
+    parser.add_argument("--seed", type=int, default=RANDOM_SEED,
+                        help=f"Random seed (default: {RANDOM_SEED})")
+    args = parser.parse_args()
+
+    generator = DatasetGenerator(BUCKET_NAME, BUCKET_OWNER_ID, S3_PREFIX)
+    keys = build_keys(args.count)
+
+    print("Sample Emitter Benchmark")
+    print("=" * 40)
+
+    baseline = benchmark("json.dumps", dumps_path,
+                         generator, keys, args.seed, args.repeat)
+    fast = benchmark("emitter", emitter_path,
+                     generator, keys, args.seed, args.repeat)
+    print(f"{'speedup':>12}: {fast / baseline:>12.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Benchmark the concurrent evaluator against the local converse stub.
+
+Runs the same synthetic test set sequentially (one request at a time, as the
+original evaluator did) and with the adaptive concurrency limiter, against a
+stub that throttles above a fixed capacity. Verifies that concurrent results
+keep input order and match the sequential predictions, and that every
+throttled request was retried to success. Exits non-zero on any mismatch.
+"""
+
+import argparse
+import sys
+import time
+from typing import Any, Dict, List
+
+from converse_stub import STUB_CATEGORIES, StubConverseClient
+from eval_concurrency import AdaptiveConcurrencyLimiter, ConcurrentEvaluator
+
+SYSTEM_PROMPT = "You are a content moderation classifier that determines if an image is porn, sexy, or neutral."
+USER_PROMPT = "Classify this image into one of the categories: porn, sexy, neutral."
+
+
+def build_requests(count: int) -> List[Dict[str, Any]]:
+    """Build converse requests for a synthetic test set."""
+    requests = []
+    for i in range(count):
+        category = STUB_CATEGORIES[i % len(STUB_CATEGORIES)]
+        uri = f"s3://bucket/nova-finetune/{category}/{category}_{i:05d}.jpg"
+        requests.append({
+            "modelId": "stub-model",
+            "messages": [{"role": "user", "content": [
+                {"image": {"format": "jpeg", "source": {"s3Location": {"uri": uri, "bucketOwner": "0"}}}},
+                {"text": USER_PROMPT}]}],
+            "system": [{"text": SYSTEM_PROMPT}],
+            "inferenceConfig": {"maxTokens": 50, "topP": 0.1, "temperature": 0.1}
+        })
+    return requests
+
+
+def run(client: StubConverseClient, requests: List[Dict[str, Any]],
+        limiter: AdaptiveConcurrencyLimiter) -> List[Dict[str, Any]]:
+    """Evaluate requests and print throughput."""
+    def call(request):
+        response = client.converse(**request)
+        return response["output"]["message"]["content"][0]["text"]
+
+    start = time.perf_counter()
+    outcomes = list(ConcurrentEvaluator(limiter).map(call, requests))
+    elapsed = time.perf_counter() - start
+    retries = sum(outcome["retries"] for outcome in outcomes)
+    print(f"  {len(requests) / elapsed:8.1f} requests/s, {elapsed:.2f}s, "
+          f"{client.throttled} throttled, {retries} retries, "
+          f"peak in-flight {client.peak_in_flight}, final limit {limiter.limit:.1f}")
+    return outcomes
+
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description="Benchmark the concurrent evaluator on a stub")
+    parser.add_argument("--count", type=int, default=300, help="Requests per run (default: 300)")
+    parser.add_argument("--latency-ms", type=float, default=50, help="Stub latency (default: 50)")
+    parser.add_argument("--capacity", type=int, default=8,
+                        help="Stub concurrency before throttling (default: 8)")
+    parser.add_argument("--max-concurrency", type=int, default=32,
+                        help="Evaluator concurrency ceiling (default: 32)")
+    args = parser.parse_args()
+
+    requests = build_requests(args.count)
+
+    print("Sequential:")
+    sequential = run(StubConverseClient(latency_ms=args.latency_ms, max_concurrency=args.capacity),
+                     requests, AdaptiveConcurrencyLimiter(initial=1, max_limit=1))
+
+    print("Adaptive concurrent:")
+    concurrent = run(StubConverseClient(latency_ms=args.latency_ms, max_concurrency=args.capacity),
+                     requests, AdaptiveConcurrencyLimiter(max_limit=args.max_concurrency))
+
+    errors = [outcome["error"] for outcome in concurrent if outcome["error"] is not None]
+    mismatches = [i for i, (a, b) in enumerate(zip(sequential, concurrent))
+                  if a["value"] != b["value"]]
+    if errors or mismatches:
+        print(f"❌ {len(errors)} failed request(s), {len(mismatches)} out-of-order or differing result(s)")
+        sys.exit(1)
+    print(f"✅ {len(concurrent)} results in input order, identical to the sequential run")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Compare s3Location image requests with inline-bytes requests on the converse stub.
+
+Runs the same synthetic test set with s3Location image sources and with
+inline bytes from the image cache at each requested maximum edge (0 keeps
+the original size), then reports client latency percentiles, server latency
+(metrics.latencyMs), input tokens and image size per mode. The stub charges
+tokens and latency by pixel count, like the service. Exits non-zero if any
+inline mode answers differently from the s3Location run.
+"""
+
+import argparse
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from benchmark_evaluator import build_requests
+from converse_stub import StubConverseClient
+from eval_concurrency import AdaptiveConcurrencyLimiter, ConcurrentEvaluator
+from eval_metrics import percentiles
+from image_cache import ImageCache, inline_image_sources
+
+
+def run(client: StubConverseClient, requests: List[Dict[str, Any]],
+        image_cache: Optional[ImageCache], concurrency: int) -> List[Dict[str, Any]]:
+    """Evaluate requests and print latency, token and image size statistics."""
+    sizes = []
+
+    def call(request):
+        if image_cache is not None:
+            request = inline_image_sources(request, image_cache)
+            sizes.append(len(request["messages"][0]["content"][0]["image"]["source"]["bytes"]))
+        return client.converse(**request)
+
+    start = time.perf_counter()
+    outcomes = list(ConcurrentEvaluator(AdaptiveConcurrencyLimiter(
+        initial=concurrency, max_limit=concurrency)).map(call, requests))
+    elapsed = time.perf_counter() - start
+
+    responses = [outcome["value"] for outcome in outcomes if outcome["error"] is None]
+    p50, p95 = percentiles([outcome["latency"] * 1000 for outcome in outcomes], [50, 95])
+    server_ms = sum(response["metrics"]["latencyMs"] for response in responses) / len(responses)
+    tokens = sum(response["usage"]["inputTokens"] for response in responses) / len(responses)
+    image_kib = f"{sum(sizes) / len(sizes) / 1024:9.1f}" if sizes else f"{'-':>9}"
+    print(f"{p50:8.0f} {p95:8.0f} {server_ms:10.0f} {tokens:10.0f} {image_kib} "
+          f"{len(requests) / elapsed:10.1f}")
+    return outcomes
+
+
+def main():
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(description="Compare s3Location and inline-bytes image requests")
+    parser.add_argument("--count", type=int, default=120, help="Requests per mode (default: 120)")
+    parser.add_argument("--max-edges", type=int, nargs="+", default=[0, 1024, 512],
+                        help="Max image edges for inline runs, 0 for original size (default: 0 1024 512)")
+    parser.add_argument("--latency-ms", type=float, default=50, help="Stub base latency (default: 50)")
+    parser.add_argument("--concurrency", type=int, default=8, help="Concurrent requests (default: 8)")
+    args = parser.parse_args()
+
+    requests = build_requests(args.count)
+    uris = [request["messages"][0]["content"][0]["image"]["source"]["s3Location"]["uri"]
+            for request in requests]
+    client = StubConverseClient(latency_ms=args.latency_ms, max_concurrency=args.concurrency)
+
+    print(f"{'Mode':<16} {'p50 ms':>8} {'p95 ms':>8} {'server ms':>10} "
+          f"{'in tokens':>10} {'image KiB':>9} {'req/s':>10}")
+    print(f"{'s3Location':<16} ", end="")
+    baseline = run(client, requests, None, args.concurrency)
+
+    mismatches = 0
+    with tempfile.TemporaryDirectory() as cache_dir:
+        for max_edge in args.max_edges:
+            image_cache = ImageCache(client.fetch_image, Path(cache_dir),
+                                     max_edge=max_edge or None)
+            image_cache.prefetch(uris)
+            for uri in uris:
+                client.register_image(image_cache.get(uri)[0], uri)
+            mode = f"inline {max_edge or 'original'}"
+            print(f"{mode:<16} ", end="")
+            outcomes = run(client, requests, image_cache, args.concurrency)
+            mismatches += sum(
+                1 for a, b in zip(baseline, outcomes)
+                if a["error"] is None and b["error"] is None and
+                a["value"]["output"] != b["value"]["output"])
+
+    if mismatches:
+        print(f"❌ {mismatches} inline answer(s) differ from the s3Location run")
+        sys.exit(1)
+    print("✅ Inline-bytes runs answer identically to the s3Location run")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Check prompt-cache request shapes and token accounting on the converse stub.
+
+Builds evaluation requests with NovaProTester in each prompt cache mode and
+verifies where the cachePoint blocks go: none for "off", after the system
+prompt for "system", and after the system prompt and the user prompt (sent
+before the image) for "prompt". A prefix shorter than --cache-min-tokens
+gets no cache point; the dataset prompts are only about 60 tokens, so only a
+low minimum (the default is 0) shows any caching. Each mode then runs over a
+synthetic test set; the report shows uncached input, cache read and cache
+write tokens per image. Exits non-zero if a request has the wrong shape, if
+a mode with cache points never reads from the cache, or if any mode answers
+differently from "off".
+"""
+
+import argparse
+import sys
+from typing import Any, Dict, List, Tuple
+
+from converse_stub import STUB_CATEGORIES, StubConverseClient
+from eval_concurrency import AdaptiveConcurrencyLimiter, ConcurrentEvaluator
+from generate_dataset import SYSTEM_MESSAGE, USER_PROMPTS
+from nova_eval import CHARS_PER_TOKEN, PROMPT_CACHE_MODES, NovaProTester
+
+CACHE_POINT = {"cachePoint": {"type": "default"}}
+
+
+def expected_cache_points(mode: str, min_tokens: int) -> Tuple[bool, bool]:
+    """Whether a mode marks (the system prompt, the user prompt) given the minimum prefix."""
+    system_tokens = len(SYSTEM_MESSAGE) // CHARS_PER_TOKEN
+    prompt_tokens = len(SYSTEM_MESSAGE + USER_PROMPTS[0]) // CHARS_PER_TOKEN
+    return (mode != "off" and system_tokens >= min_tokens,
+            mode == "prompt" and prompt_tokens >= min_tokens)
+
+
+def check_shape(request: Dict[str, Any], mode: str, min_tokens: int) -> List[str]:
+    """Return a description of every way a request differs from the expected layout."""
+    problems = []
+    cache_system, cache_prompt = expected_cache_points(mode, min_tokens)
+    system = request["system"]
+    content = request["messages"][0]["content"]
+    expected_system = [{"text": SYSTEM_MESSAGE}] + ([CACHE_POINT] if cache_system else [])
+    if system != expected_system:
+        problems.append(f"system blocks {[list(block) for block in system]}")
+
+    layout = [next(iter(block)) for block in content]
+    expected_layout = ["text", "cachePoint", "image"] if cache_prompt else ["image", "text"]
+    if layout != expected_layout:
+        problems.append(f"user content {layout}, expected {expected_layout}")
+    elif cache_prompt and content[1] != CACHE_POINT:
+        problems.append(f"cache point {content[1]}")
+    return problems
+
+
+def run(tester: NovaProTester, requests: List[Dict[str, Any]],
+        concurrency: int) -> List[Dict[str, Any]]:
+    """Evaluate requests and print per-image token usage."""
+    outcomes = list(ConcurrentEvaluator(AdaptiveConcurrencyLimiter(
+        initial=concurrency, max_limit=concurrency)).map(tester.converse_response, requests))
+    metrics = [tester.request_metrics(outcome) for outcome in outcomes if outcome["error"] is None]
+
+    def per_image(key):
+        return sum(m[key] or 0 for m in metrics) / len(metrics) if metrics else 0.0
+
+    print(f"{per_image('input_tokens'):10.0f} {per_image('cache_read_tokens'):11.0f} "
+          f"{per_image('cache_write_tokens'):12.1f} "
+          f"{sum(1 for m in metrics if m['cache_read_tokens']):>6}/{len(outcomes)}")
+    return outcomes
+
+
+def main():
+    """Run the check."""
+    parser = argparse.ArgumentParser(description="Check prompt cache points on the converse stub")
+    parser.add_argument("--count", type=int, default=60, help="Requests per mode (default: 60)")
+    parser.add_argument("--latency-ms", type=float, default=20,
+                        help="Stub base latency (default: 20)")
+    parser.add_argument("--concurrency", type=int, default=8,
+                        help="Concurrent requests (default: 8)")
+    parser.add_argument("--cache-min-tokens", type=int, default=0,
+                        help="Shortest prefix the stub caches and the evaluator marks (default: 0)")
+    args = parser.parse_args()
+
+    samples = []
+    for i in range(args.count):
+        category = STUB_CATEGORIES[i % len(STUB_CATEGORIES)]
+        samples.append(("jpeg", f"s3://bucket/nova-finetune/{category}/{category}_{i:05d}.jpg"))
+
+    failures = 0
+    answers = {}
+    print(f"{'Mode':<8} {'in tokens':>10} {'cache read':>11} {'cache write':>12} {'hits':>13}")
+    for mode in PROMPT_CACHE_MODES:
+        # A fresh stub per mode, so every mode starts with an empty prompt cache
+        client = StubConverseClient(latency_ms=args.latency_ms, max_concurrency=args.concurrency,
+                                    cache_min_tokens=args.cache_min_tokens)
+        tester = NovaProTester(client=client, prompt_cache=mode,
+                               prompt_cache_min_tokens=args.cache_min_tokens)
+        requests = [tester.build_converse_request(
+            image_format, uri, USER_PROMPTS[0], SYSTEM_MESSAGE) for image_format, uri in samples]
+        problems = check_shape(requests[0], mode, args.cache_min_tokens)
+        for problem in problems:
+            print(f"❌ {mode}: {problem}")
+        failures += len(problems)
+
+        print(f"{mode:<8} ", end="")
+        outcomes = run(tester, requests, args.concurrency)
+        answers[mode] = [None if outcome["error"] else tester.response_text(outcome["value"])
+                         for outcome in outcomes]
+        sent = list(client.requests)
+        if len(sent) != len(requests) or any(
+                check_shape(request, mode, args.cache_min_tokens) for request in sent):
+            print(f"❌ {mode}: the stub received requests with a different shape")
+            failures += 1
+        cache_reads = any(outcome["error"] is None
+                          and outcome["value"]["usage"].get("cacheReadInputTokens")
+                          for outcome in outcomes)
+        if any(expected_cache_points(mode, args.cache_min_tokens)) and not cache_reads:
+            print(f"❌ {mode}: no request read from the prompt cache")
+            failures += 1
+
+    for mode in PROMPT_CACHE_MODES[1:]:
+        mismatches = sum(1 for a, b in zip(answers["off"], answers[mode]) if a != b)
+        if mismatches:
+            print(f"❌ {mismatches} {mode} answer(s) differ from the uncached run")
+            failures += 1
+
+    if failures:
+        sys.exit(1)
+    print("✅ Cache points are placed as expected and cached runs answer identically")
+
+
+if __name__ == "__main__":
+    main()
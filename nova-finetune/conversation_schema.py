@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+Schema validation for bedrock-conversation-2024 records.
+
+Validators are compiled once per configuration (categories, image formats,
+bucket owner) into closures with their lookups bound as locals. A fast path
+matches the canonical single-line layout written by generate_dataset.py with
+one regular expression and only checks the captured values; any line that
+does not match falls back to json.loads and the full structural check, which
+also produces the error message.
+"""
+
+import json
+import re
+from functools import lru_cache
+from typing import Any, Callable, Iterable, Optional
+
+SCHEMA_VERSION = "bedrock-conversation-2024"
+DEFAULT_CATEGORIES = ("neutral", "porn", "sexy")
+IMAGE_FORMATS = ("jpeg", "png", "gif", "webp")
+
+S3_URI_PATTERN = re.compile(r's3://[a-z0-9][a-z0-9.\-]{1,61}[a-z0-9]/[^\s]+')
+TOP_LEVEL_FIELDS = frozenset(("schemaVersion", "system", "messages"))
+
+# A JSON string whose escapes are all valid, so a fast-path match is valid JSON;
+# captures the raw (still escaped) contents
+_JSON_STRING = r'"([^"\\\x00-\x1f]*(?:\\(?:["\\/bfnrt]|u[0-9a-fA-F]{4})[^"\\\x00-\x1f]*)*)"'
+_PLAIN_STRING = r'"([^"\\\x00-\x1f]*)"'
+
+# Canonical json.dumps layout of a generated sample
+FAST_PATH_PATTERN = re.compile(
+    r'\{"schemaVersion": "bedrock-conversation-2024", '
+    r'"system": \[\{"text": ' + _JSON_STRING + r'\}\], '
+    r'"messages": \[\{"role": "user", "content": \['
+    r'\{"image": \{"format": ' + _PLAIN_STRING + r', '
+    r'"source": \{"s3Location": \{"uri": ' + _PLAIN_STRING + r', '
+    r'"bucketOwner": ' + _PLAIN_STRING + r'\}\}\}\}, '
+    r'\{"text": ' + _JSON_STRING + r'\}\]\}, '
+    r'\{"role": "assistant", "content": \[\{"text": ' + _PLAIN_STRING + r'\}\]\}\]\}'
+)
+
+
+def _has_text(raw: str) -> bool:
+    """Whether a captured JSON string holds more than whitespace once unescaped."""
+    return bool((json.loads(f'"{raw}"') if '\\' in raw else raw).strip())
+
+
+class SchemaError(ValueError):
+    """Raised when a record does not match the conversation schema."""
+
+    def __init__(self, kind: str, path: str, detail: str):
+        super().__init__(f"{kind} - {path}: {detail}")
+        self.kind = kind
+
+
+def compile_record_validator(categories: Iterable[str] = DEFAULT_CATEGORIES,
+                             image_formats: Iterable[str] = IMAGE_FORMATS,
+                             bucket_owner: Optional[str] = None) -> Callable[[Any], None]:
+    """
+    Compile a validator for parsed records.
+
+    Args:
+        categories: Allowed assistant labels
+        image_formats: Allowed image formats
+        bucket_owner: Required bucketOwner; any non-empty string when None
+
+    Returns:
+        Function that raises SchemaError for an invalid record
+    """
+    allowed_labels = frozenset(categories)
+    allowed_formats = frozenset(image_formats)
+    uri_match = S3_URI_PATTERN.fullmatch
+    top_level_fields = TOP_LEVEL_FIELDS
+
+    def check_text(block, path):
+        text = block.get("text")
+        if not isinstance(text, str) or not text.strip():
+            raise SchemaError("Invalid content block", path, "text must be a non-empty string")
+        if len(block) != 1:
+            raise SchemaError("Unexpected field", path, f"extra keys {sorted(set(block) - {'text'})}")
+        return text
+
+    def check_image(block, path):
+        if len(block) != 1:
+            raise SchemaError("Invalid content block", path, "image block must not have other keys")
+        image = block["image"]
+        if not isinstance(image, dict):
+            raise SchemaError("Invalid content block", path, "image must be an object")
+        image_format = image.get("format")
+        if image_format not in allowed_formats:
+            raise SchemaError("Invalid image format", path + ".image.format",
+                              f"{image_format!r} not in {sorted(allowed_formats)}")
+        source = image.get("source")
+        location = source.get("s3Location") if isinstance(source, dict) else None
+        if not isinstance(location, dict) or len(source) != 1:
+            raise SchemaError("Invalid content block", path + ".image.source",
+                              "expected exactly an s3Location object")
+        uri = location.get("uri")
+        if not isinstance(uri, str) or not uri_match(uri):
+            raise SchemaError("Invalid S3 URI", path + ".image.source.s3Location.uri", repr(uri))
+        owner = location.get("bucketOwner")
+        if not isinstance(owner, str) or not owner or (
+                bucket_owner is not None and owner != bucket_owner):
+            raise SchemaError("Invalid bucket owner",
+                              path + ".image.source.s3Location.bucketOwner", repr(owner))
+
+    def validate(record):
+        if not isinstance(record, dict) or not top_level_fields.issubset(record):
+            raise SchemaError("Missing required fields", "$",
+                              f"expected {sorted(top_level_fields)}")
+        if len(record) != len(top_level_fields):
+            raise SchemaError("Unexpected field", "$",
+                              f"extra keys {sorted(set(record) - top_level_fields)}")
+        if record["schemaVersion"] != SCHEMA_VERSION:
+            raise SchemaError("Invalid schema version", "schemaVersion",
+                              repr(record["schemaVersion"]))
+
+        system = record["system"]
+        if not isinstance(system, list):
+            raise SchemaError("Invalid content block", "system", "must be a list")
+        for i, block in enumerate(system):
+            if not isinstance(block, dict):
+                raise SchemaError("Invalid content block", f"system[{i}]", "must be an object")
+            check_text(block, f"system[{i}]")
+
+        messages = record["messages"]
+        if not isinstance(messages, list) or not messages:
+            raise SchemaError("Invalid role order", "messages", "must be a non-empty list")
+        if len(messages) % 2:
+            raise SchemaError("Invalid role order", "messages",
+                              "must end with an assistant message")
+
+        for i, message in enumerate(messages):
+            path = f"messages[{i}]"
+            expected_role = "user" if i % 2 == 0 else "assistant"
+            if not isinstance(message, dict) or message.get("role") != expected_role:
+                role = message.get("role") if isinstance(message, dict) else None
+                raise SchemaError("Invalid role order", path + ".role",
+                                  f"expected {expected_role!r}, got {role!r}")
+            content = message.get("content")
+            if not isinstance(content, list) or not content or len(message) != 2:
+                raise SchemaError("Invalid content block", path,
+                                  "expected role and a non-empty content list")
+
+            for j, block in enumerate(content):
+                block_path = f"{path}.content[{j}]"
+                if not isinstance(block, dict):
+                    raise SchemaError("Invalid content block", block_path, "must be an object")
+                if "image" in block:
+                    if expected_role != "user":
+                        raise SchemaError("Invalid content block", block_path,
+                                          "images are only allowed in user messages")
+                    check_image(block, block_path)
+                elif "text" in block:
+                    check_text(block, block_path)
+                else:
+                    raise SchemaError("Invalid content block", block_path,
+                                      f"unsupported block type {sorted(block)}")
+
+        # The final assistant turn carries the classification label
+        answer = messages[-1]["content"]
+        if len(answer) != 1 or answer[0]["text"] not in allowed_labels:
+            label = answer[0].get("text") if len(answer) == 1 else None
+            raise SchemaError("Invalid label", f"messages[{len(messages) - 1}].content",
+                              f"{label!r} not in {sorted(allowed_labels)}")
+
+    return validate
+
+
+@lru_cache(maxsize=None)
+def compile_line_validator(categories: tuple = DEFAULT_CATEGORIES,
+                           image_formats: tuple = IMAGE_FORMATS,
+                           bucket_owner: Optional[str] = None,
+                           fast_path: bool = True) -> Callable[[str], Optional[str]]:
+    """
+    Compile a validator for raw JSONL lines.
+
+    Compiled validators are cached, so worker processes can call this per
+    chunk with the same arguments.
+
+    Args:
+        categories: Allowed assistant labels
+        image_formats: Allowed image formats
+        bucket_owner: Required bucketOwner; any non-empty string when None
+        fast_path: Try the canonical-layout regex before json.loads
+
+    Returns:
+        Function mapping a line to an error message, or None if valid
+    """
+    validate_record = compile_record_validator(categories, image_formats, bucket_owner)
+    allowed_labels = frozenset(categories)
+    allowed_formats = frozenset(image_formats)
+    uri_match = S3_URI_PATTERN.fullmatch
+    fast_match = FAST_PATH_PATTERN.fullmatch if fast_path else None
+
+    def validate_line(line: str) -> Optional[str]:
+        line = line.strip()
+        if fast_match is not None:
+            match = fast_match(line)
+            if match is not None:
+                system_text, image_format, uri, owner, user_text, label = match.groups()
+                if (image_format in allowed_formats and label in allowed_labels
+                        and uri_match(uri) and owner
+                        and (bucket_owner is None or owner == bucket_owner)
+                        and _has_text(system_text) and _has_text(user_text)):
+                    return None
+
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError as e:
+            return f"JSON decode error - {e}"
+        try:
+            validate_record(record)
+        except SchemaError as e:
+            return str(e)
+        return None
+
+    return validate_line
@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the bedrock-runtime converse API.
+
+StubConverseClient answers converse() calls without network access: it sleeps
+for a configurable latency, throttles like the service when its concurrency
+or requests-per-second capacity is exceeded, and returns a response with the
+same shape as Bedrock's (output message, stopReason, usage, metrics). The
+answer is the category found in the image URI, replaced by another category
+for a deterministic fraction of images, so accuracy reports are meaningful.
+Images sent as inline bytes are mapped back to their URI through
+register_image(). Image tokens and latency grow with the image's pixel count
+(STUB_IMAGE_SIZE for s3Location images), and fetch_image() returns a
+synthetic image of that size for inline-bytes runs.
+
+cachePoint blocks are validated and simulated like Bedrock prompt caching:
+the prefix up to a cache point is written on first use and read afterwards
+(within a TTL), reported as cacheWriteInputTokens / cacheReadInputTokens.
+"""
+
+import hashlib
+import io
+import random
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, List, Optional, Tuple
+
+from image_preflight import detect_image_format, read_image_dimensions
+from response_cache import request_key
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+STUB_CATEGORIES = ["porn", "sexy", "neutral"]
+STUB_IMAGE_SIZE = (1600, 1200)  # Full-resolution size of images read from S3
+STUB_PIXELS_PER_TOKEN = 750  # Image input tokens ~ width * height / 750
+STUB_MS_PER_MEGAPIXEL = 40  # Extra latency per megapixel of image processed
+STUB_CHARS_PER_TOKEN = 4
+STUB_REQUEST_HISTORY = 1000  # Most recent requests kept for inspection
+STUB_MAX_CACHE_POINTS = 4
+STUB_PROMPT_CACHE_TTL = 300  # Seconds a cached prefix stays readable after last use
+
+
+class StubThrottlingException(Exception):
+    """Throttling error shaped like botocore's ClientError."""
+
+    def __init__(self, operation: str = "Converse"):
+        self.response = {"Error": {"Code": "ThrottlingException",
+                                   "Message": "Too many requests, please wait before trying again."}}
+        super().__init__(f"An error occurred (ThrottlingException) when calling the "
+                         f"{operation} operation: Too many requests, please wait before trying again.")
+
+
+class StubValidationException(Exception):
+    """Request validation error shaped like botocore's ClientError."""
+
+    def __init__(self, message: str, operation: str = "Converse"):
+        self.response = {"Error": {"Code": "ValidationException", "Message": message}}
+        super().__init__(f"An error occurred (ValidationException) when calling the "
+                         f"{operation} operation: {message}")
+
+
+class StubConverseClient:
+    """Thread-safe local implementation of converse() for offline evaluation runs."""
+
+    def __init__(self, latency_ms: float = 200, jitter_ms: float = 50,
+                 max_concurrency: int = 8, max_rps: Optional[float] = None,
+                 accuracy: float = 0.9, categories: Optional[List[str]] = None,
+                 seed: int = 0, cache_min_tokens: int = 0):
+        """
+        Initialize stub.
+
+        Args:
+            latency_ms: Mean response latency
+            jitter_ms: Uniform latency jitter (+/-)
+            max_concurrency: In-flight calls above which requests are throttled
+            max_rps: Calls per second above which requests are throttled
+            accuracy: Fraction of images answered with their true category
+            categories: Category labels
+            seed: Seed for latency jitter and wrong answers
+            cache_min_tokens: Shortest prefix a cache point caches (Bedrock
+                enforces a model-specific minimum; 0 caches any prefix)
+        """
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.max_concurrency = max_concurrency
+        self.max_rps = max_rps
+        self.accuracy = accuracy
+        self.categories = categories or STUB_CATEGORIES
+        self.seed = seed
+        self.cache_min_tokens = cache_min_tokens
+
+        self.calls = 0
+        self.throttled = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.requests = deque(maxlen=STUB_REQUEST_HISTORY)
+        self.image_uris: Dict[str, str] = {}
+        self.prompt_cache: Dict[str, float] = {}  # Prefix key -> expiry
+        self._starts = deque()
+        self._lock = threading.Lock()
+        self._rng = random.Random(seed)
+
+    def _admit(self):
+        """Reserve capacity for one call or raise a throttling error."""
+        with self._lock:
+            now = time.monotonic()
+            while self._starts and now - self._starts[0] >= 1.0:
+                self._starts.popleft()
+            if self.in_flight >= self.max_concurrency or (
+                    self.max_rps is not None and len(self._starts) >= self.max_rps):
+                self.throttled += 1
+                raise StubThrottlingException()
+            self._starts.append(now)
+            self.calls += 1
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+            return self._rng.uniform(-self.jitter_ms, self.jitter_ms)
+
+    def register_image(self, data: bytes, uri: str):
+        """Map inline image bytes to their URI, which carries the category label."""
+        with self._lock:
+            self.image_uris[hashlib.sha256(data).hexdigest()] = uri
+
+    def fetch_image(self, uri: str) -> bytes:
+        """
+        Return a synthetic full-resolution image for a URI (stand-in for S3).
+
+        Args:
+            uri: Image URI; the extension selects PNG or JPEG
+
+        Returns:
+            Encoded image of STUB_IMAGE_SIZE
+        """
+        if Image is None:
+            raise RuntimeError("Pillow is required for stub images: pip install Pillow")
+        digest = hashlib.sha256(uri.encode('utf-8')).digest()
+        image = Image.linear_gradient('L').resize(STUB_IMAGE_SIZE).convert('RGB')
+        image.paste(tuple(digest[:3]), (0, 0, STUB_IMAGE_SIZE[0] // 2, STUB_IMAGE_SIZE[1] // 2))
+        output = io.BytesIO()
+        if uri.lower().endswith('.png'):
+            image.save(output, 'PNG')
+        else:
+            image.save(output, 'JPEG', quality=90)
+        return output.getvalue()
+
+    def _answer(self, model_id: str, image_key: str) -> str:
+        """Return a deterministic answer for an image."""
+        label = next((category for category in self.categories
+                      if f"/{category}/" in image_key or f"/{category}_" in image_key),
+                     self.categories[0])
+        digest = hashlib.sha256(f"{self.seed}:{model_id}:{image_key}".encode()).digest()
+        if int.from_bytes(digest[:8], 'big') / 2 ** 64 < self.accuracy:
+            return label
+        others = [category for category in self.categories if category != label]
+        return others[digest[8] % len(others)] if others else label
+
+    def _use_prompt_cache(self, checkpoints: List[Tuple[int, str]]) -> Tuple[int, int]:
+        """
+        Look up and store the prefixes ending at cache points.
+
+        Returns:
+            (tokens read from cache, tokens written to cache)
+        """
+        eligible = [(tokens, key) for tokens, key in checkpoints
+                    if tokens > 0 and tokens >= self.cache_min_tokens]
+        if not eligible:
+            return 0, 0
+        read = 0
+        now = time.monotonic()
+        with self._lock:
+            for tokens, key in eligible:
+                if self.prompt_cache.get(key, 0) > now:
+                    read = tokens
+                self.prompt_cache[key] = now + STUB_PROMPT_CACHE_TTL
+        return read, max(0, eligible[-1][0] - read)
+
+    @staticmethod
+    def _image_size(data: bytes) -> Tuple[int, int]:
+        """Dimensions of inline image bytes (STUB_IMAGE_SIZE if unreadable)."""
+        image_format = detect_image_format(data[:16])
+        dimensions = read_image_dimensions(data, image_format) if image_format else None
+        return dimensions or STUB_IMAGE_SIZE
+
+    def converse(self, modelId: str, messages: List[Dict[str, Any]],
+                 system: Optional[List[Dict[str, Any]]] = None,
+                 inferenceConfig: Optional[Dict[str, Any]] = None,
+                 **kwargs) -> Dict[str, Any]:
+        """Answer a converse request (same keyword arguments as boto3)."""
+        jitter = self._admit()
+        try:
+            image_key = ""
+            pixels = 0
+            tokens = 0
+            prefix = []
+            checkpoints = []  # (prefix tokens, prefix key) at each cache point
+            blocks = list(system or []) + [block for message in messages
+                                           for block in message["content"]]
+            for block in blocks:
+                if "cachePoint" in block:
+                    if block["cachePoint"] != {"type": "default"}:
+                        raise StubValidationException(f"Invalid cachePoint: {block['cachePoint']}")
+                    checkpoints.append((tokens, request_key({"modelId": modelId, "prefix": prefix})))
+                    continue
+                prefix.append(block)
+                if "image" in block:
+                    source = block["image"]["source"]
+                    if "s3Location" in source:
+                        image_key = source["s3Location"]["uri"]
+                        width, height = STUB_IMAGE_SIZE
+                    else:
+                        digest = hashlib.sha256(source["bytes"]).hexdigest()
+                        with self._lock:
+                            image_key = self.image_uris.get(digest, digest)
+                        width, height = self._image_size(source["bytes"])
+                    pixels += width * height
+                    tokens += width * height // STUB_PIXELS_PER_TOKEN
+                tokens += len(block.get("text", "")) // STUB_CHARS_PER_TOKEN
+            if len(checkpoints) > STUB_MAX_CACHE_POINTS:
+                raise StubValidationException(
+                    f"At most {STUB_MAX_CACHE_POINTS} cache points are allowed, got {len(checkpoints)}")
+            cache_read, cache_write = self._use_prompt_cache(checkpoints)
+
+            latency_ms = max(1.0, self.latency_ms + jitter + pixels / 1e6 * STUB_MS_PER_MEGAPIXEL)
+            time.sleep(latency_ms / 1000)
+
+            with self._lock:
+                self.requests.append({"modelId": modelId, "messages": messages,
+                                      "system": system, "inferenceConfig": inferenceConfig,
+                                      **kwargs})
+
+            answer = self._answer(modelId, image_key)
+            usage = {"inputTokens": tokens - cache_read - cache_write, "outputTokens": 1,
+                     "totalTokens": tokens + 1}
+            if checkpoints:
+                usage.update(cacheReadInputTokens=cache_read, cacheWriteInputTokens=cache_write)
+            return {
+                "output": {"message": {"role": "assistant", "content": [{"text": answer}]}},
+                "stopReason": "end_turn",
+                "usage": usage,
+                "metrics": {"latencyMs": int(latency_ms)}
+            }
+        finally:
+            with self._lock:
+                self.in_flight -= 1
@@ -0,0 +1,363 @@
+#!/usr/bin/env python3
+"""
+Build and query a near-duplicate index over the S3 images of all categories.
+
+Each image is mapped to a 64-bit content hash (exact duplicates) and a 64-bit
+perceptual difference hash (near duplicates). Images are then grouped into
+duplicate clusters so the splitter can keep every cluster inside one split,
+and so images filed under two categories can be reported.
+
+Hashes are cached by ETag in the index file, so rebuilding only downloads new
+or changed objects. All per-image data is held in flat arrays; lookups by URI
+use a sorted array of URI hashes and binary search.
+"""
+
+import argparse
+import hashlib
+import io
+import json
+import os
+from array import array
+from bisect import bisect_left
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+# Configuration
+DEDUP_INDEX_FILE = "dedup_index.json"
+HAMMING_THRESHOLD = 3  # Max differing perceptual-hash bits for near duplicates
+HASH_BANDS = 4  # Perceptual hash split into bands for candidate lookup
+MAX_BAND_BUCKET = 5000  # Skip pairwise checks in degenerate (e.g. blank image) buckets
+DOWNLOAD_WORKERS = 32
+
+
+def hash64(data: bytes) -> int:
+    """Return a 64-bit BLAKE2b digest as an integer."""
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), 'big')
+
+
+def uri_hash(uri: str) -> int:
+    """Return the 64-bit hash used to look up an image URI."""
+    return hash64(uri.encode('utf-8'))
+
+
+def difference_hash(image_bytes: bytes) -> int:
+    """
+    Compute a 64-bit perceptual difference hash (dHash) of an image.
+
+    Args:
+        image_bytes: Encoded image bytes
+
+    Returns:
+        64-bit hash; visually similar images differ in few bits
+    """
+    if Image is None:
+        raise RuntimeError(
+            "Pillow is required for perceptual hashing: pip install Pillow")
+
+    with Image.open(io.BytesIO(image_bytes)) as image:
+        image.draft('L', (64, 64))
+        pixels = list(image.convert('L').resize(
+            (9, 8), Image.LANCZOS).getdata())
+
+    value = 0
+    for row in range(8):
+        for col in range(8):
+            left = pixels[row * 9 + col]
+            right = pixels[row * 9 + col + 1]
+            value = (value << 1) | (left > right)
+    return value
+
+
+def hamming_distance(a: int, b: int) -> int:
+    """Number of differing bits between two 64-bit hashes."""
+    return bin(a ^ b).count('1')
+
+
+class _UnionFind:
+    """Array-backed union-find over image indices."""
+
+    def __init__(self, size: int):
+        self.parent = array('l', range(size))
+
+    def find(self, i: int) -> int:
+        parent = self.parent
+        root = i
+        while parent[root] != root:
+            root = parent[root]
+        while parent[i] != root:
+            parent[i], i = root, parent[i]
+        return root
+
+    def union(self, a: int, b: int):
+        root_a, root_b = self.find(a), self.find(b)
+        if root_a != root_b:
+            # Smallest index becomes the root, keeping cluster ids stable
+            if root_a < root_b:
+                self.parent[root_b] = root_a
+            else:
+                self.parent[root_a] = root_b
+
+
+class DedupIndex:
+    """Content and perceptual hashes of images, grouped into duplicate clusters."""
+
+    def __init__(self, categories: List[str]):
+        """
+        Initialize an empty index.
+
+        Args:
+            categories: Category names; entries store an index into this list
+        """
+        self.categories = list(categories)
+        self.uris: List[str] = []
+        self.etags: List[str] = []
+        self.category_ids = array('B')
+        self.content_hashes = array('Q')
+        self.perceptual_hashes = array('Q')
+        self.cluster_ids = array('l')
+        self._uri_keys = array('Q')
+        self._uri_positions = array('L')
+        self._multi_category: Set[int] = set()
+
+    def __len__(self) -> int:
+        return len(self.uris)
+
+    def add(self, uri: str, etag: str, category: str, content_hash: int, perceptual_hash: int):
+        """Add one image entry. Call build_clusters() after adding entries."""
+        self.uris.append(uri)
+        self.etags.append(etag)
+        self.category_ids.append(self.categories.index(category))
+        self.content_hashes.append(content_hash)
+        self.perceptual_hashes.append(perceptual_hash)
+
+    def build_clusters(self, threshold: int = HAMMING_THRESHOLD):
+        """
+        Group entries into clusters of exact and near duplicates.
+
+        Exact duplicates share a content hash. Near duplicates are found by
+        splitting perceptual hashes into bands: two hashes within the Hamming
+        threshold must agree on at least one band when threshold < bands,
+        so only entries sharing a band value are compared.
+
+        Args:
+            threshold: Max differing perceptual-hash bits for near duplicates
+        """
+        size = len(self)
+        union_find = _UnionFind(size)
+
+        # Exact duplicates: neighbours after sorting by content hash
+        order = sorted(range(size), key=self.content_hashes.__getitem__)
+        for previous, current in zip(order, order[1:]):
+            if self.content_hashes[previous] == self.content_hashes[current]:
+                union_find.union(previous, current)
+        del order
+
+        if threshold >= HASH_BANDS:
+            print(f"Warning: threshold {threshold} >= {HASH_BANDS} bands, "
+                  "some near duplicates may be missed")
+
+        # Near duplicates: for each band, sort (band value << 32 | index)
+        # keys and compare perceptual hashes within runs of equal band value
+        band_bits = 64 // HASH_BANDS
+        band_mask = (1 << band_bits) - 1
+        phashes = self.perceptual_hashes
+        for band in range(HASH_BANDS):
+            shift = band * band_bits
+            keys = array('Q', sorted(((phash >> shift) & band_mask) << 32 | i
+                                     for i, phash in enumerate(phashes)))
+            start = 0
+            while start < len(keys):
+                value = keys[start] >> 32
+                end = start + 1
+                while end < len(keys) and keys[end] >> 32 == value:
+                    end += 1
+                if end - start <= MAX_BAND_BUCKET:
+                    members = [key & 0xFFFFFFFF for key in keys[start:end]]
+                    for i, a in enumerate(members):
+                        for b in members[i + 1:]:
+                            if hamming_distance(phashes[a], phashes[b]) <= threshold:
+                                union_find.union(a, b)
+                start = end
+
+        self.cluster_ids = array('l', (union_find.find(i) for i in range(size)))
+        self._find_multi_category()
+        self._build_lookup()
+
+    def _find_multi_category(self):
+        """Find clusters whose images are filed under more than one category."""
+        first_category: Dict[int, int] = {}
+        self._multi_category = set()
+        for i, cluster in enumerate(self.cluster_ids):
+            category_id = self.category_ids[i]
+            if first_category.setdefault(cluster, category_id) != category_id:
+                self._multi_category.add(cluster)
+
+    def _build_lookup(self):
+        """Build the sorted URI-hash lookup arrays."""
+        order = sorted(range(len(self)), key=lambda i: uri_hash(self.uris[i]))
+        self._uri_keys = array('Q', (uri_hash(self.uris[i]) for i in order))
+        self._uri_positions = array('L', order)
+
+    def position(self, uri: str) -> Optional[int]:
+        """Return the entry index of a URI, or None if it is not indexed."""
+        key = uri_hash(uri)
+        # Compare the URIs too: a different URI may share the 64-bit hash
+        i = bisect_left(self._uri_keys, key)
+        while i < len(self._uri_keys) and self._uri_keys[i] == key:
+            position = self._uri_positions[i]
+            if self.uris[position] == uri:
+                return position
+            i += 1
+        return None
+
+    def cluster_of(self, uri: str) -> Optional[int]:
+        """Return the duplicate cluster id of a URI, or None if it is not indexed."""
+        position = self.position(uri)
+        return None if position is None else self.cluster_ids[position]
+
+    def spans_categories(self, cluster: int) -> bool:
+        """Whether a cluster holds images filed under more than one category."""
+        return cluster in self._multi_category
+
+    def duplicate_clusters(self) -> Dict[int, List[int]]:
+        """Return clusters with more than one member, as cluster id -> entry indices."""
+        members = defaultdict(list)
+        for i, cluster in enumerate(self.cluster_ids):
+            members[cluster].append(i)
+        return {cluster: indices for cluster, indices in members.items() if len(indices) > 1}
+
+    def print_summary(self):
+        """Print duplicate and cross-category statistics."""
+        clusters = self.duplicate_clusters()
+        duplicates = sum(len(indices) - 1 for indices in clusters.values())
+        print(f"Indexed images: {len(self)}")
+        print(f"Duplicate clusters: {len(clusters)} ({duplicates} redundant images)")
+        print(f"Clusters spanning categories: {len(self._multi_category)}")
+        for cluster in sorted(self._multi_category)[:10]:
+            labels = sorted({self.categories[self.category_ids[i]]
+                             for i in clusters.get(cluster, [cluster])})
+            print(f"  {self.uris[cluster]} -> {', '.join(labels)}")
+
+    def save(self, path: Path):
+        """Atomically save the index; arrays are stored as hex-encoded bytes."""
+        data = {
+            "version": 1,
+            "categories": self.categories,
+            "uris": self.uris,
+            "etags": self.etags,
+            "category_ids": self.category_ids.tobytes().hex(),
+            "content_hashes": self.content_hashes.tobytes().hex(),
+            "perceptual_hashes": self.perceptual_hashes.tobytes().hex(),
+            "cluster_ids": array('q', self.cluster_ids).tobytes().hex()
+        }
+        tmp_path = path.with_name(path.name + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: Path) -> 'DedupIndex':
+        """Load an index saved with save()."""
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+
+        index = cls(data["categories"])
+        index.uris = data["uris"]
+        index.etags = data["etags"]
+        index.category_ids = array('B', bytes.fromhex(data["category_ids"]))
+        index.content_hashes = array('Q', bytes.fromhex(data["content_hashes"]))
+        index.perceptual_hashes = array('Q', bytes.fromhex(data["perceptual_hashes"]))
+        index.cluster_ids = array('l', array('q', bytes.fromhex(data["cluster_ids"])))
+
+        index._find_multi_category()
+        index._build_lookup()
+        return index
+
+    def hashes_by_etag(self) -> Dict[str, Tuple[int, int]]:
+        """Map ETag -> (content hash, perceptual hash) for reuse when rebuilding."""
+        return {etag: (self.content_hashes[i], self.perceptual_hashes[i])
+                for i, etag in enumerate(self.etags)}
+
+
+def build_index(generator, categories: List[str], previous: Optional[DedupIndex] = None,
+                max_workers: int = DOWNLOAD_WORKERS,
+                threshold: int = HAMMING_THRESHOLD) -> DedupIndex:
+    """
+    Build a dedup index from the S3 images listed by a DatasetGenerator.
+
+    Args:
+        generator: DatasetGenerator providing the S3 client and listing
+        categories: Categories to index
+        previous: Previous index whose hashes are reused for unchanged ETags
+        max_workers: Concurrent image downloads
+        threshold: Max differing perceptual-hash bits for near duplicates
+
+    Returns:
+        Index with clusters built
+    """
+    cached = previous.hashes_by_etag() if previous is not None else {}
+    index = DedupIndex(categories)
+
+    def compute(obj) -> Tuple[int, int]:
+        response = generator.s3_client.get_object(
+            Bucket=generator.bucket_name, Key=obj['Key'])
+        body = response['Body'].read()
+        return hash64(body), difference_hash(body)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for category in categories:
+            objects = list(generator.iter_s3_objects(category))
+            pending = [obj for obj in objects
+                       if obj.get('ETag', '').strip('"') not in cached]
+            print(f"{category}: {len(objects)} images, {len(pending)} to hash")
+
+            futures = {obj['Key']: executor.submit(compute, obj) for obj in pending}
+            for obj in objects:
+                etag = obj.get('ETag', '').strip('"')
+                try:
+                    hashes = cached[etag] if etag in cached else futures[obj['Key']].result()
+                except Exception as e:
+                    print(f"Error hashing {obj['Key']}: {e}")
+                    continue
+                index.add(generator.s3_uri(obj['Key']), etag, category, *hashes)
+
+    index.build_clusters(threshold)
+    return index
+
+
+def main():
+    """Build the dedup index from S3."""
+    # Imported here so the index can be loaded without boto3 installed
+    from generate_dataset import (BUCKET_NAME, BUCKET_OWNER_ID, CATEGORIES,
+                                  S3_PREFIX, DatasetGenerator)
+
+    parser = argparse.ArgumentParser(
+        description="Build a near-duplicate index over the S3 images")
+    parser.add_argument("--output", type=str, default=DEDUP_INDEX_FILE,
+                        help=f"Index file; reused as ETag cache when it exists (default: {DEDUP_INDEX_FILE})")
+    parser.add_argument("--threshold", type=int, default=HAMMING_THRESHOLD,
+                        help=f"Max differing perceptual-hash bits for near duplicates (default: {HAMMING_THRESHOLD})")
+    parser.add_argument("--workers", type=int, default=DOWNLOAD_WORKERS,
+                        help=f"Concurrent image downloads (default: {DOWNLOAD_WORKERS})")
+    args = parser.parse_args()
+
+    output = Path(args.output)
+    previous = DedupIndex.load(output) if output.exists() else None
+
+    generator = DatasetGenerator(BUCKET_NAME, BUCKET_OWNER_ID, S3_PREFIX)
+    index = build_index(generator, CATEGORIES, previous,
+                        max_workers=args.workers, threshold=args.threshold)
+    index.save(output)
+    index.print_summary()
+    print(f"Dedup index saved to {output}")
+
+
+if __name__ == "__main__":
+    main()
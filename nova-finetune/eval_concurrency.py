@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+Concurrent request execution with adaptive (AIMD) throttling.
+
+AdaptiveConcurrencyLimiter caps the number of in-flight requests. The cap
+grows additively (about +1 per round trip) while requests succeed, and is cut
+multiplicatively on throttling errors or when latency rises above a target.
+An optional target requests-per-second paces request starts on top of that.
+
+ConcurrentEvaluator runs a function over a sequence of items on a thread pool
+gated by the limiter, retries throttled calls with jittered backoff, and
+yields outcomes in input order.
+"""
+
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterable, Iterator, Optional
+
+INITIAL_CONCURRENCY = 4
+MAX_CONCURRENCY = 16
+MAX_RETRIES = 8
+BACKOFF_BASE_SECONDS = 0.5
+BACKOFF_MAX_SECONDS = 20.0
+
+# Error codes that signal server-side throttling rather than a failed request
+THROTTLING_ERROR_CODES = ("ThrottlingException", "TooManyRequestsException",
+                          "ServiceUnavailableException", "ModelNotReadyException")
+
+
+def is_throttling_error(error: Exception) -> bool:
+    """Return True if an exception is a throttling error (botocore ClientError shape)."""
+    response = getattr(error, "response", None)
+    if isinstance(response, dict):
+        code = response.get("Error", {}).get("Code")
+        if code in THROTTLING_ERROR_CODES:
+            return True
+    return type(error).__name__ in THROTTLING_ERROR_CODES
+
+
+class AdaptiveConcurrencyLimiter:
+    """AIMD limit on in-flight requests, with optional requests-per-second pacing."""
+
+    def __init__(self, initial: int = INITIAL_CONCURRENCY, min_limit: int = 1,
+                 max_limit: int = MAX_CONCURRENCY, target_rps: Optional[float] = None,
+                 latency_target_ms: Optional[float] = None, decrease_factor: float = 0.5):
+        """
+        Initialize limiter.
+
+        Args:
+            initial: Starting concurrency limit
+            min_limit: Lowest concurrency limit
+            max_limit: Highest concurrency limit
+            target_rps: Max request starts per second (None for no pacing)
+            latency_target_ms: Latency above which the limit is reduced
+            decrease_factor: Multiplier applied to the limit on throttling
+        """
+        self.min_limit = max(1, min_limit)
+        self.max_limit = max(self.min_limit, max_limit)
+        self.limit = float(min(max(initial, self.min_limit), self.max_limit))
+        self.target_rps = target_rps
+        self.latency_target = latency_target_ms / 1000 if latency_target_ms else None
+        self.decrease_factor = decrease_factor
+
+        self.in_flight = 0
+        self.throttled = 0
+        self.peak_limit = self.limit
+        self._condition = threading.Condition()
+        self._next_start = 0.0
+        self._last_decrease = 0.0
+
+    def acquire(self):
+        """Block until a request may start."""
+        with self._condition:
+            while self.in_flight >= int(self.limit):
+                self._condition.wait()
+            self.in_flight += 1
+
+            if self.target_rps:
+                # Reserve the next start slot; sleep outside the lock
+                now = time.monotonic()
+                start = max(now, self._next_start)
+                self._next_start = start + 1.0 / self.target_rps
+                delay = start - now
+            else:
+                delay = 0.0
+
+        if delay > 0:
+            time.sleep(delay)
+
+    def release(self, latency: float, throttled: bool = False):
+        """
+        Finish a request and adjust the limit.
+
+        Args:
+            latency: Request latency in seconds
+            throttled: Whether the request was throttled
+        """
+        with self._condition:
+            self.in_flight -= 1
+            now = time.monotonic()
+            congested = throttled or (
+                self.latency_target is not None and latency > self.latency_target)
+
+            if congested:
+                self.throttled += throttled
+                # Cut at most once per round trip, so one burst of errors
+                # from the same window does not collapse the limit
+                if now - self._last_decrease >= latency:
+                    factor = self.decrease_factor if throttled else (1 + self.decrease_factor) / 2
+                    self.limit = max(self.min_limit, self.limit * factor)
+                    self._last_decrease = now
+            else:
+                self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+                self.peak_limit = max(self.peak_limit, self.limit)
+
+            self._condition.notify_all()
+
+
+class ConcurrentEvaluator:
+    """Run a function over items concurrently, in input order, under an adaptive limit."""
+
+    def __init__(self, limiter: AdaptiveConcurrencyLimiter, max_retries: int = MAX_RETRIES):
+        """
+        Initialize evaluator.
+
+        Args:
+            limiter: Concurrency limiter shared by all calls
+            max_retries: Retries per item after throttling errors
+        """
+        self.limiter = limiter
+        self.max_retries = max_retries
+
+    def _call(self, fn: Callable[[Any], Any], item: Any) -> Dict[str, Any]:
+        """Call fn(item) under the limiter, retrying throttled attempts."""
+        retries = 0
+        while True:
+            self.limiter.acquire()
+            start = time.perf_counter()
+            try:
+                value = fn(item)
+            except Exception as e:
+                latency = time.perf_counter() - start
+                throttled = is_throttling_error(e)
+                self.limiter.release(latency, throttled=throttled)
+                if throttled and retries < self.max_retries:
+                    retries += 1
+                    # Full jitter keeps retries from arriving in lockstep
+                    time.sleep(random.uniform(
+                        0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** retries)))
+                    continue
+                return {"value": None, "error": e, "retries": retries, "latency": latency}
+
+            latency = time.perf_counter() - start
+            self.limiter.release(latency)
+            return {"value": value, "error": None, "retries": retries, "latency": latency}
+
+    def map(self, fn: Callable[[Any], Any], items: Iterable[Any]) -> Iterator[Dict[str, Any]]:
+        """
+        Apply fn to every item concurrently.
+
+        Items are submitted through a bounded window, so large inputs are not
+        all queued up front.
+
+        Args:
+            fn: Function called with one item; exceptions are captured
+            items: Items to process
+
+        Yields:
+            Dictionaries with value, error, retries and latency (seconds),
+            in input order
+        """
+        window = self.limiter.max_limit * 4
+        pending = deque()
+        with ThreadPoolExecutor(max_workers=self.limiter.max_limit) as executor:
+            for item in items:
+                pending.append(executor.submit(self._call, fn, item))
+                if len(pending) >= window:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
@@ -0,0 +1,424 @@
+#!/usr/bin/env python3
+"""
+Streaming classification metrics with bootstrap confidence intervals.
+
+MetricsAccumulator updates a NumPy confusion matrix one result at a time, so
+per-class precision, recall and F1 can be printed live during a run. At the
+end, bootstrap confidence intervals are computed with vectorized resampling:
+each batch of replicates is drawn as one index matrix and turned into
+per-replicate confusion matrices with a single bincount.
+
+usage_summary() turns the per-request instrumentation in result records
+(client and server latency, tokens, retries) into latency percentiles and a
+histogram, throughput and an estimated cost per 1,000 images.
+"""
+
+import warnings
+from array import array
+from typing import Any, Dict, List, Optional, Tuple
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+BOOTSTRAP_SAMPLES = 1000
+CONFIDENCE_LEVEL = 0.95
+BOOTSTRAP_MAX_ELEMENTS = 8_000_000  # Resampled indexes held in memory per batch
+OTHER_LABEL = "other"  # Column for predictions outside the categories (e.g. "error")
+
+LATENCY_PERCENTILES = [50, 95, 99]
+LATENCY_HISTOGRAM_BUCKETS_MS = [100, 200, 500, 1000, 2000, 5000, 10000]
+HISTOGRAM_WIDTH = 40
+
+# On-demand USD prices per 1,000 input and output tokens, by base model
+MODEL_PRICES_PER_1K_TOKENS = {
+    "amazon.nova-micro-v1": (0.000035, 0.00014),
+    "amazon.nova-lite-v1": (0.00006, 0.00024),
+    "amazon.nova-pro-v1": (0.0008, 0.0032),
+}
+# Prompt cache token prices relative to the input token price (Nova: reads
+# are discounted 75%, writes cost the same as uncached input)
+CACHE_READ_PRICE_FACTOR = 0.25
+CACHE_WRITE_PRICE_FACTOR = 1.0
+
+
+def _require_numpy():
+    if np is None:
+        raise RuntimeError("Evaluation metrics require numpy: pip install numpy")
+
+
+def _rates(confusion) -> Dict[str, Any]:
+    """
+    Per-class precision, recall and F1 from one or more confusion matrices.
+
+    Args:
+        confusion: (..., K, K + 1) counts; rows are expected classes, columns
+            predicted classes plus a final "other" column
+
+    Returns:
+        Dictionary of arrays shaped (..., K) plus accuracy and macro_f1 (...)
+    """
+    classes = confusion.shape[-2]
+    diagonal = np.diagonal(confusion[..., :classes], axis1=-2, axis2=-1).astype(float)
+    predicted = confusion[..., :classes].sum(axis=-2)
+    expected = confusion.sum(axis=-1)
+    total = expected.sum(axis=-1)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        precision = np.where(predicted > 0, diagonal / predicted, np.nan)
+        recall = np.where(expected > 0, diagonal / expected, np.nan)
+        f1 = np.where(precision + recall > 0,
+                      2 * precision * recall / (precision + recall), 0.0)
+        f1 = np.where(np.isnan(precision) | np.isnan(recall), np.nan, f1)
+        accuracy = np.where(total > 0, diagonal.sum(axis=-1) / total, np.nan)
+    with warnings.catch_warnings():
+        # Replicates without any defined F1 give NaN macro F1
+        warnings.simplefilter('ignore', RuntimeWarning)
+        macro_f1 = np.nanmean(np.where(expected > 0, f1, np.nan), axis=-1)
+    return {"precision": precision, "recall": recall, "f1": f1, "accuracy": accuracy,
+            "macro_f1": macro_f1}
+
+
+class MetricsAccumulator:
+    """Incremental confusion matrix and metrics for one model's results."""
+
+    def __init__(self, categories: List[str]):
+        """
+        Initialize accumulator.
+
+        Args:
+            categories: Class labels; other predictions count in an "other" column
+        """
+        _require_numpy()
+        self.categories = list(categories)
+        self.labels = self.categories + [OTHER_LABEL]
+        self._index = {label: i for i, label in enumerate(self.categories)}
+        self.confusion = np.zeros((len(self.categories), len(self.labels)), dtype=np.int64)
+        # Encoded (expected, predicted) pair of every result, for resampling
+        self._pairs = array('l')
+
+    def update(self, expected: str, predicted: str):
+        """Add one result; results with an unknown expected label are ignored."""
+        row = self._index.get(expected)
+        if row is None:
+            return
+        column = self._index.get(predicted, len(self.categories))
+        self.confusion[row, column] += 1
+        self._pairs.append(row * len(self.labels) + column)
+
+    def update_result(self, result: Dict[str, Any]):
+        """Add one evaluator result record."""
+        self.update(result["expected_label"], result["normalized_prediction"])
+
+    @property
+    def total(self) -> int:
+        return len(self._pairs)
+
+    @property
+    def pairs(self):
+        """Encoded (expected, predicted) pairs as a NumPy array, in update order."""
+        return np.frombuffer(self._pairs, dtype=f"i{self._pairs.itemsize}").astype(np.intp)
+
+    def rates(self) -> Dict[str, Any]:
+        """Current per-class precision, recall, F1, accuracy and macro F1."""
+        return _rates(self.confusion)
+
+    def live_summary(self) -> str:
+        """One-line summary for progress output."""
+        rates = self.rates()
+        parts = [f"acc {rates['accuracy'] * 100:.2f}%" if self.total else "acc -"]
+        for i, category in enumerate(self.categories):
+            values = [rates[name][i] for name in ("precision", "recall", "f1")]
+            parts.append(f"{category} P/R/F1 " + "/".join(
+                "-" if np.isnan(value) else f"{value:.2f}" for value in values))
+        return " | ".join(parts)
+
+    def bootstrap(self, samples: int = BOOTSTRAP_SAMPLES, confidence: float = CONFIDENCE_LEVEL,
+                  seed: int = 0) -> Dict[str, Any]:
+        """
+        Percentile bootstrap confidence intervals for all metrics.
+
+        Args:
+            samples: Bootstrap replicates
+            confidence: Confidence level, e.g. 0.95
+            seed: Seed for resampling
+
+        Returns:
+            Dictionary with (low, high) per metric: accuracy and macro_f1, and
+            per-category precision, recall and f1
+        """
+        replicates = bootstrap_confusions([self.pairs], len(self.categories), len(self.labels),
+                                          samples, seed)[0]
+        rates = _rates(replicates)
+        tail = (1 - confidence) / 2 * 100
+
+        def interval(values):
+            if np.all(np.isnan(values)):
+                return None
+            low, high = np.nanpercentile(values, [tail, 100 - tail], axis=0)
+            return float(low), float(high)
+
+        return {
+            "confidence": confidence,
+            "samples": samples,
+            "accuracy": interval(rates["accuracy"]),
+            "macro_f1": interval(rates["macro_f1"]),
+            "per_category": {
+                category: {name: interval(rates[name][:, i])
+                           for name in ("precision", "recall", "f1")}
+                for i, category in enumerate(self.categories)
+            }
+        }
+
+    def summary(self, samples: int = BOOTSTRAP_SAMPLES, confidence: float = CONFIDENCE_LEVEL,
+                seed: int = 0) -> Dict[str, Any]:
+        """
+        Accuracy statistics in the evaluator's report format, with intervals.
+
+        Args:
+            samples: Bootstrap replicates (0 to skip intervals)
+            confidence: Confidence level
+            seed: Seed for resampling
+
+        Returns:
+            Dictionary with overall accuracy, per-category stats, confusion
+            matrix and confidence intervals
+        """
+        rates = self.rates()
+        total = self.total
+        correct = int(np.trace(self.confusion[:, :len(self.categories)]))
+        category_stats = {}
+        for i, category in enumerate(self.categories):
+            count = int(self.confusion[i].sum())
+            if count:
+                category_stats[category] = {
+                    "total": count,
+                    "correct": int(self.confusion[i, i]),
+                    "accuracy": float(self.confusion[i, i] / count * 100),
+                    "precision": None if np.isnan(rates["precision"][i]) else float(rates["precision"][i]),
+                    "recall": float(rates["recall"][i]),
+                    "f1": None if np.isnan(rates["f1"][i]) else float(rates["f1"][i])
+                }
+
+        return {
+            "overall_accuracy": correct / total * 100 if total else 0.0,
+            "total_samples": total,
+            "correct_predictions": correct,
+            "category_stats": category_stats,
+            "confusion_matrix": {
+                expected: {predicted: int(self.confusion[i, j])
+                           for j, predicted in enumerate(self.labels)}
+                for i, expected in enumerate(self.categories)
+            },
+            "macro_f1": None if np.isnan(rates["macro_f1"]) else float(rates["macro_f1"]),
+            "confidence_intervals": self.bootstrap(samples, confidence, seed)
+            if samples and total else None
+        }
+
+
+def bootstrap_confusions(pair_arrays: List[Any], classes: int, labels: int,
+                         samples: int = BOOTSTRAP_SAMPLES, seed: int = 0) -> List[Any]:
+    """
+    Resample results with replacement and build a confusion matrix per replicate.
+
+    Several arrays of equal length are resampled with the same indexes, which
+    gives a paired bootstrap when they hold different models' results for the
+    same test samples.
+
+    Args:
+        pair_arrays: Encoded (expected, predicted) arrays of equal length
+        classes: Number of expected classes
+        labels: Number of predicted labels (classes + other)
+        samples: Bootstrap replicates
+        seed: Seed for resampling
+
+    Returns:
+        One (samples, classes, labels) array per input array
+    """
+    _require_numpy()
+    n = len(pair_arrays[0])
+    cells = classes * labels
+    outputs = [np.zeros((samples, classes, labels), dtype=np.int64) for _ in pair_arrays]
+    if n == 0:
+        return outputs
+
+    rng = np.random.default_rng(seed)
+    batch = max(1, BOOTSTRAP_MAX_ELEMENTS // n)
+    for start in range(0, samples, batch):
+        size = min(batch, samples - start)
+        indexes = rng.integers(0, n, size=(size, n))
+        # Offset each replicate's cells so one bincount fills every matrix
+        offsets = (np.arange(size) * cells)[:, None]
+        for pairs, output in zip(pair_arrays, outputs):
+            counts = np.bincount((pairs[indexes] + offsets).ravel(), minlength=size * cells)
+            output[start:start + size] = counts.reshape(size, classes, labels)
+    return outputs
+
+
+def paired_accuracy_difference(first: MetricsAccumulator, second: MetricsAccumulator,
+                               samples: int = BOOTSTRAP_SAMPLES,
+                               confidence: float = CONFIDENCE_LEVEL,
+                               seed: int = 0) -> Optional[Dict[str, float]]:
+    """
+    Paired bootstrap interval for accuracy(first) - accuracy(second).
+
+    Both accumulators must hold results for the same samples in the same order.
+
+    Returns:
+        Dictionary with difference, low and high, or None without results
+    """
+    if first.total == 0 or first.total != second.total:
+        return None
+    replicates = bootstrap_confusions([first.pairs, second.pairs], len(first.categories),
+                                      len(first.labels), samples, seed)
+    differences = _rates(replicates[0])["accuracy"] - _rates(replicates[1])["accuracy"]
+    tail = (1 - confidence) / 2 * 100
+    low, high = np.percentile(differences, [tail, 100 - tail])
+    return {"difference": float(first.rates()["accuracy"] - second.rates()["accuracy"]),
+            "low": float(low), "high": float(high)}
+
+
+def percentiles(values: List[float], quantiles: List[float]) -> List[Optional[float]]:
+    """
+    Percentiles of a list of values (linear interpolation).
+
+    Args:
+        values: Observations, e.g. latencies
+        quantiles: Percentiles to compute, e.g. [50, 95, 99]
+
+    Returns:
+        One value per percentile, or None for each when values is empty
+    """
+    if not values:
+        return [None] * len(quantiles)
+    _require_numpy()
+    return [float(value) for value in np.percentile(np.asarray(values, dtype=float), quantiles)]
+
+
+def model_prices(model_id: str) -> Optional[Tuple[float, float]]:
+    """
+    Look up token prices for a model ID, inference profile or custom model ARN.
+
+    Returns:
+        (input, output) USD per 1,000 tokens, or None for unknown models
+    """
+    for base_model, prices in MODEL_PRICES_PER_1K_TOKENS.items():
+        if base_model in model_id:
+            return prices
+    return None
+
+
+def _mean(values: List[float]) -> Optional[float]:
+    return sum(values) / len(values) if values else None
+
+
+def usage_summary(results: List[Dict[str, Any]], elapsed_seconds: Optional[float] = None,
+                  prices: Optional[Tuple[float, float]] = None) -> Dict[str, Any]:
+    """
+    Summarize per-request latency, token usage and cost of an evaluation run.
+
+    Responses served from the response cache count toward token usage but not
+    toward latency or throughput. Prompt cache read and write tokens are
+    reported apart from (uncached) input tokens and priced with
+    CACHE_READ_PRICE_FACTOR and CACHE_WRITE_PRICE_FACTOR.
+
+    Args:
+        results: Result records with instrumentation fields
+        elapsed_seconds: Wall-clock duration of the run
+        prices: (input, output) USD per 1,000 tokens
+
+    Returns:
+        Dictionary with request counts, latency percentiles and histogram,
+        throughput, tokens per image, prompt cache tokens and estimated cost
+        per 1,000 images
+    """
+    measured = [r for r in results if r.get("client_latency_ms") is not None and not r.get("cached")]
+    client_ms = [r["client_latency_ms"] for r in measured]
+    server_ms = [r["server_latency_ms"] for r in measured if r.get("server_latency_ms") is not None]
+    input_tokens = [r["input_tokens"] for r in results if r.get("input_tokens") is not None]
+    output_tokens = [r["output_tokens"] for r in results if r.get("output_tokens") is not None]
+    usage_results = [r for r in results if r.get("input_tokens") is not None]
+    cache_read = [r.get("cache_read_tokens") or 0 for r in usage_results]
+    cache_write = [r.get("cache_write_tokens") or 0 for r in usage_results]
+
+    counts = [0] * (len(LATENCY_HISTOGRAM_BUCKETS_MS) + 1)
+    for value in client_ms:
+        counts[next((i for i, bound in enumerate(LATENCY_HISTOGRAM_BUCKETS_MS) if value < bound),
+                    len(LATENCY_HISTOGRAM_BUCKETS_MS))] += 1
+
+    cost = None
+    if prices and input_tokens and output_tokens:
+        # Per-1k-token prices times mean tokens per image = cost per 1k images
+        cost = (_mean(input_tokens) * prices[0] +
+                _mean(cache_read) * prices[0] * CACHE_READ_PRICE_FACTOR +
+                _mean(cache_write) * prices[0] * CACHE_WRITE_PRICE_FACTOR +
+                _mean(output_tokens) * prices[1])
+
+    return {
+        "requests": len(results),
+        "measured_requests": len(measured),
+        "cached_responses": sum(1 for r in results if r.get("cached")),
+        "errors": sum(1 for r in results if r.get("raw_prediction") == "error"),
+        "retries": sum(r.get("retries", 0) for r in results),
+        "elapsed_seconds": elapsed_seconds,
+        "throughput_per_second": len(measured) / elapsed_seconds
+        if elapsed_seconds and measured else None,
+        "client_latency_ms": dict(zip((f"p{q}" for q in LATENCY_PERCENTILES),
+                                      percentiles(client_ms, LATENCY_PERCENTILES)),
+                                  mean=_mean(client_ms)),
+        "server_latency_ms": dict(zip((f"p{q}" for q in LATENCY_PERCENTILES),
+                                      percentiles(server_ms, LATENCY_PERCENTILES)),
+                                  mean=_mean(server_ms)),
+        "latency_histogram_ms": {
+            label: count for label, count in zip(
+                [f"<{bound}" for bound in LATENCY_HISTOGRAM_BUCKETS_MS] +
+                [f">={LATENCY_HISTOGRAM_BUCKETS_MS[-1]}"], counts)
+        },
+        "input_tokens_per_image": _mean(input_tokens),
+        "output_tokens_per_image": _mean(output_tokens),
+        "cache_read_tokens_per_image": _mean(cache_read),
+        "cache_write_tokens_per_image": _mean(cache_write),
+        "cache_read_tokens": sum(cache_read),
+        "cache_write_tokens": sum(cache_write),
+        "prompt_cache_hits": sum(1 for tokens in cache_read if tokens),
+        "price_per_1k_tokens": list(prices) if prices else None,
+        "cost_per_1k_images": cost
+    }
+
+
+def print_usage_report(summary: Dict[str, Any]):
+    """Print latency, throughput, token and cost statistics from usage_summary()."""
+    def ms(value):
+        return "-" if value is None else f"{value:.0f} ms"
+
+    print("\nLatency and Usage:")
+    print("-" * 40)
+    print(f"Requests: {summary['requests']} ({summary['measured_requests']} timed, "
+          f"{summary['cached_responses']} from cache, {summary['errors']} errors, "
+          f"{summary['retries']} retries)")
+    for name in ("client", "server"):
+        latency = summary[f"{name}_latency_ms"]
+        print(f"{name.capitalize():>8} latency: " + ", ".join(
+            f"{key} {ms(latency[key])}" for key in [f"p{q}" for q in LATENCY_PERCENTILES] + ["mean"]))
+
+    histogram = summary["latency_histogram_ms"]
+    peak = max(histogram.values()) if histogram else 0
+    if peak:
+        print("Client latency histogram:")
+        for label, count in histogram.items():
+            bar = "#" * round(count / peak * HISTOGRAM_WIDTH)
+            print(f"{label + ' ms':>10} | {bar} {count}")
+
+    throughput = summary["throughput_per_second"]
+    if throughput:
+        print(f"Throughput: {throughput:.2f} images/s ({throughput * 3600:,.0f} images/hour)")
+    if summary["input_tokens_per_image"] is not None:
+        print(f"Tokens per image: {summary['input_tokens_per_image']:.0f} input, "
+              f"{summary['output_tokens_per_image']:.1f} output")
+    if summary["cache_read_tokens"] or summary["cache_write_tokens"]:
+        print(f"Prompt cache: {summary['cache_read_tokens_per_image']:.0f} read, "
+              f"{summary['cache_write_tokens_per_image']:.1f} written tokens per image "
+              f"({summary['prompt_cache_hits']}/{summary['requests']} requests read the cache)")
+    if summary["cost_per_1k_images"] is not None:
+        print(f"Estimated cost: ${summary['cost_per_1k_images']:.4f} per 1k images")
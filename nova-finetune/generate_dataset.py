@@ -4,19 +4,37 @@ Generate training dataset from S3 stored images for Nova content moderation fine
 Creates separate JSONL files for each category (neutral.jsonl, sexy.jsonl, porn.jsonl).
 """
 
+import argparse
 import json
+import queue
 import random
+import threading
+import time
 import boto3
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterable, Iterator, Optional, Set, Tuple
 import os
 from pathlib import Path
 
+from image_preflight import (ImagePreflight, PREFLIGHT_CACHE_FILE,
+                             PREFLIGHT_REPORT_FILE, PREFLIGHT_WORKERS, batched)
+
 # Configuration
 BUCKET_NAME = "sagemaker-us-east-1-xxxxx"
 BUCKET_OWNER_ID = "xxxxx"
 S3_PREFIX = "nova-finetune"
 CATEGORIES = ["neutral", "porn", "sexy"]
 OUTPUT_DIR = Path(".")
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+# Streaming pipeline settings
+WRITE_FLUSH_LINES = 1000  # Flush buffered JSONL lines to disk every N samples
+LISTING_QUEUE_PAGES = 4  # Max S3 listing pages (1000 keys each) held in memory
+PROGRESS_INTERVAL_SECONDS = 5.0
+
+PREFLIGHT_BATCH_SIZE = 1000  # Objects checked concurrently per preflight batch
+
+# Incremental generation: one manifest per category, next to its JSONL file
+MANIFEST_SUFFIX = ".manifest"
 
 # System message for all samples
 SYSTEM_MESSAGE = "You are a content moderation classifier that determines if an image is porn, sexy, or neutral."
@@ -31,6 +49,298 @@ USER_PROMPTS = [
 ]
 
 
+class JsonlStreamWriter:
+    """Buffered JSONL writer that flushes to disk every few samples."""
+
+    def __init__(self, output_file: Path, flush_lines: int = WRITE_FLUSH_LINES,
+                 mode: str = 'w', fsync_seconds: Optional[float] = None):
+        """
+        Initialize stream writer. The file is opened lazily on first write;
+        in 'w' mode close() truncates it even if nothing was written.
+
+        Args:
+            output_file: Output file path
+            flush_lines: Number of buffered lines that triggers a flush
+            mode: File open mode ('w' to truncate, 'a' to append)
+            fsync_seconds: Also fsync on flush when this many seconds have
+                passed since the last fsync (None to fsync only on close)
+        """
+        self.output_file = output_file
+        self.flush_lines = flush_lines
+        self.mode = mode
+        self.fsync_seconds = fsync_seconds
+        self.lines_written = 0
+        self._buffer: List[str] = []
+        self._file = None
+        self._last_fsync = time.monotonic()
+
+    def write_line(self, json_line: str):
+        """Buffer a single serialized JSON line."""
+        self._buffer.append(json_line)
+        if len(self._buffer) >= self.flush_lines:
+            self.flush()
+
+    def write_sample(self, sample: Dict[str, Any]):
+        """Serialize and buffer a single sample."""
+        self.write_line(json.dumps(sample, ensure_ascii=False))
+
+    def flush(self):
+        """Write buffered lines and flush them to the operating system."""
+        if not self._buffer:
+            return
+        if self._file is None:
+            self._file = open(self.output_file, self.mode, encoding='utf-8')
+        self._file.write('\n'.join(self._buffer) + '\n')
+        self._file.flush()
+        self.lines_written += len(self._buffer)
+        self._buffer.clear()
+
+        if self.fsync_seconds is not None and time.monotonic() - self._last_fsync >= self.fsync_seconds:
+            os.fsync(self._file.fileno())
+            self._last_fsync = time.monotonic()
+
+    def close(self):
+        """Flush remaining lines and close the file."""
+        self.flush()
+        if self._file is None and self.mode == 'w':
+            # No lines at all: still replace stale content from an earlier run
+            self._file = open(self.output_file, self.mode, encoding='utf-8')
+        if self._file is not None:
+            os.fsync(self._file.fileno())
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class ProgressReporter:
+    """Periodic progress output in samples per second."""
+
+    def __init__(self, label: str, interval: float = PROGRESS_INTERVAL_SECONDS):
+        """
+        Initialize progress reporter.
+
+        Args:
+            label: Name printed with each progress line
+            interval: Minimum seconds between progress lines
+        """
+        self.label = label
+        self.interval = interval
+        self.count = 0
+        self.start_time = time.monotonic()
+        self._last_report = self.start_time
+
+    @property
+    def rate(self) -> float:
+        """Average samples per second since start."""
+        elapsed = time.monotonic() - self.start_time
+        return self.count / elapsed if elapsed > 0 else 0.0
+
+    def update(self, n: int = 1):
+        """Record n processed samples and print progress if due."""
+        self.count += n
+        now = time.monotonic()
+        if now - self._last_report >= self.interval:
+            self._last_report = now
+            print(
+                f"Generated {self.count} samples for {self.label} ({self.rate:.1f} samples/s)")
+
+
+def image_format_from_key(s3_key: str) -> str:
+    """Infer the Bedrock image format from an object key's extension."""
+    if s3_key.lower().endswith('.png'):
+        return "png"
+    return "jpeg"
+
+
+class SampleEmitter:
+    """
+    Fast JSONL emitter built on pre-serialized sample templates.
+
+    Everything in a sample except the image URI is fixed by its category,
+    image format and user prompt, so each combination is serialized once
+    and only the JSON-escaped URI is spliced in per line. The output is
+    byte-identical to json.dumps(create_conversation_sample(...)) and
+    consumes the random prompt choice in the same way.
+    """
+
+    _URI_PLACEHOLDER = "\x00uri\x00"
+
+    def __init__(self, generator: 'DatasetGenerator'):
+        """
+        Initialize emitter.
+
+        Args:
+            generator: Dataset generator providing bucket settings and sample layout
+        """
+        self.generator = generator
+        self._templates: Dict[Tuple[str, str], List[Tuple[str, str]]] = {}
+
+    def _compile(self, category: str, image_format: str) -> List[Tuple[str, str]]:
+        """Serialize the (head, tail) around the URI for every user prompt."""
+        templates = []
+        for user_prompt in USER_PROMPTS:
+            # Lengthen the placeholder until no other field serializes to it
+            marker = self._URI_PLACEHOLDER
+            while True:
+                sample = self.generator.build_conversation_sample(
+                    marker, image_format, user_prompt, category)
+                parts = json.dumps(sample, ensure_ascii=False).split(json.dumps(marker))
+                if len(parts) == 2:
+                    break
+                marker += "\x00"
+            templates.append((parts[0], parts[1]))
+        self._templates[(category, image_format)] = templates
+        return templates
+
+    def emit(self, s3_key: str, category: str, image_format: Optional[str] = None) -> str:
+        """
+        Serialize a conversation sample for an image as a JSONL line.
+
+        Args:
+            s3_key: S3 object key for the image
+            category: Image category
+            image_format: Image format; inferred from the key when omitted
+
+        Returns:
+            JSON line without trailing newline
+        """
+        if image_format is None:
+            image_format = image_format_from_key(s3_key)
+
+        templates = self._templates.get((category, image_format))
+        if templates is None:
+            templates = self._compile(category, image_format)
+
+        head, tail = random.choice(templates)
+        return head + json.dumps(self.generator.s3_uri(s3_key), ensure_ascii=False) + tail
+
+
+class GenerationManifest:
+    """
+    Compact record of the S3 objects emitted into a category JSONL file.
+
+    The manifest is a JSON-lines file with one [key, etag, last_modified]
+    array per emitted object, in S3 listing (key) order, followed by a
+    footer object describing the JSONL file it belongs to. Keeping the
+    entries sorted lets an incremental run merge the manifest with a fresh
+    listing in a single pass with constant memory.
+    """
+
+    def __init__(self, path: Path):
+        """
+        Initialize manifest.
+
+        Args:
+            path: Manifest file path
+        """
+        self.path = path
+
+    @staticmethod
+    def object_entry(obj: Dict[str, Any]) -> List[str]:
+        """Build the manifest entry for an S3 object summary."""
+        last_modified = obj.get('LastModified', '')
+        if hasattr(last_modified, 'isoformat'):
+            last_modified = last_modified.isoformat()
+        return [obj['Key'], obj.get('ETag', '').strip('"'), str(last_modified)]
+
+    def read_footer(self) -> Optional[Dict[str, Any]]:
+        """
+        Read the footer of a completed manifest.
+
+        Returns:
+            Footer dictionary, or None if the manifest is missing or incomplete
+        """
+        try:
+            with open(self.path, 'rb') as f:
+                f.seek(0, os.SEEK_END)
+                size = f.tell()
+                f.seek(max(0, size - 4096))
+                last_line = f.read().rstrip(b'\n').rsplit(b'\n', 1)[-1]
+            footer = json.loads(last_line.decode('utf-8'))
+        except (OSError, ValueError):
+            return None
+        return footer if isinstance(footer, dict) else None
+
+    def iter_entries(self) -> Iterator[List[str]]:
+        """Iterate over manifest entries in key order."""
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                entry = json.loads(line)
+                if isinstance(entry, list):
+                    yield entry
+
+    def writer(self) -> JsonlStreamWriter:
+        """Open a writer for a new manifest next to the current one."""
+        return JsonlStreamWriter(self.path.with_name(self.path.name + '.tmp'))
+
+    def commit(self, writer: JsonlStreamWriter, footer: Dict[str, Any]):
+        """
+        Append the footer and atomically replace the current manifest.
+
+        Args:
+            writer: Writer returned by writer() with all entries written
+            footer: Footer describing the matching JSONL file
+        """
+        writer.write_line(json.dumps(footer, ensure_ascii=False))
+        writer.close()
+        os.replace(writer.output_file, self.path)
+
+    def discard(self, writer: Optional[JsonlStreamWriter] = None):
+        """Remove the manifest (and a pending new one), forcing a full rebuild next time."""
+        if writer is not None:
+            self.abandon(writer)
+        self.path.unlink(missing_ok=True)
+
+    @staticmethod
+    def abandon(writer: JsonlStreamWriter):
+        """Remove a pending new manifest, keeping the current one."""
+        writer.close()
+        writer.output_file.unlink(missing_ok=True)
+
+
+def merge_sorted_entries(previous: Iterator[List[str]],
+                         current: Iterator[Dict[str, Any]]
+                         ) -> Iterator[Tuple[str, Optional[List[str]], Optional[Dict[str, Any]]]]:
+    """
+    Merge-join previous manifest entries with a current S3 listing by key.
+
+    Both inputs must be sorted by key, which S3 listings guarantee.
+
+    Args:
+        previous: Manifest entries from the last run
+        current: S3 object summaries from the current listing
+
+    Yields:
+        Tuples of (key, previous_entry or None, current_object or None)
+    """
+    prev_entry = next(previous, None)
+    cur_obj = next(current, None)
+    last_key = None
+
+    while prev_entry is not None or cur_obj is not None:
+        if cur_obj is not None:
+            if last_key is not None and cur_obj['Key'] < last_key:
+                raise ValueError(
+                    "S3 listing is not sorted by key; run a full regeneration instead")
+            last_key = cur_obj['Key']
+
+        if cur_obj is None or (prev_entry is not None and prev_entry[0] < cur_obj['Key']):
+            yield prev_entry[0], prev_entry, None
+            prev_entry = next(previous, None)
+        elif prev_entry is None or cur_obj['Key'] < prev_entry[0]:
+            yield cur_obj['Key'], None, cur_obj
+            cur_obj = next(current, None)
+        else:
+            yield cur_obj['Key'], prev_entry, cur_obj
+            prev_entry = next(previous, None)
+            cur_obj = next(current, None)
+
+
 class DatasetGenerator:
     """Generate Bedrock conversation format dataset from S3 images."""
 
@@ -47,6 +357,126 @@ class DatasetGenerator:
         self.bucket_owner_id = bucket_owner_id
         self.s3_prefix = s3_prefix
         self.s3_client = boto3.client('s3')
+        self.emitter = SampleEmitter(self)
+        self.preflight: Optional[ImagePreflight] = None
+
+    def enable_preflight(self, cache_file: Path, max_workers: int = PREFLIGHT_WORKERS):
+        """
+        Check every new image's header before it is written to the dataset.
+
+        Args:
+            cache_file: JSON file caching preflight results by ETag
+            max_workers: Number of concurrent S3 requests
+        """
+        self.preflight = ImagePreflight(
+            self.s3_client, self.bucket_name, cache_file, max_workers=max_workers)
+
+    def iter_s3_objects(self, category: str) -> Iterator[Dict[str, Any]]:
+        """
+        Iterate over image objects in S3 for a specific category, page by page.
+
+        Args:
+            category: Image category (neutral, porn, sexy)
+
+        Yields:
+            S3 object summaries (Key, ETag, LastModified, Size)
+        """
+        prefix = f"{self.s3_prefix}/{category}/"
+        paginator = self.s3_client.get_paginator('list_objects_v2')
+
+        for page in paginator.paginate(Bucket=self.bucket_name, Prefix=prefix):
+            for obj in page.get('Contents', []):
+                if obj['Key'].lower().endswith(IMAGE_EXTENSIONS):
+                    yield obj
+
+    def iter_s3_objects_prefetched(self, category: str) -> Iterator[Dict[str, Any]]:
+        """
+        Iterate over image objects while a background thread lists ahead.
+
+        Listing runs concurrently with sample creation and writing, with at
+        most LISTING_QUEUE_PAGES pages buffered between the two.
+
+        Args:
+            category: Image category
+
+        Yields:
+            S3 object summaries
+        """
+        pages: queue.Queue = queue.Queue(maxsize=LISTING_QUEUE_PAGES)
+        done = object()
+        stop = threading.Event()
+
+        def put(item) -> bool:
+            while not stop.is_set():
+                try:
+                    pages.put(item, timeout=0.5)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+
+        def producer():
+            batch = []
+            try:
+                for obj in self.iter_s3_objects(category):
+                    batch.append(obj)
+                    if len(batch) >= 1000:
+                        if not put(batch):
+                            return
+                        batch = []
+                if batch:
+                    put(batch)
+            except Exception as e:
+                put(e)
+            finally:
+                put(done)
+
+        lister = threading.Thread(target=producer, daemon=True)
+        lister.start()
+        try:
+            while True:
+                item = pages.get()
+                if item is done:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield from item
+        finally:
+            stop.set()
+            lister.join()
+
+    def iter_preflighted(self, items: Iterable[Any], category: str,
+                         object_of=lambda item: item
+                         ) -> Iterator[Tuple[Any, Optional[Dict[str, Any]]]]:
+        """
+        Attach preflight results to a stream of items, checking them in concurrent batches.
+
+        Args:
+            items: Items to annotate
+            category: Image category, used for the reject report
+            object_of: Returns the S3 object summary to check for an item,
+                or None if the item needs no check
+
+        Yields:
+            Tuples of (item, preflight result or None)
+        """
+        if self.preflight is None:
+            for item in items:
+                yield item, None
+            return
+
+        for batch in batched(items, PREFLIGHT_BATCH_SIZE):
+            objects = [object_of(item) for item in batch]
+            results = iter(self.preflight.check_many(
+                [obj for obj in objects if obj is not None]))
+            for item, obj in zip(batch, objects):
+                if obj is None:
+                    yield item, None
+                    continue
+                result = next(results)
+                self.preflight.record(
+                    obj, category, result, image_format_from_key(obj['Key']))
+                yield item, result
 
     def list_s3_images(self, category: str) -> List[str]:
         """
@@ -58,25 +488,13 @@ class DatasetGenerator:
         Returns:
             List of S3 object keys
         """
-        prefix = f"{self.s3_prefix}/{category}/"
-
         try:
-            response = self.s3_client.list_objects_v2(
-                Bucket=self.bucket_name,
-                Prefix=prefix
-            )
+            image_keys = [obj['Key'] for obj in self.iter_s3_objects(category)]
 
-            if 'Contents' not in response:
+            if not image_keys:
                 print(f"No objects found for category: {category}")
                 return []
 
-            # Filter for image files and extract keys
-            image_keys = []
-            for obj in response['Contents']:
-                key = obj['Key']
-                if key.lower().endswith(('.jpg', '.jpeg', '.png')):
-                    image_keys.append(key)
-
             print(f"Found {len(image_keys)} images for category: {category}")
             return image_keys
 
@@ -84,6 +502,10 @@ class DatasetGenerator:
             print(f"Error listing S3 objects for {category}: {e}")
             return []
 
+    def s3_uri(self, s3_key: str) -> str:
+        """Build the S3 URI for an object key."""
+        return f"s3://{self.bucket_name}/{s3_key}"
+
     def create_conversation_sample(self, s3_key: str, category: str) -> Dict[str, Any]:
         """
         Create a single conversation sample in Bedrock format.
@@ -96,18 +518,30 @@ class DatasetGenerator:
             Dictionary in Bedrock conversation format
         """
         # Construct S3 URI
-        s3_uri = f"s3://{self.bucket_name}/{s3_key}"
+        s3_uri = self.s3_uri(s3_key)
 
         # Determine image format from file extension
-        if s3_key.lower().endswith('.png'):
-            image_format = "png"
-        else:
-            image_format = "jpeg"
+        image_format = image_format_from_key(s3_key)
 
         # Randomly select a user prompt
         user_prompt = random.choice(USER_PROMPTS)
 
-        # Create the conversation sample
+        return self.build_conversation_sample(s3_uri, image_format, user_prompt, category)
+
+    def build_conversation_sample(self, s3_uri: str, image_format: str,
+                                  user_prompt: str, category: str) -> Dict[str, Any]:
+        """
+        Build a conversation sample from its variable parts.
+
+        Args:
+            s3_uri: S3 URI of the image
+            image_format: Image format (jpeg, png)
+            user_prompt: User prompt text
+            category: Image category used as the assistant label
+
+        Returns:
+            Dictionary in Bedrock conversation format
+        """
         sample = {
             "schemaVersion": "bedrock-conversation-2024",
             "system": [
@@ -148,72 +582,249 @@ class DatasetGenerator:
 
         return sample
 
-    def generate_category_dataset(self, category: str) -> List[Dict[str, Any]]:
+    def manifest_for(self, output_file: Path) -> GenerationManifest:
+        """Return the generation manifest belonging to a category JSONL file."""
+        return GenerationManifest(output_file.with_name(output_file.name + MANIFEST_SUFFIX))
+
+    def manifest_footer(self, category: str, output_file: Path, count: int) -> Dict[str, Any]:
+        """Build the manifest footer describing a finished category file."""
+        return {
+            "bucket": self.bucket_name,
+            "prefix": self.s3_prefix,
+            "category": category,
+            "count": count,
+            "jsonl_size": output_file.stat().st_size if output_file.exists() else 0
+        }
+
+    def generate_category_dataset(self, category: str, output_file: Path) -> int:
         """
-        Generate dataset for a specific category.
+        Generate dataset for a specific category, streaming samples to disk.
+
+        Listing, sample creation and writing run as a pipeline, so memory
+        stays bounded regardless of how many images the category holds.
+        Samples go to a temporary file that replaces the output only once
+        the whole category is written, so a failed run leaves the previous
+        file (and its manifest) in place. A manifest of the emitted objects
+        is written alongside for incremental runs.
 
         Args:
             category: Image category
+            output_file: Output JSONL file path
 
         Returns:
-            List of conversation samples
+            Number of samples written
+
+        Raises:
+            Exception: Any listing, preflight or write error, after removing
+                the partial output
         """
         print(f"\nGenerating dataset for category: {category}")
 
-        # Get list of images from S3
-        image_keys = self.list_s3_images(category)
+        manifest = self.manifest_for(output_file)
+        manifest_writer = manifest.writer()
+        progress = ProgressReporter(category)
+        tmp_file = output_file.with_name(output_file.name + '.tmp')
+        try:
+            with JsonlStreamWriter(tmp_file) as writer:
+                checked = self.iter_preflighted(
+                    self.iter_s3_objects_prefetched(category), category)
+                for obj, check in checked:
+                    s3_key = obj['Key']
+                    if check is not None and not check['ok']:
+                        continue
+                    try:
+                        json_line = self.emitter.emit(
+                            s3_key, category, check['format'] if check else None)
+                    except Exception as e:
+                        print(f"Error creating sample for {s3_key}: {e}")
+                        continue
+
+                    writer.write_line(json_line)
+                    manifest_writer.write_line(json.dumps(
+                        GenerationManifest.object_entry(obj), ensure_ascii=False))
+                    progress.update()
+
+            os.replace(tmp_file, output_file)
+            manifest.commit(manifest_writer, self.manifest_footer(
+                category, output_file, progress.count))
 
-        if not image_keys:
+        except Exception as e:
+            print(f"Error generating dataset for {category}: {e}")
+            tmp_file.unlink(missing_ok=True)
+            manifest.abandon(manifest_writer)
+            raise
+
+        if progress.count == 0:
             print(f"No images found for category: {category}")
-            return []
+            return 0
 
-        # Generate conversation samples
-        samples = []
-        for i, s3_key in enumerate(image_keys):
-            try:
-                sample = self.create_conversation_sample(s3_key, category)
-                samples.append(sample)
+        print(
+            f"Successfully wrote {progress.count} samples for {category} to {output_file} "
+            f"({progress.rate:.1f} samples/s)")
+        return progress.count
 
-                # Progress indicator
-                if (i + 1) % 100 == 0:
-                    print(
-                        f"Generated {i + 1}/{len(image_keys)} samples for {category}")
+    def update_category_dataset(self, category: str, output_file: Path) -> int:
+        """
+        Incrementally update a category dataset from its manifest.
 
-            except Exception as e:
-                print(f"Error creating sample for {s3_key}: {e}")
-                continue
+        Samples are appended only for new or changed objects; lines for
+        changed or deleted objects are then removed in one streaming rewrite.
+        Falls back to a full regeneration when no usable manifest exists.
 
-        print(f"Successfully generated {len(samples)} samples for {category}")
-        return samples
+        Args:
+            category: Image category
+            output_file: Output JSONL file path
 
-    def write_jsonl_file(self, samples: List[Dict[str, Any]], output_file: Path):
+        Returns:
+            Number of samples in the updated file
+        """
+        manifest = self.manifest_for(output_file)
+        footer = manifest.read_footer()
+        if (footer is None or not output_file.exists()
+                or footer.get('bucket') != self.bucket_name
+                or footer.get('prefix') != self.s3_prefix
+                or footer.get('jsonl_size') != output_file.stat().st_size):
+            print(f"\nNo usable manifest for {category}, running full generation")
+            return self.generate_category_dataset(category, output_file)
+
+        print(f"\nUpdating dataset for category: {category}")
+
+        original_size = output_file.stat().st_size
+        stale_uris: Set[str] = set()
+        count = unchanged = removed = 0
+        manifest_writer = manifest.writer()
+        progress = ProgressReporter(category)
+
+        try:
+            with JsonlStreamWriter(output_file, mode='a') as writer:
+                merged = merge_sorted_entries(
+                    manifest.iter_entries(), self.iter_s3_objects_prefetched(category))
+                checked = self.iter_preflighted(
+                    merged, category, object_of=self._changed_object)
+                for (s3_key, previous, obj), check in checked:
+                    if obj is None:
+                        stale_uris.add(self.s3_uri(s3_key))
+                        removed += 1
+                        continue
+
+                    entry = GenerationManifest.object_entry(obj)
+                    if previous == entry:
+                        manifest_writer.write_line(
+                            json.dumps(entry, ensure_ascii=False))
+                        unchanged += 1
+                        count += 1
+                        continue
+
+                    if previous is not None:
+                        stale_uris.add(self.s3_uri(s3_key))
+                    if check is not None and not check['ok']:
+                        continue
+
+                    try:
+                        json_line = self.emitter.emit(
+                            s3_key, category, check['format'] if check else None)
+                    except Exception as e:
+                        print(f"Error creating sample for {s3_key}: {e}")
+                        continue
+
+                    writer.write_line(json_line)
+                    manifest_writer.write_line(
+                        json.dumps(entry, ensure_ascii=False))
+                    progress.update()
+                    count += 1
+
+            if stale_uris:
+                self.remove_samples(output_file, original_size, stale_uris)
+
+            manifest.commit(manifest_writer, self.manifest_footer(
+                category, output_file, count))
+
+        except Exception as e:
+            # The file may now hold appended samples the manifest does not
+            # know about, so force the next run to regenerate from scratch.
+            print(f"Error updating dataset for {category}: {e}")
+            manifest.discard(manifest_writer)
+            return count
+
+        print(
+            f"Updated {category}: {progress.count} added or changed, {removed} removed, "
+            f"{unchanged} unchanged ({progress.rate:.1f} samples/s)")
+        return count
+
+    @staticmethod
+    def _changed_object(merged_item) -> Optional[Dict[str, Any]]:
+        """Return the S3 object of a merged manifest item if it is new or changed."""
+        _, previous, obj = merged_item
+        if obj is None or previous == GenerationManifest.object_entry(obj):
+            return None
+        return obj
+
+    def remove_samples(self, output_file: Path, region_size: int, stale_uris: Set[str]):
+        """
+        Remove samples whose image URI is stale from the head of a JSONL file.
+
+        Only lines within the first region_size bytes are candidates; lines
+        appended after that offset are copied unchanged.
+
+        Args:
+            output_file: JSONL file to rewrite in place
+            region_size: Byte offset separating old lines from appended ones
+            stale_uris: Image URIs whose old samples should be dropped
+        """
+        tmp_file = output_file.with_name(output_file.name + '.tmp')
+        with open(output_file, 'rb') as src, open(tmp_file, 'wb') as dst:
+            while src.tell() < region_size:
+                line = src.readline()
+                if not line:
+                    break
+                try:
+                    record = json.loads(line)
+                    uri = record['messages'][0]['content'][0]['image']['source']['s3Location']['uri']
+                except (ValueError, KeyError, IndexError):
+                    uri = None
+                if uri not in stale_uris:
+                    dst.write(line)
+
+            while True:
+                chunk = src.read(1 << 20)
+                if not chunk:
+                    break
+                dst.write(chunk)
+
+            dst.flush()
+            os.fsync(dst.fileno())
+
+        os.replace(tmp_file, output_file)
+
+    def write_jsonl_file(self, samples: Iterable[Dict[str, Any]], output_file: Path):
         """
         Write samples to JSONL file.
 
         Args:
-            samples: List of conversation samples
+            samples: Iterable of conversation samples
             output_file: Output file path
         """
         try:
-            with open(output_file, 'w', encoding='utf-8') as f:
+            with JsonlStreamWriter(output_file) as writer:
                 for sample in samples:
-                    json_line = json.dumps(sample, ensure_ascii=False)
-                    f.write(json_line + '\n')
+                    writer.write_sample(sample)
 
             print(
-                f"Successfully wrote {len(samples)} samples to {output_file}")
+                f"Successfully wrote {writer.lines_written} samples to {output_file}")
 
         except Exception as e:
             print(f"Error writing to {output_file}: {e}")
 
-    def generate_all_datasets(self, output_dir: Path):
+    def generate_all_datasets(self, output_dir: Path, incremental: bool = False):
         """
         Generate datasets for all categories.
 
         Args:
             output_dir: Output directory for JSONL files
+            incremental: Only apply changes since the last run's manifest
         """
         print("Starting dataset generation...")
+        print(f"Mode: {'incremental' if incremental else 'full'}")
         print(f"Bucket: {self.bucket_name}")
         print(f"Prefix: {self.s3_prefix}")
         print(f"Output directory: {output_dir}")
@@ -223,25 +834,43 @@ class DatasetGenerator:
 
         total_samples = 0
 
-        for category in CATEGORIES:
-            # Generate samples for this category
-            samples = self.generate_category_dataset(category)
-
-            if samples:
-                # Write to JSONL file
+        try:
+            for category in CATEGORIES:
                 output_file = output_dir / f"{category}.jsonl"
-                self.write_jsonl_file(samples, output_file)
-                total_samples += len(samples)
-            else:
-                print(f"No samples generated for {category}")
-
-        print(f"\nDataset generation completed!")
+                if incremental:
+                    total_samples += self.update_category_dataset(
+                        category, output_file)
+                else:
+                    total_samples += self.generate_category_dataset(
+                        category, output_file)
+        finally:
+            # Keep the checks already paid for even when a category fails
+            if self.preflight is not None:
+                self.preflight.write_report(output_dir / PREFLIGHT_REPORT_FILE)
+                self.preflight.close()
+
+        print("\nDataset generation completed!")
         print(f"Total samples generated: {total_samples}")
         print(f"Output files saved in: {output_dir}")
 
 
 def main():
     """Main function to run dataset generation."""
+    parser = argparse.ArgumentParser(
+        description="Generate Nova fine-tuning datasets from S3 images")
+    parser.add_argument("--output-dir", type=str, default=str(OUTPUT_DIR),
+                        help="Output directory for JSONL files (default: current directory)")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Only append samples for new or changed objects and drop deleted ones, "
+                             "using the manifest from the previous run")
+    parser.add_argument("--preflight", action="store_true",
+                        help="Check image format, size and dimensions with ranged S3 reads before writing "
+                             f"samples; rejects are reported in {PREFLIGHT_REPORT_FILE}")
+    parser.add_argument("--preflight-workers", type=int, default=PREFLIGHT_WORKERS,
+                        help=f"Concurrent S3 requests for preflight checks (default: {PREFLIGHT_WORKERS})")
+
+    args = parser.parse_args()
+
     print("Nova Content Moderation Dataset Generator")
     print("=" * 50)
 
@@ -252,8 +881,14 @@ def main():
         s3_prefix=S3_PREFIX
     )
 
+    output_dir = Path(args.output_dir)
+    if args.preflight:
+        output_dir.mkdir(parents=True, exist_ok=True)
+        generator.enable_preflight(
+            output_dir / PREFLIGHT_CACHE_FILE, max_workers=args.preflight_workers)
+
     # Generate all datasets
-    generator.generate_all_datasets(OUTPUT_DIR)
+    generator.generate_all_datasets(output_dir, incremental=args.incremental)
 
 
 if __name__ == "__main__":
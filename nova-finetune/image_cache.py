@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+"""
+Local content-addressed cache of test images for inline-bytes requests.
+
+Images are fetched concurrently (prefetch) from S3, optionally downscaled so
+their longest edge is at most a configured size, and stored on disk under the
+SHA-256 of the stored bytes, so identical images share one file. An index
+maps (image URI, max edge) to the stored image; the least recently used
+entries are evicted when the stored images exceed a size limit.
+
+Sending the cached bytes inline instead of an s3Location lets the evaluator
+control image size, which drives both request latency and input tokens.
+"""
+
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+from image_preflight import detect_image_format, read_image_dimensions
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+IMAGE_CACHE_DIR = "image_cache"
+IMAGE_CACHE_INDEX = "index.json"
+IMAGE_CACHE_MAX_BYTES = 2 * 1024 * 1024 * 1024
+PREFETCH_WORKERS = 32
+DOWNSCALE_QUALITY = 90  # JPEG/WebP quality of re-encoded images
+
+# Pillow encoder names of the Bedrock image formats
+PIL_FORMATS = {"jpeg": "JPEG", "png": "PNG", "gif": "GIF", "webp": "WEBP"}
+
+
+def downscale_image(data: bytes, image_format: str, max_edge: int) -> bytes:
+    """
+    Downscale an image so its longest edge is at most max_edge.
+
+    Images that already fit, and animated GIF/WebP images, are returned
+    unchanged. Downscaled images keep their format.
+
+    Args:
+        data: Encoded image bytes
+        image_format: Bedrock image format of data
+        max_edge: Maximum width and height in pixels
+
+    Returns:
+        Encoded image bytes
+    """
+    if Image is None:
+        raise RuntimeError("Pillow is required to downscale images: pip install Pillow")
+
+    with Image.open(io.BytesIO(data)) as image:
+        if max(image.size) <= max_edge or getattr(image, "n_frames", 1) > 1:
+            return data
+        # JPEG decoding can skip most of the work at reduced scale
+        image.draft('RGB', (max_edge, max_edge))
+        image.thumbnail((max_edge, max_edge), Image.LANCZOS)
+        if image_format == "jpeg" and image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+
+        output = io.BytesIO()
+        options = {"quality": DOWNSCALE_QUALITY} if image_format in ("jpeg", "webp") else {}
+        image.save(output, PIL_FORMATS[image_format], **options)
+    return output.getvalue()
+
+
+def s3_fetcher(s3_client) -> Callable[[str], bytes]:
+    """Return a function that downloads an s3:// URI with the given client."""
+    def fetch(uri: str) -> bytes:
+        if not uri.startswith("s3://"):
+            raise ValueError(f"Not an S3 URI: {uri}")
+        bucket, _, key = uri[5:].partition('/')
+        return s3_client.get_object(Bucket=bucket, Key=key)['Body'].read()
+    return fetch
+
+
+class ImageCache:
+    """Thread-safe content-addressed disk cache of (optionally downscaled) images."""
+
+    def __init__(self, fetch: Callable[[str], bytes], cache_dir: Path = Path(IMAGE_CACHE_DIR),
+                 max_bytes: int = IMAGE_CACHE_MAX_BYTES, max_edge: Optional[int] = None,
+                 workers: int = PREFETCH_WORKERS):
+        """
+        Initialize cache.
+
+        Args:
+            fetch: Function returning the bytes of an image URI (e.g. s3_fetcher)
+            cache_dir: Directory for stored images and the index
+            max_bytes: Total stored image size that triggers LRU eviction
+            max_edge: Downscale images so their longest edge is at most this
+            workers: Concurrent fetches during prefetch
+        """
+        if max_edge is not None and Image is None:
+            raise RuntimeError("Pillow is required to downscale images: pip install Pillow")
+        self.fetch = fetch
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.max_edge = max_edge
+        self.workers = workers
+        self.hits = 0
+        self.fetched = 0
+        self.fetched_bytes = 0
+        self.stored_bytes = 0
+        self._lock = threading.Lock()
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.index: Dict[str, Dict[str, Any]] = self._load_index()
+
+    def _load_index(self) -> Dict[str, Dict[str, Any]]:
+        """Load index entries whose stored image still exists."""
+        index_file = self.cache_dir / IMAGE_CACHE_INDEX
+        if not index_file.exists():
+            return {}
+        try:
+            with open(index_file, 'r', encoding='utf-8') as f:
+                index = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Ignoring unreadable image cache index {index_file}: {e}")
+            return {}
+        return {key: entry for key, entry in index.items()
+                if self._blob_path(entry).exists()}
+
+    def save(self):
+        """Evict, then atomically write the index."""
+        self.evict()
+        index_file = self.cache_dir / IMAGE_CACHE_INDEX
+        tmp_file = index_file.with_name(index_file.name + '.tmp')
+        with self._lock:
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                json.dump(self.index, f, separators=(',', ':'))
+        os.replace(tmp_file, index_file)
+
+    def _key(self, uri: str) -> str:
+        return f"{self.max_edge or 0}:{uri}"
+
+    def _blob_path(self, entry: Dict[str, Any]) -> Path:
+        digest = entry["digest"]
+        return self.cache_dir / digest[:2] / f"{digest}.{entry['format']}"
+
+    def _load(self, uri: str) -> Tuple[Dict[str, Any], bytes]:
+        """Fetch, downscale and store one image."""
+        data = self.fetch(uri)
+        image_format = detect_image_format(data[:16])
+        if image_format is None:
+            raise ValueError(f"Unrecognized image format: {uri}")
+        original_size = len(data)
+        if self.max_edge is not None:
+            data = downscale_image(data, image_format, self.max_edge)
+
+        dimensions = read_image_dimensions(data, image_format) or (None, None)
+        entry = {"digest": hashlib.sha256(data).hexdigest(), "format": image_format,
+                 "size": len(data), "width": dimensions[0], "height": dimensions[1],
+                 "last_used": time.time()}
+        path = self._blob_path(entry)
+        if not path.exists():
+            path.parent.mkdir(exist_ok=True)
+            tmp_path = path.with_name(f"{path.name}.{threading.get_ident()}.tmp")
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+
+        with self._lock:
+            self.index[self._key(uri)] = entry
+            self.fetched += 1
+            self.fetched_bytes += original_size
+            self.stored_bytes += len(data)
+        return entry, data
+
+    def get(self, uri: str) -> Tuple[bytes, str]:
+        """
+        Return the (downscaled) bytes and format of an image, fetching on a miss.
+
+        Args:
+            uri: Image URI
+
+        Returns:
+            (image bytes, Bedrock image format)
+        """
+        with self._lock:
+            entry = self.index.get(self._key(uri))
+        if entry is not None:
+            try:
+                data = self._blob_path(entry).read_bytes()
+            except FileNotFoundError:
+                entry = None
+            else:
+                with self._lock:
+                    entry["last_used"] = time.time()
+                    self.hits += 1
+                return data, entry["format"]
+        entry, data = self._load(uri)
+        return data, entry["format"]
+
+    def prefetch(self, uris: Iterable[str]) -> Dict[str, str]:
+        """
+        Fetch every image not yet cached, concurrently.
+
+        Args:
+            uris: Image URIs
+
+        Returns:
+            URI -> error message for images that could not be fetched
+        """
+        with self._lock:
+            missing = sorted({uri for uri in uris if self._key(uri) not in self.index})
+
+        def load(uri):
+            try:
+                self._load(uri)
+                return None
+            except Exception as e:
+                return str(e)
+
+        errors = {}
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            for uri, error in zip(missing, executor.map(load, missing)):
+                if error is not None:
+                    errors[uri] = error
+        return errors
+
+    def evict(self) -> int:
+        """
+        Delete least recently used images above max_bytes.
+
+        Returns:
+            Number of removed index entries
+        """
+        with self._lock:
+            digests = {}
+            for key, entry in self.index.items():
+                digests.setdefault(entry["digest"], []).append(key)
+            total = sum(self.index[keys[0]]["size"] for keys in digests.values())
+            if total <= self.max_bytes:
+                return 0
+
+            removed = 0
+            for key, entry in sorted(self.index.items(), key=lambda item: item[1]["last_used"]):
+                if total <= self.max_bytes:
+                    break
+                if key not in self.index:
+                    continue
+                # Stored images are shared by content; drop every entry using this one
+                for shared_key in digests.pop(entry["digest"], []):
+                    del self.index[shared_key]
+                    removed += 1
+                self._blob_path(entry).unlink(missing_ok=True)
+                total -= entry["size"]
+        return removed
+
+
+def inline_image_sources(request: Dict[str, Any], image_cache: ImageCache) -> Dict[str, Any]:
+    """
+    Replace the s3Location image sources of a converse request with cached bytes.
+
+    Args:
+        request: converse() keyword arguments
+        image_cache: Cache supplying the (downscaled) image bytes
+
+    Returns:
+        Copy of the request with inline {"bytes": ...} image sources
+    """
+    messages = []
+    for message in request["messages"]:
+        content = []
+        for block in message["content"]:
+            source = block.get("image", {}).get("source", {})
+            if "s3Location" in source:
+                data, image_format = image_cache.get(source["s3Location"]["uri"])
+                block = {"image": {"format": image_format, "source": {"bytes": data}}}
+            content.append(block)
+        messages.append(dict(message, content=content))
+    return dict(request, messages=messages)
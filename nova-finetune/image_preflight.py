@@ -0,0 +1,399 @@
+#!/usr/bin/env python3
+"""
+Preflight validation of S3 images before they are written into a dataset.
+
+Each object is checked with a small ranged GET of its header: the real format
+is detected from magic bytes, dimensions are read from the header, and the
+object size and dimensions are checked against Bedrock's image limits.
+Results are cached by ETag, so a re-run only fetches new or changed objects.
+Only results decided by the object's content are cached; transient S3
+errors are retried and then raised, so they never silently drop an image.
+"""
+
+import json
+import os
+import random
+import struct
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from botocore.exceptions import BotoCoreError, ClientError
+
+# Bedrock image limits
+SUPPORTED_FORMATS = ("png", "jpeg", "gif", "webp")
+MAX_IMAGE_BYTES = int(3.75 * 1024 * 1024)
+MAX_IMAGE_DIMENSION = 8000
+MIN_IMAGE_BYTES = 64
+
+# Preflight settings
+PREFLIGHT_RANGE_BYTES = 64 * 1024  # Header bytes fetched per object
+PREFLIGHT_WORKERS = 32
+PREFLIGHT_CACHE_FILE = "preflight_cache.json"
+PREFLIGHT_REPORT_FILE = "preflight_report.json"
+PREFLIGHT_RETRIES = 5  # Attempts after a transient S3 error before giving up
+PREFLIGHT_BACKOFF_SECONDS = 0.5
+
+# S3 error codes of objects that vanished between listing and check
+MISSING_OBJECT_ERROR_CODES = ("NoSuchKey", "404", "NotFound")
+
+# JPEG start-of-frame markers carrying the image dimensions
+JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6,
+                    0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+class CorruptImageError(ValueError):
+    """Raised when an image header cannot be parsed."""
+
+
+def detect_image_format(header: bytes) -> Optional[str]:
+    """
+    Detect the real image format from magic bytes.
+
+    Args:
+        header: Leading bytes of the object
+
+    Returns:
+        Bedrock image format name, or None if unrecognized
+    """
+    if header.startswith(b'\xff\xd8\xff'):
+        return "jpeg"
+    if header.startswith(b'\x89PNG\r\n\x1a\n'):
+        return "png"
+    if header[:6] in (b'GIF87a', b'GIF89a'):
+        return "gif"
+    if header[:4] == b'RIFF' and header[8:12] == b'WEBP':
+        return "webp"
+    return None
+
+
+def _jpeg_dimensions(header: bytes) -> Optional[Tuple[int, int]]:
+    """Walk JPEG segments until a start-of-frame marker is found."""
+    i = 2
+    while i + 4 <= len(header):
+        if header[i] != 0xFF:
+            raise CorruptImageError("invalid JPEG segment marker")
+        marker = header[i + 1]
+        if marker == 0xFF:
+            i += 1
+            continue
+        if marker == 0x01 or 0xD0 <= marker <= 0xD8:
+            i += 2
+            continue
+        if marker == 0xD9 or marker == 0xDA:
+            raise CorruptImageError("JPEG image data before frame header")
+        (segment_length,) = struct.unpack('>H', header[i + 2:i + 4])
+        if segment_length < 2:
+            raise CorruptImageError("invalid JPEG segment length")
+        if marker in JPEG_SOF_MARKERS:
+            if i + 9 > len(header):
+                return None
+            height, width = struct.unpack('>HH', header[i + 5:i + 9])
+            return width, height
+        i += 2 + segment_length
+    # Frame header lies beyond the fetched range
+    return None
+
+
+def read_image_dimensions(header: bytes, image_format: str) -> Optional[Tuple[int, int]]:
+    """
+    Read (width, height) from an image header.
+
+    Args:
+        header: Leading bytes of the object
+        image_format: Format returned by detect_image_format
+
+    Returns:
+        (width, height), or None if the header range does not contain them
+
+    Raises:
+        CorruptImageError: If the header is malformed
+    """
+    if image_format == "png":
+        if len(header) < 24 or header[12:16] != b'IHDR':
+            raise CorruptImageError("missing PNG IHDR chunk")
+        return struct.unpack('>II', header[16:24])
+
+    if image_format == "gif":
+        if len(header) < 10:
+            raise CorruptImageError("truncated GIF header")
+        return struct.unpack('<HH', header[6:10])
+
+    if image_format == "webp":
+        chunk = header[12:16]
+        if chunk == b'VP8 ' and len(header) >= 30:
+            width, height = struct.unpack('<HH', header[26:30])
+            return width & 0x3FFF, height & 0x3FFF
+        if chunk == b'VP8L' and len(header) >= 25:
+            bits = int.from_bytes(header[21:25], 'little')
+            return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+        if chunk == b'VP8X' and len(header) >= 30:
+            width = int.from_bytes(header[24:27], 'little') + 1
+            height = int.from_bytes(header[27:30], 'little') + 1
+            return width, height
+        raise CorruptImageError("unrecognized WebP chunk")
+
+    if image_format == "jpeg":
+        return _jpeg_dimensions(header)
+
+    return None
+
+
+def check_image_header(header: bytes, size: int) -> Dict[str, Any]:
+    """
+    Check an image header and size against Bedrock's limits.
+
+    Args:
+        header: Leading bytes of the object
+        size: Total object size in bytes
+
+    Returns:
+        Result dictionary with format, dimensions, ok flag and reject reason
+    """
+    result = {"size": size, "format": None, "width": None, "height": None,
+              "ok": False, "reason": None}
+
+    if size < MIN_IMAGE_BYTES:
+        result["reason"] = f"object too small ({size} bytes)"
+        return result
+
+    image_format = detect_image_format(header)
+    result["format"] = image_format
+    if image_format is None:
+        result["reason"] = "unrecognized image format (magic bytes)"
+        return result
+    if image_format not in SUPPORTED_FORMATS:
+        result["reason"] = f"unsupported image format: {image_format}"
+        return result
+
+    if size > MAX_IMAGE_BYTES:
+        result["reason"] = f"size {size} exceeds {MAX_IMAGE_BYTES} bytes"
+        return result
+
+    try:
+        dimensions = read_image_dimensions(header, image_format)
+    except CorruptImageError as e:
+        result["reason"] = f"corrupt {image_format} header: {e}"
+        return result
+
+    if dimensions is not None:
+        width, height = dimensions
+        result["width"], result["height"] = width, height
+        if width == 0 or height == 0:
+            result["reason"] = f"invalid dimensions {width}x{height}"
+            return result
+        if max(width, height) > MAX_IMAGE_DIMENSION:
+            result["reason"] = f"dimensions {width}x{height} exceed {MAX_IMAGE_DIMENSION}px"
+            return result
+
+    result["ok"] = True
+    return result
+
+
+class ImagePreflight:
+    """Concurrent, ETag-cached preflight checks for S3 image objects."""
+
+    def __init__(self, s3_client, bucket_name: str, cache_file: Path,
+                 max_workers: int = PREFLIGHT_WORKERS,
+                 range_bytes: int = PREFLIGHT_RANGE_BYTES):
+        """
+        Initialize preflight checker.
+
+        Args:
+            s3_client: Boto3 S3 client
+            bucket_name: S3 bucket name
+            cache_file: JSON file caching results by ETag
+            max_workers: Number of concurrent S3 requests
+            range_bytes: Number of header bytes to fetch per object
+        """
+        self.s3_client = s3_client
+        self.bucket_name = bucket_name
+        self.cache_file = cache_file
+        self.range_bytes = range_bytes
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.cache: Dict[str, Dict[str, Any]] = self._load_cache()
+        self.rejects: List[Dict[str, Any]] = []
+        self.checked = 0
+        self.cache_hits = 0
+        self.format_corrections = 0
+
+    def _load_cache(self) -> Dict[str, Dict[str, Any]]:
+        """Load cached results keyed by ETag."""
+        if not self.cache_file.exists():
+            return {}
+        try:
+            with open(self.cache_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Ignoring unreadable preflight cache {self.cache_file}: {e}")
+            return {}
+
+    def save_cache(self):
+        """Atomically write the ETag cache."""
+        tmp_file = self.cache_file.with_name(self.cache_file.name + '.tmp')
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(self.cache, f, separators=(',', ':'))
+        os.replace(tmp_file, self.cache_file)
+
+    def _fetch_header(self, obj: Dict[str, Any]) -> Tuple[bytes, int, str]:
+        """Run HEAD (when the listing lacks size/ETag) and a ranged GET for one object."""
+        key = obj['Key']
+        size = obj.get('Size')
+        etag = obj.get('ETag')
+        if size is None or etag is None:
+            head = self.s3_client.head_object(Bucket=self.bucket_name, Key=key)
+            size = head['ContentLength']
+            etag = head['ETag']
+
+        if size < MIN_IMAGE_BYTES:
+            return b'', size, etag
+        response = self.s3_client.get_object(
+            Bucket=self.bucket_name, Key=key,
+            Range=f"bytes=0-{self.range_bytes - 1}")
+        return response['Body'].read(), size, etag
+
+    def _fetch_and_check(self, obj: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Fetch and check one object, retrying transient S3 errors.
+
+        Returns:
+            Result dictionary; "etag" is None for results that must not be
+            cached
+
+        Raises:
+            ClientError, BotoCoreError: If S3 keeps failing after
+                PREFLIGHT_RETRIES attempts, or fails with a non-transient error
+        """
+        for attempt in range(PREFLIGHT_RETRIES + 1):
+            try:
+                header, size, etag = self._fetch_header(obj)
+                break
+            except ClientError as e:
+                code = e.response.get("Error", {}).get("Code")
+                if code in MISSING_OBJECT_ERROR_CODES:
+                    # Deleted since listing: skip it now, check again next run
+                    return {"size": obj.get('Size'), "format": None, "width": None,
+                            "height": None, "ok": False, "reason": f"object not found: {code}",
+                            "etag": None}
+                status = e.response.get("ResponseMetadata", {}).get("HTTPStatusCode") or 0
+                transient = status >= 500 or code in (
+                    "SlowDown", "Throttling", "ThrottlingException", "RequestTimeout",
+                    "InternalError", "ServiceUnavailable")
+                if not transient or attempt == PREFLIGHT_RETRIES:
+                    raise
+            except BotoCoreError:
+                # Connection errors and timeouts
+                if attempt == PREFLIGHT_RETRIES:
+                    raise
+            time.sleep(random.uniform(0, PREFLIGHT_BACKOFF_SECONDS * 2 ** attempt))
+
+        try:
+            result = check_image_header(header, size)
+        except (ValueError, struct.error) as e:
+            # Undecodable content is a property of this ETag, so it is cached
+            result = {"size": size, "format": None, "width": None, "height": None,
+                      "ok": False, "reason": f"unreadable header: {e}"}
+        result["etag"] = etag.strip('"')
+        return result
+
+    def check_many(self, objects: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Check a batch of objects concurrently, skipping cached ETags.
+
+        Args:
+            objects: S3 object summaries (Key, and ideally ETag and Size)
+
+        Returns:
+            Result dictionaries in input order
+        """
+        results: List[Optional[Dict[str, Any]]] = [None] * len(objects)
+        pending = []
+
+        for i, obj in enumerate(objects):
+            etag = obj.get('ETag', '').strip('"')
+            cached = self.cache.get(etag) if etag else None
+            if cached is not None:
+                results[i] = cached
+                self.cache_hits += 1
+            else:
+                pending.append(i)
+
+        fetched = self.executor.map(
+            self._fetch_and_check, [objects[i] for i in pending])
+        for i, result in zip(pending, fetched):
+            etag = result.pop("etag")
+            if etag:
+                self.cache[etag] = result
+            results[i] = result
+
+        self.checked += len(objects)
+        return results
+
+    def record(self, obj: Dict[str, Any], category: str, result: Dict[str, Any],
+               extension_format: str):
+        """
+        Record the outcome of a check for the end-of-run report.
+
+        Args:
+            obj: S3 object summary
+            category: Image category
+            result: Result returned by check_many
+            extension_format: Format inferred from the key's extension
+        """
+        if not result["ok"]:
+            self.rejects.append({
+                "key": obj['Key'],
+                "category": category,
+                "size": result["size"],
+                "format": result["format"],
+                "width": result["width"],
+                "height": result["height"],
+                "reason": result["reason"]
+            })
+        elif result["format"] != extension_format:
+            self.format_corrections += 1
+
+    def write_report(self, report_file: Path):
+        """
+        Write the reject report and print a summary.
+
+        Args:
+            report_file: Output JSON report path
+        """
+        report = {
+            "checked": self.checked,
+            "cache_hits": self.cache_hits,
+            "rejected": len(self.rejects),
+            "format_corrections": self.format_corrections,
+            "limits": {
+                "supported_formats": list(SUPPORTED_FORMATS),
+                "max_image_bytes": MAX_IMAGE_BYTES,
+                "max_image_dimension": MAX_IMAGE_DIMENSION
+            },
+            "rejects": self.rejects
+        }
+        with open(report_file, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+
+        print(f"\nPreflight: checked {self.checked} images "
+              f"({self.cache_hits} cached), rejected {len(self.rejects)}, "
+              f"corrected format for {self.format_corrections}")
+        print(f"Preflight report saved to {report_file}")
+
+    def close(self):
+        """Shut down the worker pool and persist the cache."""
+        self.executor.shutdown()
+        self.save_cache()
+
+
+def batched(items: Iterable[Any], batch_size: int) -> Iterable[List[Any]]:
+    """Yield successive lists of at most batch_size items."""
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Line-offset index for random access into JSONL files.
+
+The index records the byte offset of every non-empty line in a compact
+array('Q') and is cached beside the file as <file>.idx. The cache is rebuilt
+whenever the file's size or modification time changes. Lines are read through
+a memory map, so fetching a random subset touches only the selected records.
+"""
+
+import mmap
+import os
+import struct
+from array import array
+from pathlib import Path
+from typing import Iterable, List
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+INDEX_SUFFIX = ".idx"
+INDEX_MAGIC = b"JSONLIX1"
+INDEX_HEADER = struct.Struct("<8sQQ")  # magic, file size, mtime in ns
+
+
+def build_line_offsets(data) -> array:
+    """
+    Find the start offset of every non-empty line.
+
+    Args:
+        data: Buffer holding the file contents (bytes or mmap)
+
+    Returns:
+        array('Q') of line start offsets
+    """
+    size = len(data)
+    if size == 0:
+        return array('Q')
+
+    if np is not None:
+        buffer = np.frombuffer(data, dtype=np.uint8)
+        newlines = np.flatnonzero(buffer == 0x0A)
+        starts = np.concatenate(([0], newlines + 1))
+        starts = starts[starts < size]
+        # Drop empty lines (a start that is itself a newline)
+        starts = starts[buffer[starts] != 0x0A]
+        return array('Q', starts.astype(np.uint64).tobytes())
+
+    offsets = array('Q')
+    start = 0
+    while start < size:
+        end = data.find(b'\n', start)
+        if end == -1:
+            end = size
+        if end > start:
+            offsets.append(start)
+        start = end + 1
+    return offsets
+
+
+class JsonlLineIndex:
+    """Memory-mapped random access to the lines of a JSONL file."""
+
+    def __init__(self, path: Path, offsets: array):
+        """
+        Initialize index. Use JsonlLineIndex.open() to load or build one.
+
+        Args:
+            path: JSONL file path
+            offsets: Start offsets of the non-empty lines
+        """
+        self.path = path
+        self.offsets = offsets
+        self._file = open(path, 'rb')
+        size = os.fstat(self._file.fileno()).st_size
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if size else b''
+
+    @staticmethod
+    def index_path(path: Path) -> Path:
+        """Return the cache path of the index for a JSONL file."""
+        return path.with_name(path.name + INDEX_SUFFIX)
+
+    @classmethod
+    def open(cls, path: Path, use_cache: bool = True) -> 'JsonlLineIndex':
+        """
+        Load the cached index of a JSONL file, rebuilding it if stale.
+
+        Args:
+            path: JSONL file path
+            use_cache: Read and write the <file>.idx cache
+
+        Returns:
+            Line index for the file
+        """
+        stat = path.stat()
+        index_path = cls.index_path(path)
+
+        if use_cache and index_path.exists():
+            with open(index_path, 'rb') as f:
+                header = f.read(INDEX_HEADER.size)
+                if len(header) == INDEX_HEADER.size:
+                    magic, size, mtime_ns = INDEX_HEADER.unpack(header)
+                    if (magic == INDEX_MAGIC and size == stat.st_size
+                            and mtime_ns == stat.st_mtime_ns):
+                        offsets = array('Q')
+                        offsets.frombytes(f.read())
+                        return cls(path, offsets)
+
+        with open(path, 'rb') as f:
+            if stat.st_size:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                    offsets = build_line_offsets(data)
+            else:
+                offsets = array('Q')
+
+        if use_cache:
+            tmp_path = index_path.with_name(index_path.name + '.tmp')
+            with open(tmp_path, 'wb') as f:
+                f.write(INDEX_HEADER.pack(INDEX_MAGIC, stat.st_size, stat.st_mtime_ns))
+                offsets.tofile(f)
+            os.replace(tmp_path, index_path)
+
+        return cls(path, offsets)
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    def read_line(self, i: int) -> str:
+        """Return line i (decoded, without trailing newline)."""
+        start = self.offsets[i]
+        end = self._mmap.find(b'\n', start)
+        if end == -1:
+            end = len(self._mmap)
+        return self._mmap[start:end].decode('utf-8').rstrip('\r')
+
+    def read_lines(self, indices: Iterable[int]) -> List[str]:
+        """
+        Return several lines, in the order given.
+
+        Lines are fetched in offset order so reads move forward through the
+        file, then returned in the requested order.
+
+        Args:
+            indices: Line numbers (0-based, counting non-empty lines)
+
+        Returns:
+            Decoded lines without trailing newlines
+        """
+        indices = list(indices)
+        lines = {i: self.read_line(i) for i in sorted(set(indices))}
+        return [lines[i] for i in indices]
+
+    def close(self):
+        """Release the memory map and file handle."""
+        if isinstance(self._mmap, mmap.mmap):
+            self._mmap.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
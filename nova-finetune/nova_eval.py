@@ -0,0 +1,800 @@
+#!/usr/bin/env python3
+"""
+Shared evaluation library for the Nova classification test scripts.
+
+NovaProTester parses test records, builds converse requests, normalizes
+predictions and runs evaluations: concurrently under an adaptive (AIMD)
+concurrency limit with results streamed to disk (run_test), for several
+models in one pass (run_models), as a Bedrock batch job (run_batch), or with
+stratified sequential sampling that stops once the confidence interval on
+accuracy, or on the accuracy difference between two models, is narrow enough
+(run_until_confident). Requests can mark the constant system prompt (and
+user prompt) as a cacheable prefix with Bedrock cachePoint blocks.
+test_nova_pro_accuracy.py and test_nova_pro_sample.py
+are thin command-line front ends over it.
+"""
+
+import boto3
+import json
+import os
+import random
+import time
+import re
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+from pathlib import Path
+
+from botocore.config import Config
+
+from batch_inference import BATCH_POLL_SECONDS, BatchBackend, run_batch_job
+from eval_concurrency import MAX_CONCURRENCY, AdaptiveConcurrencyLimiter, ConcurrentEvaluator
+from eval_metrics import (BOOTSTRAP_SAMPLES, CONFIDENCE_LEVEL, LATENCY_PERCENTILES,
+                          MetricsAccumulator, paired_accuracy_difference)
+from generate_dataset import JsonlStreamWriter
+from image_cache import ImageCache, inline_image_sources
+
+# Configuration
+PRO_MODEL_ID = "us.amazon.nova-pro-v1:0"
+REGION_NAME = "us-east-1"
+BUCKET_OWNER = "xxxx"
+RESULT_FSYNC_SECONDS = 5.0  # Max seconds of streamed results lost on a crash
+CATEGORIES = ["porn", "sexy", "neutral"]
+
+# Sequential (early-stopping) evaluation
+EARLY_STOP_BATCH = 50  # Samples per model between interval checks
+EARLY_STOP_MIN_SAMPLES = 100  # Never stop before this many samples
+EARLY_STOP_BOOTSTRAP = 1000  # Bootstrap resamples per interval check
+
+# Prompt caching: "system" caches the system prompt; "prompt" also caches the
+# user prompt by sending it before the image, which changes the request layout
+# the model was fine-tuned on, so compare accuracy against "off" before use
+PROMPT_CACHE_MODES = ("off", "system", "prompt")
+# Bedrock only creates a checkpoint once the prefix before it reaches a
+# model-specific minimum (about 1K tokens for Nova); shorter prefixes get no
+# cache point, since it would never be read
+PROMPT_CACHE_MIN_TOKENS = 1000
+CHARS_PER_TOKEN = 4  # Rough text token estimate
+
+
+def bedrock_runtime_client(max_concurrency: int = MAX_CONCURRENCY):
+    """
+    Create a bedrock-runtime client for concurrent evaluation.
+
+    SDK retries are disabled so throttling errors reach the AIMD limiter
+    (which owns the backoff) immediately, and the connection pool is sized to
+    the concurrency limit instead of botocore's default of 10.
+
+    Args:
+        max_concurrency: Most requests in flight through this client
+
+    Returns:
+        Boto3 bedrock-runtime client
+    """
+    config = Config(retries={"total_max_attempts": 1, "mode": "standard"},
+                    max_pool_connections=max_concurrency)
+    return boto3.client("bedrock-runtime", region_name=REGION_NAME, config=config)
+
+
+def model_label(model_id: str) -> str:
+    """Short display name of a model ID or ARN."""
+    return model_id.rsplit('/', 1)[-1]
+
+
+def model_result_file(result_file: str, model_id: str) -> str:
+    """Per-model result file name, e.g. results.nova-lite-v1_0.jsonl."""
+    path = Path(result_file)
+    label = re.sub(r'[^A-Za-z0-9._-]+', '_', model_label(model_id))
+    return str(path.with_name(f"{path.stem}.{label}{path.suffix or '.jsonl'}"))
+
+
+class NovaProTester:
+    def __init__(self, client=None, image_cache: Optional[ImageCache] = None,
+                 prompt_cache: str = "off", prompt_cache_min_tokens: int = PROMPT_CACHE_MIN_TOKENS):
+        """
+        Initialize the Bedrock client.
+
+        Args:
+            client: bedrock-runtime client (or a stand-in with converse());
+                defaults to bedrock_runtime_client()
+            image_cache: Send images as inline bytes from this cache instead
+                of s3Location references
+            prompt_cache: Cache point placement, one of PROMPT_CACHE_MODES
+            prompt_cache_min_tokens: Estimated prefix tokens below which a
+                cache point is left out
+        """
+        if prompt_cache not in PROMPT_CACHE_MODES:
+            raise ValueError(f"prompt_cache must be one of {PROMPT_CACHE_MODES}, got {prompt_cache!r}")
+        self.client = client or bedrock_runtime_client()
+        self.image_cache = image_cache
+        self.prompt_cache = prompt_cache
+        self.prompt_cache_min_tokens = prompt_cache_min_tokens
+        self._short_prefixes = set()
+        self.results = []
+
+    def load_test_data(self, file_path: str, limit: Optional[int] = None) -> List[Dict]:
+        """Load test data from JSONL file (only the first limit records if given)."""
+        test_data = []
+        with open(file_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if limit is not None and len(test_data) >= limit:
+                    break
+                if line.strip():
+                    test_data.append(json.loads(line.strip()))
+        print(f"Loaded {len(test_data)} test samples")
+        return test_data
+
+    def extract_image_info(self, test_item: Dict) -> Tuple[str, str, str]:
+        """Extract image URI, expected label, and user prompt from test item."""
+        # Get expected label from assistant response
+        expected_label = test_item["messages"][1]["content"][0]["text"].strip(
+        ).lower()
+
+        # Get image URI from user message
+        user_content = test_item["messages"][0]["content"]
+        image_uri = None
+        user_prompt = None
+        image_format = "jpeg"
+
+        for content in user_content:
+            if "image" in content:
+                image_uri = content["image"]["source"]["s3Location"]["uri"]
+                image_format = content["image"]["format"]
+            elif "text" in content:
+                user_prompt = content["text"]
+
+        return image_format, image_uri, expected_label, user_prompt
+
+    def build_converse_request(self, image_format: str, image_uri: str, user_prompt: str,
+                               system_prompt: str) -> Dict[str, Any]:
+        """Build the converse() keyword arguments for one test sample."""
+        # Extract bucket owner from the original test data format
+        bucket_owner = BUCKET_OWNER  # From the test data
+
+        image_block = {
+            "image": {
+                "format": image_format,
+                "source": {
+                    "s3Location": {
+                        "uri": image_uri,
+                        "bucketOwner": bucket_owner
+                    }
+                }
+            }
+        }
+        cache_system = self.prompt_cache != "off" and self._cacheable("system prompt", system_prompt)
+        cache_prompt = self.prompt_cache == "prompt" and self._cacheable(
+            "system and user prompt", system_prompt + user_prompt)
+        if cache_prompt:
+            content = [{"text": user_prompt}, {"cachePoint": {"type": "default"}}, image_block]
+        else:
+            content = [image_block, {"text": user_prompt}]
+        messages = [{"role": "user", "content": content}]
+
+        system = [{"text": system_prompt}]
+        if cache_system:
+            system.append({"cachePoint": {"type": "default"}})
+
+        inf_params = {
+            "maxTokens": 50,
+            "topP": 0.1,
+            "temperature": 0.1
+        }
+
+        return {
+            "modelId": PRO_MODEL_ID,
+            "messages": messages,
+            "system": system,
+            "inferenceConfig": inf_params
+        }
+
+    def longest_cache_prefix(self, test_data: List[Dict]) -> int:
+        """Estimated tokens of the longest prefix the prompt cache mode would mark in the test data."""
+        longest = 0
+        for item in test_data:
+            prefix = item["system"][0]["text"]
+            if self.prompt_cache == "prompt":
+                prefix += self.extract_image_info(item)[3] or ""
+            longest = max(longest, len(prefix) // CHARS_PER_TOKEN)
+        return longest
+
+    def _cacheable(self, name: str, prefix: str) -> bool:
+        """Whether a prefix is long enough for a cache point; warns once per prefix otherwise."""
+        tokens = len(prefix) // CHARS_PER_TOKEN
+        if tokens >= self.prompt_cache_min_tokens:
+            return True
+        if name not in self._short_prefixes:
+            self._short_prefixes.add(name)
+            print(f"Warning: {name} is about {tokens} tokens, below the "
+                  f"{self.prompt_cache_min_tokens}-token prompt cache minimum; "
+                  f"no cache point added after it")
+        return False
+
+    def converse_response(self, request: Dict[str, Any], client=None) -> Dict[str, Any]:
+        """Send a converse request and return the raw response; errors propagate."""
+        if self.image_cache is not None:
+            request = inline_image_sources(request, self.image_cache)
+        return (client or self.client).converse(**request)
+
+    def response_text(self, response: Dict[str, Any]) -> str:
+        """Return the lower-cased text of a converse response."""
+        return response["output"]["message"]["content"][0]["text"].strip().lower()
+
+    def converse_text(self, request: Dict[str, Any], client=None) -> str:
+        """Send a converse request and return the lower-cased response text; errors propagate."""
+        return self.response_text(self.converse_response(request, client))
+
+    def request_metrics(self, outcome: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Instrumentation fields for one request.
+
+        Args:
+            outcome: ConcurrentEvaluator outcome whose value is a converse response
+
+        Returns:
+            Client and server latency (ms), input, output and prompt cache
+            read/write tokens, retries, and whether the response came from
+            the response cache
+        """
+        response = outcome["value"] or {}
+        usage = response.get("usage", {})
+        return {
+            "client_latency_ms": round(outcome["latency"] * 1000, 1),
+            "server_latency_ms": response.get("metrics", {}).get("latencyMs"),
+            "input_tokens": usage.get("inputTokens"),
+            "output_tokens": usage.get("outputTokens"),
+            "cache_read_tokens": usage.get("cacheReadInputTokens"),
+            "cache_write_tokens": usage.get("cacheWriteInputTokens"),
+            "retries": outcome["retries"],
+            "cached": bool(response.get("cached"))
+        }
+
+    def query_nova_pro(self, image_format: str, image_uri: str, user_prompt: str, system_prompt: str) -> str:
+        """Query Nova Pro model with image and prompt."""
+        try:
+            return self.converse_text(self.build_converse_request(
+                image_format, image_uri, user_prompt, system_prompt))
+
+        except Exception as e:
+            print(f"Error querying model: {e}")
+            return "error"
+
+    def normalize_prediction(self, prediction: str) -> str:
+        """Normalize model prediction to standard categories."""
+        prediction = prediction.lower().strip()
+
+        # Direct matches
+        if prediction in ["porn", "sexy", "neutral"]:
+            return prediction
+
+        # Pattern matching for common variations
+        if re.search(r'\bporn\b|\bpornographic\b', prediction):
+            return "porn"
+        elif re.search(r'\bsexy\b|\bsexual\b', prediction):
+            return "sexy"
+        elif re.search(r'\bneutral\b|\bnon-sexual\b|\bnot sexual\b', prediction):
+            return "neutral"
+
+        # If no clear match, return the original prediction
+        return prediction
+
+    def prepare_samples(self, test_data: List[Dict]) -> List[Tuple[Dict[str, Any], str, str, str]]:
+        """
+        Build the converse request for every test record.
+
+        Args:
+            test_data: Test records
+
+        Returns:
+            (converse request, image URI, expected label, user prompt) per record
+        """
+        samples = []
+        for test_item in test_data:
+            # Extract information
+            image_format, image_uri, expected_label, user_prompt = self.extract_image_info(
+                test_item)
+            system_prompt = test_item["system"][0]["text"]
+            request = self.build_converse_request(
+                image_format, image_uri, user_prompt, system_prompt)
+            samples.append((request, image_uri, expected_label, user_prompt))
+        return samples
+
+    def make_result(self, image_uri: str, user_prompt: str, expected_label: str,
+                    raw_prediction: str, metrics: Optional[Dict[str, Any]] = None) -> Dict:
+        """Build the result record for one sample, with optional request metrics."""
+        normalized_prediction = self.normalize_prediction(raw_prediction)
+        result = {
+            "image_uri": image_uri,
+            "user_prompt": user_prompt,
+            "expected_label": expected_label,
+            "raw_prediction": raw_prediction,
+            "normalized_prediction": normalized_prediction,
+            "correct": normalized_prediction == expected_label
+        }
+        if metrics:
+            result.update(metrics)
+        return result
+
+    def load_results(self, file_path: str) -> Dict[str, Dict]:
+        """
+        Load streamed results keyed by image URI (later lines win).
+
+        A trailing partial line left by a crash is cut off, so the file can
+        be appended to again.
+
+        Args:
+            file_path: Result JSONL file
+
+        Returns:
+            Image URI -> result
+        """
+        results = {}
+        path = Path(file_path)
+        if not path.exists():
+            return results
+
+        valid_end = 0
+        with open(path, 'rb') as f:
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break
+                try:
+                    result = json.loads(line)
+                except json.JSONDecodeError:
+                    break
+                results[result["image_uri"]] = result
+                valid_end += len(line)
+
+        if valid_end < path.stat().st_size:
+            print(f"Discarding {path.stat().st_size - valid_end} bytes of incomplete results")
+            os.truncate(path, valid_end)
+        return results
+
+    def run_test(self, test_data: List[Dict],
+                 limiter: Optional[AdaptiveConcurrencyLimiter] = None,
+                 result_file: Optional[str] = None, resume: bool = False) -> List[Dict]:
+        """
+        Run the test on all samples concurrently.
+
+        Args:
+            test_data: Test records
+            limiter: Adaptive concurrency limiter (default settings if omitted)
+            result_file: JSONL file each result is streamed to as it completes
+            resume: Keep the results already in result_file and only query
+                images without a successful result
+
+        Returns:
+            Results in test data order, merged with resumed results
+        """
+        limiter = limiter or AdaptiveConcurrencyLimiter()
+        evaluator = ConcurrentEvaluator(limiter)
+        metrics = MetricsAccumulator(CATEGORIES)
+        results = []
+        start_time = time.perf_counter()
+
+        completed = {}
+        if resume and result_file:
+            completed = {uri: result for uri, result in self.load_results(result_file).items()
+                         if result["raw_prediction"] != "error"}
+
+        samples = [sample for sample in self.prepare_samples(test_data)
+                   if sample[1] not in completed]
+
+        total_samples = len(samples)
+        if resume:
+            print(f"Resuming: {len(test_data) - total_samples} sample(s) already done, "
+                  f"{total_samples} to run")
+
+        writer = None
+        if result_file:
+            writer = JsonlStreamWriter(Path(result_file), flush_lines=1,
+                                       mode='a' if resume else 'w',
+                                       fsync_seconds=RESULT_FSYNC_SECONDS)
+
+        try:
+            outcomes = evaluator.map(self.converse_response, (sample[0] for sample in samples))
+            for i, ((_, image_uri, expected_label, user_prompt), outcome) in enumerate(
+                    zip(samples, outcomes)):
+                if outcome["error"] is not None:
+                    print(f"Error querying model: {outcome['error']}")
+                    raw_prediction = "error"
+                else:
+                    raw_prediction = self.response_text(outcome["value"])
+                result = self.make_result(image_uri, user_prompt, expected_label, raw_prediction,
+                                          self.request_metrics(outcome))
+                results.append(result)
+                metrics.update_result(result)
+                if writer is not None:
+                    writer.write_sample(result)
+
+                # Print progress every 10 samples
+                if (i + 1) % 10 == 0:
+                    print(f"Progress: {i+1}/{total_samples}, {metrics.live_summary()}, "
+                          f"concurrency limit: {limiter.limit:.1f}")
+        finally:
+            if writer is not None:
+                writer.close()
+
+        elapsed = time.perf_counter() - start_time
+        print(f"Completed {total_samples} samples in {elapsed:.1f}s "
+              f"({total_samples / elapsed if elapsed else 0:.1f} samples/s); "
+              f"throttled {limiter.throttled} time(s), peak concurrency limit {limiter.peak_limit:.1f}")
+
+        if not result_file:
+            return results
+
+        # Recompute from the merged file: resumed results plus this run's
+        merged = self.load_results(result_file)
+        return [merged[uri] for uri in (self.extract_image_info(item)[1] for item in test_data)
+                if uri in merged]
+
+    def run_models(self, test_data: List[Dict], model_ids: List[str],
+                   limiters: Dict[str, AdaptiveConcurrencyLimiter],
+                   clients: Optional[Dict[str, Any]] = None,
+                   result_file: Optional[str] = None,
+                   verbose: bool = True) -> Dict[str, Dict[str, Any]]:
+        """
+        Evaluate several models in one pass over the test set.
+
+        Requests are built once; every model then runs through the samples on
+        its own thread with its own concurrency limiter, so a throttled model
+        does not slow down the others.
+
+        Args:
+            test_data: Test records
+            model_ids: Model IDs or ARNs
+            limiters: Concurrency limiter per model
+            clients: Optional client per model (defaults to self.client)
+            result_file: Base name of the per-model result files
+            verbose: Print progress every 10 samples
+
+        Returns:
+            Model ID -> run with results (test data order, with request
+            metrics), metrics accumulator, elapsed seconds, throttle count
+            and errors
+        """
+        samples = self.prepare_samples(test_data)
+        clients = clients or {}
+        total_samples = len(samples)
+
+        def run_model(model_id: str) -> Dict[str, Any]:
+            client = clients.get(model_id, self.client)
+            limiter = limiters[model_id]
+            run = {"results": [], "metrics": MetricsAccumulator(CATEGORIES), "errors": 0}
+            writer = None
+            if result_file:
+                writer = JsonlStreamWriter(Path(model_result_file(result_file, model_id)),
+                                           flush_lines=1, fsync_seconds=RESULT_FSYNC_SECONDS)
+            start_time = time.perf_counter()
+            try:
+                outcomes = ConcurrentEvaluator(limiter).map(
+                    lambda request: self.converse_response(request, client),
+                    (dict(sample[0], modelId=model_id) for sample in samples))
+                for i, ((_, image_uri, expected_label, user_prompt), outcome) in enumerate(
+                        zip(samples, outcomes)):
+                    if outcome["error"] is not None:
+                        print(f"[{model_label(model_id)}] Error querying model: {outcome['error']}")
+                        raw_prediction = "error"
+                        run["errors"] += 1
+                    else:
+                        raw_prediction = self.response_text(outcome["value"])
+                    result = self.make_result(image_uri, user_prompt, expected_label, raw_prediction,
+                                              self.request_metrics(outcome))
+                    result["model_id"] = model_id
+                    run["results"].append(result)
+                    run["metrics"].update_result(result)
+                    if writer is not None:
+                        writer.write_sample(result)
+
+                    if verbose and (i + 1) % 10 == 0:
+                        print(f"[{model_label(model_id)}] Progress: {i+1}/{total_samples}, "
+                              f"{run['metrics'].live_summary()}, "
+                              f"concurrency limit: {limiter.limit:.1f}")
+            finally:
+                if writer is not None:
+                    writer.close()
+            run["elapsed"] = time.perf_counter() - start_time
+            run["throttled"] = limiter.throttled
+            return run
+
+        with ThreadPoolExecutor(max_workers=len(model_ids)) as executor:
+            futures = {model_id: executor.submit(run_model, model_id) for model_id in model_ids}
+            return {model_id: future.result() for model_id, future in futures.items()}
+
+    def stratified_order(self, test_data: List[Dict], seed: int = 0) -> List[Dict]:
+        """
+        Shuffle test records so every prefix is a stratified random sample.
+
+        Records are shuffled within each expected label, then interleaved so
+        that after n records each label holds its share of the full set
+        (proportional allocation). Any prefix is therefore self-weighting:
+        its plain accuracy estimates the accuracy on the full set.
+
+        Args:
+            test_data: Test records
+            seed: Shuffle seed
+
+        Returns:
+            Reordered test records
+        """
+        rng = random.Random(seed)
+        strata = defaultdict(list)
+        for test_item in test_data:
+            strata[self.extract_image_info(test_item)[2]].append(test_item)
+        for records in strata.values():
+            rng.shuffle(records)
+
+        total = len(test_data)
+        taken = {label: 0 for label in strata}
+        ordered = []
+        for n in range(1, total + 1):
+            # Take from the label furthest behind its proportional share
+            label = max((label for label in strata if taken[label] < len(strata[label])),
+                        key=lambda label: n * len(strata[label]) / total - taken[label])
+            ordered.append(strata[label][taken[label]])
+            taken[label] += 1
+        return ordered
+
+    def run_until_confident(self, test_data: List[Dict], model_ids: List[str],
+                            limiters: Dict[str, AdaptiveConcurrencyLimiter],
+                            target_width: float, clients: Optional[Dict[str, Any]] = None,
+                            confidence: float = CONFIDENCE_LEVEL,
+                            batch_size: int = EARLY_STOP_BATCH,
+                            min_samples: int = EARLY_STOP_MIN_SAMPLES,
+                            seed: int = 0) -> Dict[str, Dict[str, Any]]:
+        """
+        Evaluate a stratified random sample that grows until the interval is narrow enough.
+
+        Samples are drawn in stratified order (see stratified_order) and
+        evaluated in batches on all models. After each batch, the bootstrap
+        interval is checked: on accuracy for one model, or on the paired
+        accuracy difference against the first model otherwise (the widest
+        one counts). Evaluation stops once it is at most target_width wide.
+        Checking after every batch makes the final interval slightly
+        optimistic, so choose a target a little tighter than needed.
+
+        Args:
+            test_data: Test records
+            model_ids: Model IDs or ARNs
+            limiters: Concurrency limiter per model
+            target_width: Target interval width as a fraction (0.05 = 5 points)
+            clients: Optional client per model (defaults to self.client)
+            confidence: Confidence level of the interval
+            batch_size: Samples evaluated between checks
+            min_samples: Samples evaluated before the first check
+            seed: Sampling seed
+
+        Returns:
+            Runs in the run_models format, plus stopped_early, samples and
+            interval (low, high) for each model
+        """
+        ordered = self.stratified_order(test_data, seed)
+        runs = {model_id: {"results": [], "metrics": MetricsAccumulator(CATEGORIES),
+                           "errors": 0, "elapsed": 0.0, "throttled": 0}
+                for model_id in model_ids}
+        baseline = model_ids[0]
+        interval = None
+        done = 0
+
+        while done < len(ordered):
+            size = max(batch_size, min_samples - done)
+            batch = self.run_models(ordered[done:done + size], model_ids, limiters, clients,
+                                    verbose=False)
+            done += size
+            for model_id, run in batch.items():
+                runs[model_id]["results"].extend(run["results"])
+                for result in run["results"]:
+                    runs[model_id]["metrics"].update_result(result)
+                runs[model_id]["errors"] += run["errors"]
+                runs[model_id]["elapsed"] += run["elapsed"]
+                runs[model_id]["throttled"] = run["throttled"]
+
+            if len(model_ids) == 1:
+                bounds = runs[baseline]["metrics"].bootstrap(
+                    EARLY_STOP_BOOTSTRAP, confidence, seed)["accuracy"]
+                intervals = [bounds] if bounds else []
+                estimate = f"{runs[baseline]['metrics'].rates()['accuracy'] * 100:.2f}%"
+                name = "accuracy"
+            else:
+                differences = [paired_accuracy_difference(runs[model_id]["metrics"],
+                                                          runs[baseline]["metrics"],
+                                                          EARLY_STOP_BOOTSTRAP, confidence, seed)
+                               for model_id in model_ids[1:]]
+                intervals = [(d["low"], d["high"]) for d in differences if d]
+                estimate = (f"{differences[0]['difference'] * 100:+.2f} pts"
+                            if differences[0] else "-")
+                name = f"accuracy difference vs {model_label(baseline)}"
+
+            interval = max(intervals, key=lambda bounds: bounds[1] - bounds[0]) if intervals else None
+            width = interval[1] - interval[0] if interval else float("inf")
+            print(f"Sampled {min(done, len(ordered))}/{len(ordered)}: {name} {estimate}, "
+                  f"{confidence * 100:.0f}% CI width {width * 100:.2f} pts "
+                  f"(target {target_width * 100:.2f})")
+            if width <= target_width:
+                break
+
+        stopped_early = done < len(ordered)
+        samples = min(done, len(ordered))
+        if stopped_early:
+            print(f"Stopped early after {samples}/{len(ordered)} samples "
+                  f"({samples / len(ordered) * 100:.0f}% of the test set)")
+        for run in runs.values():
+            run.update(stopped_early=stopped_early, samples=samples, interval=interval)
+        return runs
+
+    def run_batch(self, test_data: List[Dict], backend: BatchBackend, input_uri: str,
+                  output_uri: str, poll_seconds: float = BATCH_POLL_SECONDS) -> List[Dict]:
+        """
+        Run the test as one batch inference job instead of converse calls.
+
+        Args:
+            test_data: Test records
+            backend: Batch service backend
+            input_uri: S3 URI for the job input JSONL
+            output_uri: S3 prefix for the job output
+            poll_seconds: Seconds between job status polls
+
+        Returns:
+            Results in test data order
+        """
+        samples = self.prepare_samples(test_data)
+        return run_batch_job(backend, PRO_MODEL_ID, samples, input_uri, output_uri,
+                             self.make_result, poll_seconds=poll_seconds)
+
+    def save_results(self, results: List[Dict], file_path: str):
+        """Atomically save results to JSONL file (compacting a streamed result file)."""
+        tmp_path = file_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for result in results:
+                f.write(json.dumps(result, ensure_ascii=False) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, file_path)
+        print(f"Results saved to {file_path}")
+
+    def calculate_accuracy(self, results: List[Dict], bootstrap_samples: int = BOOTSTRAP_SAMPLES,
+                           confidence: float = CONFIDENCE_LEVEL) -> Dict:
+        """
+        Calculate overall and per-category accuracy, precision, recall and F1.
+
+        Args:
+            results: Result records
+            bootstrap_samples: Bootstrap replicates for confidence intervals (0 to skip)
+            confidence: Confidence level of the intervals
+
+        Returns:
+            Accuracy statistics with confusion matrix and confidence intervals
+        """
+        metrics = MetricsAccumulator(CATEGORIES)
+        for result in results:
+            metrics.update_result(result)
+        return metrics.summary(bootstrap_samples, confidence)
+
+    def print_results(self, accuracy_stats: Dict):
+        """Print formatted results."""
+        print("\n" + "="*60)
+        print("NOVA PRO MODEL ACCURACY RESULTS")
+        print("="*60)
+
+        print(f"\nOverall Accuracy: {accuracy_stats['overall_accuracy']:.2f}%")
+        print(
+            f"Correct Predictions: {accuracy_stats['correct_predictions']}/{accuracy_stats['total_samples']}")
+
+        print("\nPer-Category Results:")
+        print("-" * 40)
+        for category, stats in accuracy_stats['category_stats'].items():
+            print(
+                f"{category.upper():>8}: {stats['accuracy']:>6.2f}% ({stats['correct']:>3}/{stats['total']:>3})")
+
+        print("\nPer-Category Precision / Recall / F1:")
+        print("-" * 40)
+        for category, stats in accuracy_stats['category_stats'].items():
+            values = [stats.get(name) for name in ("precision", "recall", "f1")]
+            print(f"{category.upper():>8}: " + "  ".join(
+                f"{name[0].upper()} {'-' if value is None else f'{value:.3f}'}"
+                for name, value in zip(("precision", "recall", "f1"), values)))
+
+        intervals = accuracy_stats.get('confidence_intervals')
+        if intervals:
+            level = f"{intervals['confidence'] * 100:.0f}%"
+            print(f"\n{level} Bootstrap Confidence Intervals ({intervals['samples']} resamples):")
+            print("-" * 40)
+            low, high = intervals['accuracy']
+            print(f"{'ACCURACY':>8}: [{low * 100:.2f}%, {high * 100:.2f}%]")
+            if intervals['macro_f1']:
+                low, high = intervals['macro_f1']
+                print(f"{'MACRO F1':>8}: [{low:.3f}, {high:.3f}]")
+            for category, bounds in intervals['per_category'].items():
+                if bounds['f1']:
+                    low, high = bounds['f1']
+                    print(f"{category.upper():>8}: F1 [{low:.3f}, {high:.3f}]")
+
+        print("\nConfusion Matrix:")
+        print("-" * 40)
+        categories = CATEGORIES
+        print(f"{'Actual':>8} | {'Predicted':>20}")
+        print(f"{'':>8} | {'porn':>6} {'sexy':>6} {'neutral':>8}")
+        print("-" * 40)
+
+        for actual in categories:
+            row = f"{actual:>8} |"
+            for predicted in categories:
+                count = accuracy_stats['confusion_matrix'][actual][predicted]
+                row += f"{count:>6}"
+            print(row)
+
+    def print_comparison(self, runs: Dict[str, Dict[str, Any]], stats: Dict[str, Dict],
+                         confidence: float = CONFIDENCE_LEVEL):
+        """
+        Print a side-by-side accuracy, confusion-matrix and latency report.
+
+        Args:
+            runs: Runs returned by run_models
+            stats: calculate_accuracy-style statistics per model, with a
+                usage_summary() under "usage"
+            confidence: Confidence level of the accuracy difference intervals
+        """
+        model_ids = list(runs)
+        width = max(12, *(len(model_label(model_id)) + 2 for model_id in model_ids))
+
+        def row(name: str, values: List[str]):
+            print(f"{name:<22}" + "".join(f"{value:>{width}}" for value in values))
+
+        print("\n" + "=" * 60)
+        print("MODEL COMPARISON")
+        print("=" * 60)
+        row("", [model_label(model_id) for model_id in model_ids])
+        print("-" * (22 + width * len(model_ids)))
+        row("Accuracy", [f"{stats[m]['overall_accuracy']:.2f}%" for m in model_ids])
+        intervals = [stats[m].get("confidence_intervals") for m in model_ids]
+        if all(intervals):
+            row(f"  {intervals[0]['confidence'] * 100:.0f}% CI",
+                [f"{low * 100:.1f}-{high * 100:.1f}" for low, high in
+                 (interval["accuracy"] for interval in intervals)])
+        row("Macro F1", ["-" if stats[m]["macro_f1"] is None else f"{stats[m]['macro_f1']:.3f}"
+                         for m in model_ids])
+        for category in CATEGORIES:
+            row(f"{category.upper()} accuracy",
+                [f"{stats[m]['category_stats'][category]['accuracy']:.2f}%"
+                 if category in stats[m]["category_stats"] else "-" for m in model_ids])
+        usage = {m: stats[m]["usage"] for m in model_ids}
+
+        def number(value, template):
+            return "-" if value is None else template.format(value)
+
+        for quantile in LATENCY_PERCENTILES:
+            row(f"Latency p{quantile} (ms)",
+                [number(usage[m]["client_latency_ms"][f"p{quantile}"], "{:.0f}") for m in model_ids])
+        row("Server latency p50 (ms)",
+            [number(usage[m]["server_latency_ms"]["p50"], "{:.0f}") for m in model_ids])
+        row("Throughput (samples/s)",
+            [number(usage[m]["throughput_per_second"], "{:.1f}") for m in model_ids])
+        row("Input tokens / image",
+            [number(usage[m]["input_tokens_per_image"], "{:.0f}") for m in model_ids])
+        if any(usage[m]["cache_read_tokens"] or usage[m]["cache_write_tokens"] for m in model_ids):
+            row("Cache read tokens / image",
+                [number(usage[m]["cache_read_tokens_per_image"], "{:.0f}") for m in model_ids])
+        row("Cost / 1k images (USD)",
+            [number(usage[m]["cost_per_1k_images"], "{:.4f}") for m in model_ids])
+        row("Throttled", [str(runs[m]["throttled"]) for m in model_ids])
+        row("Errors", [str(runs[m]["errors"]) for m in model_ids])
+
+        baseline = model_ids[0]
+        if len(model_ids) > 1:
+            print(f"\nAccuracy difference vs {model_label(baseline)} "
+                  f"(paired bootstrap, {confidence * 100:.0f}% CI):")
+            print("-" * 40)
+            for model_id in model_ids[1:]:
+                difference = paired_accuracy_difference(runs[model_id]["metrics"],
+                                                        runs[baseline]["metrics"],
+                                                        confidence=confidence)
+                if difference:
+                    print(f"{model_label(model_id):>22}: {difference['difference'] * 100:+.2f} pts "
+                          f"[{difference['low'] * 100:+.2f}, {difference['high'] * 100:+.2f}]")
+
+        print("\nConfusion Matrices (rows actual; columns predicted porn/sexy/neutral):")
+        print("-" * 40)
+        row("", [model_label(model_id) for model_id in model_ids])
+        for actual in CATEGORIES:
+            row(actual, ["/".join(str(stats[m]["confusion_matrix"][actual][predicted])
+                                  for predicted in CATEGORIES) for m in model_ids])
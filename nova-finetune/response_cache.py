@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Persistent on-disk cache of converse() responses.
+
+Responses are stored in SQLite, keyed by a SHA-256 hash of the canonical
+request: model ID, messages (image URI/bytes and format, user prompt), system
+prompt and inference parameters. Entries expire after a TTL, and the least
+recently used entries are evicted when the stored responses exceed a size
+limit. CachingConverseClient wraps a bedrock-runtime client so evaluation
+scripts use the cache transparently.
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+RESPONSE_CACHE_FILE = "nova_response_cache.sqlite"
+CACHE_TTL_SECONDS = 30 * 24 * 3600
+CACHE_MAX_BYTES = 256 * 1024 * 1024
+CACHE_MODES = ("use", "refresh", "bypass")
+
+
+def _json_default(value: Any) -> Any:
+    """Serialize inline image bytes by their hash."""
+    if isinstance(value, (bytes, bytearray)):
+        return {"sha256": hashlib.sha256(value).hexdigest()}
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+
+def request_key(request: Dict[str, Any]) -> str:
+    """
+    Hash the parts of a converse request that determine the response.
+
+    Args:
+        request: converse() keyword arguments
+
+    Returns:
+        Hex digest
+    """
+    canonical = json.dumps(request, sort_keys=True, separators=(',', ':'),
+                           ensure_ascii=False, default=_json_default)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    """Thread-safe SQLite cache of converse responses with TTL and LRU size eviction."""
+
+    def __init__(self, path: Path = Path(RESPONSE_CACHE_FILE), ttl_seconds: float = CACHE_TTL_SECONDS,
+                 max_bytes: int = CACHE_MAX_BYTES, mode: str = "use"):
+        """
+        Initialize cache.
+
+        Args:
+            path: SQLite database file
+            ttl_seconds: Age after which entries are ignored and evicted
+            max_bytes: Total stored response size that triggers LRU eviction
+            mode: use (read and write), refresh (write only) or bypass (neither)
+        """
+        if mode not in CACHE_MODES:
+            raise ValueError(f"Unknown cache mode: {mode}")
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.mode = mode
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._connection = None
+
+        if mode != "bypass":
+            self._connection = sqlite3.connect(str(path), check_same_thread=False)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, response TEXT NOT NULL, size INTEGER NOT NULL, "
+                "created REAL NOT NULL, last_used REAL NOT NULL)")
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)")
+            self._connection.commit()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return a fresh cached response, or None."""
+        if self.mode != "use":
+            self.misses += 1
+            return None
+        now = time.time()
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT response, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None or now - row[1] > self.ttl_seconds:
+                self.misses += 1
+                return None
+            self._connection.execute(
+                "UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+            self._connection.commit()
+            self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, key: str, response: Dict[str, Any]):
+        """Store a response (without boto3's ResponseMetadata)."""
+        if self.mode == "bypass":
+            return
+        response = {name: value for name, value in response.items() if name != "ResponseMetadata"}
+        data = json.dumps(response, ensure_ascii=False, default=str)
+        now = time.time()
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO responses (key, response, size, created, last_used) "
+                "VALUES (?, ?, ?, ?, ?)", (key, data, len(data), now, now))
+            self._connection.commit()
+
+    def evict(self) -> int:
+        """
+        Delete expired entries, then least recently used ones above max_bytes.
+
+        Returns:
+            Number of deleted entries
+        """
+        if self._connection is None:
+            return 0
+        with self._lock:
+            deleted = self._connection.execute(
+                "DELETE FROM responses WHERE created < ?",
+                (time.time() - self.ttl_seconds,)).rowcount
+
+            total = self._connection.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+            if total > self.max_bytes:
+                excess = total - self.max_bytes
+                keys = []
+                for key, size in self._connection.execute(
+                        "SELECT key, size FROM responses ORDER BY last_used"):
+                    if excess <= 0:
+                        break
+                    keys.append((key,))
+                    excess -= size
+                self._connection.executemany("DELETE FROM responses WHERE key = ?", keys)
+                deleted += len(keys)
+            self._connection.commit()
+        return deleted
+
+    def close(self):
+        """Evict and close the database."""
+        if self._connection is not None:
+            self.evict()
+            self._connection.close()
+            self._connection = None
+
+
+class CachingConverseClient:
+    """bedrock-runtime client wrapper that serves converse() from a ResponseCache."""
+
+    def __init__(self, client, cache: ResponseCache):
+        """
+        Initialize wrapper.
+
+        Args:
+            client: bedrock-runtime client (or a stand-in with converse())
+            cache: Response cache
+        """
+        self.client = client
+        self.cache = cache
+
+    def converse(self, **request) -> Dict[str, Any]:
+        """
+        Return the cached response for a request, or call converse() and cache it.
+
+        Responses served from the cache carry "cached": True, so callers can
+        leave them out of latency measurements.
+        """
+        key = request_key(request)
+        response = self.cache.get(key)
+        if response is not None:
+            response["cached"] = True
+            return response
+        response = self.client.converse(**request)
+        self.cache.put(key, response)
+        return response
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+"""
+Sharded, size-bounded JSONL output with a manifest.
+
+Each split is written as numbered shards capped by record count and/or
+uncompressed bytes, optionally compressed with gzip or zstd. Per-shard record
+counts, category histograms and SHA-256 checksums are collected for the split
+manifest, so uploads and validation can process shards in parallel.
+"""
+
+import gzip
+import hashlib
+import io
+import json
+import os
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, IO, Iterator, List, Optional
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+SPLIT_MANIFEST_FILE = "split_manifest.json"
+COMPRESSIONS = {"none": "", "gzip": ".gz", "zstd": ".zst"}
+
+
+def parse_size(value: str) -> int:
+    """Parse a byte size such as 1048576, 512K, 64M or 2G."""
+    value = value.strip().upper()
+    multipliers = {"K": 1 << 10, "M": 1 << 20, "G": 1 << 30}
+    if value and value[-1] in multipliers:
+        return int(float(value[:-1]) * multipliers[value[-1]])
+    return int(value)
+
+
+class _HashingFile(io.RawIOBase):
+    """Write-only file wrapper that hashes and counts the bytes written."""
+
+    def __init__(self, path: Path):
+        self._file = open(path, 'wb')
+        self.sha256 = hashlib.sha256()
+        self.bytes_written = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self.sha256.update(data)
+        self.bytes_written += len(data)
+        return self._file.write(data)
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        if not self.closed:
+            super().close()
+            os.fsync(self._file.fileno())
+            self._file.close()
+
+
+class HashingReader(io.RawIOBase):
+    """Read-only file wrapper that hashes the bytes read."""
+
+    def __init__(self, path: Path):
+        self._file = open(path, 'rb')
+        self.sha256 = hashlib.sha256()
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        size = self._file.readinto(buffer)
+        self.sha256.update(memoryview(buffer)[:size])
+        return size
+
+    def close(self):
+        if not self.closed:
+            super().close()
+            self._file.close()
+
+
+class ShardedJsonlWriter:
+    """Write one split as size-bounded, optionally compressed JSONL shards."""
+
+    def __init__(self, output_dir: Path, split_name: str,
+                 max_records: Optional[int] = None, max_bytes: Optional[int] = None,
+                 compression: str = "none"):
+        """
+        Initialize writer.
+
+        Without limits or compression the split is written as a single
+        <split>.jsonl, matching the unsharded layout; otherwise shards are
+        named <split>-00000.jsonl[.gz|.zst].
+
+        Args:
+            output_dir: Output directory
+            split_name: Split name (train, validation, test)
+            max_records: Max records per shard
+            max_bytes: Max uncompressed bytes per shard
+            compression: none, gzip or zstd
+        """
+        if compression not in COMPRESSIONS:
+            raise ValueError(f"Unknown compression: {compression}")
+        if compression == "zstd" and zstandard is None:
+            raise RuntimeError(
+                "zstd compression requires the zstandard package: pip install zstandard")
+
+        self.output_dir = output_dir
+        self.split_name = split_name
+        self.max_records = max_records
+        self.max_bytes = max_bytes
+        self.compression = compression
+        self.sharded = bool(max_records or max_bytes or compression != "none")
+        self.shards: List[Dict[str, Any]] = []
+
+        self._raw: Optional[_HashingFile] = None
+        self._stream: Optional[IO[bytes]] = None
+        self._current: Optional[Dict[str, Any]] = None
+
+        if self.sharded:
+            # Remove shards left over from a previous, larger run
+            for stale in output_dir.glob(f"{split_name}-[0-9][0-9][0-9][0-9][0-9].jsonl*"):
+                stale.unlink()
+
+    def _open_shard(self):
+        """Start a new shard file."""
+        if self.sharded:
+            name = f"{self.split_name}-{len(self.shards):05d}.jsonl{COMPRESSIONS[self.compression]}"
+        else:
+            name = f"{self.split_name}.jsonl"
+
+        self._raw = _HashingFile(self.output_dir / name)
+        if self.compression == "gzip":
+            # mtime=0 keeps the output (and checksum) reproducible
+            self._stream = gzip.GzipFile(filename='', fileobj=self._raw, mode='wb', mtime=0)
+        elif self.compression == "zstd":
+            self._stream = zstandard.ZstdCompressor().stream_writer(self._raw, closefd=False)
+        else:
+            self._stream = self._raw
+        self._current = {"file": name, "records": 0, "bytes": 0, "categories": {}}
+
+    def _close_shard(self):
+        """Finish the current shard and record its manifest entry."""
+        if self._current is None:
+            return
+        if self._stream is not self._raw:
+            self._stream.close()
+        self._raw.close()
+        self._current["compressed_bytes"] = self._raw.bytes_written
+        self._current["sha256"] = self._raw.sha256.hexdigest()
+        self.shards.append(self._current)
+        self._raw = self._stream = self._current = None
+
+    def write_line(self, json_line: str, category: Optional[str] = None):
+        """
+        Write one JSON line, starting a new shard when a limit would be exceeded.
+
+        Args:
+            json_line: Serialized record without trailing newline
+            category: Record category for the shard histogram
+        """
+        data = (json_line + '\n').encode('utf-8')
+        current = self._current
+        if current is not None and current["records"] and (
+                (self.max_records and current["records"] >= self.max_records)
+                or (self.max_bytes and current["bytes"] + len(data) > self.max_bytes)):
+            self._close_shard()
+            current = None
+        if current is None:
+            self._open_shard()
+            current = self._current
+
+        self._stream.write(data)
+        current["records"] += 1
+        current["bytes"] += len(data)
+        if category is not None:
+            current["categories"][category] = current["categories"].get(category, 0) + 1
+
+    def close(self) -> Dict[str, Any]:
+        """
+        Finish writing and return the split's manifest entry.
+
+        Returns:
+            Dictionary with total records, category histogram and shards
+        """
+        if self._current is None and not self.shards:
+            # Always produce at least one (possibly empty) file per split
+            self._open_shard()
+        self._close_shard()
+
+        categories: Dict[str, int] = {}
+        for shard in self.shards:
+            for category, count in shard["categories"].items():
+                categories[category] = categories.get(category, 0) + count
+        return {
+            "records": sum(shard["records"] for shard in self.shards),
+            "bytes": sum(shard["bytes"] for shard in self.shards),
+            "categories": categories,
+            "compression": self.compression,
+            "shards": self.shards
+        }
+
+
+def write_split_manifest(output_dir: Path, splits: Dict[str, Dict[str, Any]],
+                         config: Dict[str, Any]) -> Path:
+    """
+    Write the split manifest.
+
+    Args:
+        output_dir: Output directory holding the shards
+        splits: Split name -> entry returned by ShardedJsonlWriter.close()
+        config: Splitter configuration used to produce the splits
+
+    Returns:
+        Manifest path
+    """
+    manifest = {
+        "version": 1,
+        "created": datetime.now(timezone.utc).isoformat(),
+        "config": config,
+        "splits": splits
+    }
+    path = output_dir / SPLIT_MANIFEST_FILE
+    tmp_path = path.with_name(path.name + '.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, path)
+    return path
+
+
+def load_split_manifest(manifest_path: Path) -> Dict[str, Any]:
+    """Load a split manifest written by write_split_manifest()."""
+    with open(manifest_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def open_shard(path: Path, fileobj: Optional[IO[bytes]] = None) -> IO[str]:
+    """
+    Open a shard for reading text, decompressing by file extension.
+
+    Args:
+        path: Shard path; its extension selects the decompression
+        fileobj: Binary stream of the shard to read instead of opening path
+            (e.g. a HashingReader); the caller closes it
+
+    Returns:
+        Text stream of the decompressed shard
+    """
+    if path.suffix == ".gz":
+        return gzip.open(fileobj or path, 'rt', encoding='utf-8')
+    if path.suffix == ".zst":
+        if zstandard is None:
+            raise RuntimeError(
+                "Reading .zst shards requires the zstandard package: pip install zstandard")
+        raw = fileobj or open(path, 'rb')
+        return io.TextIOWrapper(zstandard.ZstdDecompressor().stream_reader(raw, closefd=fileobj is None),
+                                encoding='utf-8')
+    if fileobj is not None:
+        return io.TextIOWrapper(io.BufferedReader(fileobj), encoding='utf-8')
+    return open(path, 'r', encoding='utf-8')
+
+
+def iter_split_lines(manifest_path: Path, split_name: str) -> Iterator[str]:
+    """
+    Iterate over the lines of every shard of a split, in shard order.
+
+    Args:
+        manifest_path: Split manifest path
+        split_name: Split name
+
+    Yields:
+        Lines without trailing newline
+    """
+    manifest = load_split_manifest(manifest_path)
+    for shard in manifest["splits"][split_name]["shards"]:
+        with open_shard(manifest_path.parent / shard["file"]) as f:
+            for line in f:
+                yield line.rstrip('\n')
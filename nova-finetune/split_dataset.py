@@ -12,10 +12,21 @@ Sampling Strategy:
 """
 
 import json
+import math
+import shutil
+import tempfile
 import random
+import re
+import hashlib
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+from dedup_index import DedupIndex
+from jsonl_index import JsonlLineIndex
+from shard_writer import (COMPRESSIONS, ShardedJsonlWriter, parse_size,
+                          write_split_manifest)
 
 # Configuration
 CATEGORIES = ["neutral", "porn", "sexy"]
@@ -26,18 +37,181 @@ VALIDATION_SIZE_PER_CATEGORY = 50
 
 RANDOM_SEED = 42
 
+SPLIT_NAMES = ("train", "validation", "test")
+
+# Sampling modes: load whole files, single-pass reservoir, or line-offset index
+SAMPLING_MODES = ("memory", "reservoir", "index")
+
+# Split assignment: seeded shuffle, or keyed hash of each image URI
+ASSIGNMENT_MODES = ("shuffle", "hash")
+
+# Fast path for pulling the image URI out of a raw JSONL line
+URI_PATTERN = re.compile(r'"uri":\s*"((?:[^"\\]|\\.)*)"')
+# Fast path for the assistant label, the last text block of a raw JSONL line
+LABEL_PATTERN = re.compile(r'"text":\s*("(?:[^"\\]|\\.)*")\s*\}\s*\]\s*\}\s*\]\s*\}\s*$')
+
+
+def parse_record(record) -> Dict[str, Any]:
+    """Return a record as a dict, parsing it if it is still a raw JSON line."""
+    return json.loads(record) if isinstance(record, str) else record
+
+
+def extract_label(record) -> str:
+    """Extract the category label from a conversation record or raw JSON line."""
+    return parse_record(record)['messages'][1]['content'][0]['text']
+
+
+def extract_image_uri(record) -> Optional[str]:
+    """Extract the image S3 URI from a conversation record or raw JSON line."""
+    try:
+        record = parse_record(record)
+        for content in record['messages'][0]['content']:
+            if 'image' in content:
+                return content['image']['source']['s3Location']['uri']
+    except (KeyError, IndexError, TypeError, ValueError):
+        pass
+    return None
+
+
+def extract_image_uri_fast(line: str) -> Optional[str]:
+    """Extract the image S3 URI from a raw JSON line, parsing only if needed."""
+    match = URI_PATTERN.search(line)
+    if match is None:
+        return extract_image_uri(line)
+    value = match.group(1)
+    return json.loads(f'"{value}"') if '\\' in value else value
+
+
+def extract_label_fast(line: str) -> Optional[str]:
+    """Extract the category label from a raw JSON line, parsing only if needed."""
+    match = LABEL_PATTERN.search(line)
+    if match is not None:
+        return json.loads(match.group(1))
+    try:
+        return extract_label(line)
+    except (KeyError, IndexError, TypeError, ValueError):
+        return None
+
+
+def _open_unit(rng: random.Random) -> float:
+    """Draw a uniform float in the open interval (0, 1)."""
+    value = rng.random()
+    while value == 0.0:
+        value = rng.random()
+    return value
+
+
+def reservoir_sample_lines(file_path: Path, sample_size: int,
+                           rng: random.Random) -> List[str]:
+    """
+    Sample raw lines from a JSONL file in a single streaming pass.
+
+    Uses reservoir sampling (Algorithm L): only the selected lines are held
+    in memory and no line is parsed, and the number of random draws grows
+    with the sample size rather than the file size.
+
+    Args:
+        file_path: Path to JSONL file
+        sample_size: Number of lines to select
+        rng: Seeded random generator; a fixed seed gives a fixed sample
+
+    Returns:
+        Selected lines (decoded, without trailing newline), in reservoir order
+    """
+    reservoir: List[bytes] = []
+    if sample_size <= 0:
+        return []
+
+    with open(file_path, 'rb') as f:
+        lines = (line for line in f if line.strip())
+
+        for line in lines:
+            reservoir.append(line)
+            if len(reservoir) == sample_size:
+                break
+
+        weight = math.exp(math.log(_open_unit(rng)) / sample_size)
+        while len(reservoir) == sample_size:
+            # Skip ahead to the next line that enters the reservoir
+            skip = math.floor(math.log(_open_unit(rng)) / math.log(1 - weight))
+            line = None
+            for line in lines:
+                if skip == 0:
+                    break
+                skip -= 1
+            else:
+                break
+            reservoir[rng.randrange(sample_size)] = line
+            weight *= math.exp(math.log(_open_unit(rng)) / sample_size)
+
+    return [line.decode('utf-8').rstrip('\r\n') for line in reservoir]
+
 
 class DatasetSplitter:
     """Split dataset into train/validation/test sets."""
 
-    def __init__(self, random_seed: int = RANDOM_SEED):
+    def __init__(self, random_seed: int = RANDOM_SEED,
+                 dedup_index: Optional[DedupIndex] = None,
+                 sampling: str = "memory",
+                 assignment: str = "shuffle",
+                 hash_sample_rate: float = 1.0,
+                 categories: Optional[List[str]] = None,
+                 sample_size: int = SAMPLE_SIZE_PER_CATEGORY,
+                 train_size: int = TRAIN_SIZE_PER_CATEGORY,
+                 validation_size: int = VALIDATION_SIZE_PER_CATEGORY,
+                 input_dir: Path = Path("."),
+                 workers: int = 1,
+                 shard_records: Optional[int] = None,
+                 shard_bytes: Optional[int] = None,
+                 compression: str = "none"):
         """
         Initialize dataset splitter.
 
         Args:
             random_seed: Random seed for reproducible results
+            dedup_index: Optional duplicate index; duplicate clusters are
+                kept within a single split
+            sampling: How category files are sampled: "memory" loads them,
+                "reservoir" streams them once, "index" seeks to the chosen
+                lines through a cached line-offset index
+            assignment: "shuffle" splits a seeded random sample; "hash"
+                assigns every record by a keyed hash of its image URI
+            hash_sample_rate: Fraction of records kept in hash assignment
+            categories: Category names; each is read from <category>.jsonl
+            sample_size: Records sampled per category
+            train_size: Training records per category
+            validation_size: Validation records per category (the rest of
+                the sample goes to test)
+            input_dir: Directory holding the category files
+            workers: Number of worker processes; above 1, each category is
+                split in its own process and outputs are merged by streaming
+            shard_records: Max records per output shard
+            shard_bytes: Max uncompressed bytes per output shard
+            compression: Output shard compression (none, gzip, zstd)
         """
+        if sampling not in SAMPLING_MODES:
+            raise ValueError(f"Unknown sampling mode: {sampling}")
+        if assignment not in ASSIGNMENT_MODES:
+            raise ValueError(f"Unknown assignment mode: {assignment}")
+        if not 0 < hash_sample_rate <= 1:
+            raise ValueError("hash_sample_rate must be in (0, 1]")
+        if train_size < 0 or validation_size < 0 or train_size + validation_size > sample_size:
+            raise ValueError(
+                f"Invalid sizes: train={train_size}, validation={validation_size}, sample={sample_size}")
         self.random_seed = random_seed
+        self.dedup_index = dedup_index
+        self.sampling = sampling
+        self.assignment = assignment
+        self.hash_sample_rate = hash_sample_rate
+        self.categories = list(categories) if categories else list(CATEGORIES)
+        self.sample_size = sample_size
+        self.train_size = train_size
+        self.validation_size = validation_size
+        self.input_dir = input_dir
+        self.workers = workers
+        self.shard_records = shard_records
+        self.shard_bytes = shard_bytes
+        self.compression = compression
         random.seed(random_seed)
 
     def load_jsonl_file(self, file_path: Path) -> List[Dict[str, Any]]:
@@ -88,14 +262,16 @@ class DatasetSplitter:
         return random.sample(records, sample_size)
 
     def split_records(self, records: List[Dict[str, Any]],
-                      train_size: int, validation_size: int) -> tuple:
+                      train_size: int, validation_size: int,
+                      rng: random.Random = random) -> tuple:
         """
         Split records into train, validation, and test sets.
 
         Args:
-            records: List of records to split
+            records: List of records (dicts or raw JSON lines) to split
             train_size: Number of records for training
             validation_size: Number of records for validation
+            rng: Random generator used for shuffling
 
         Returns:
             Tuple of (train_records, validation_records, test_records)
@@ -104,9 +280,12 @@ class DatasetSplitter:
             raise ValueError(
                 f"Not enough records to split: need {train_size + validation_size}, got {len(records)}")
 
+        if self.dedup_index is not None:
+            return self.split_records_by_cluster(records, train_size, validation_size, rng)
+
         # Shuffle records for random distribution
         shuffled_records = records.copy()
-        random.shuffle(shuffled_records)
+        rng.shuffle(shuffled_records)
 
         # Split records
         train_records = shuffled_records[:train_size]
@@ -115,18 +294,143 @@ class DatasetSplitter:
 
         return train_records, validation_records, test_records
 
+    def split_records_by_cluster(self, records: List[Dict[str, Any]],
+                                 train_size: int, validation_size: int,
+                                 rng: random.Random = random) -> tuple:
+        """
+        Split records so that every duplicate cluster lands in a single split.
+
+        Clusters are shuffled and assigned whole, filling train, then
+        validation, then test. Clusters that span several categories are
+        pinned to a split by a keyed hash of the cluster, so every category
+        agrees on their split without coordination.
+
+        Args:
+            records: List of records to split
+            train_size: Number of records for training
+            validation_size: Number of records for validation
+            rng: Random generator used for shuffling
+
+        Returns:
+            Tuple of (train_records, validation_records, test_records)
+        """
+        clusters: Dict[Any, List[Dict[str, Any]]] = {}
+        for i, record in enumerate(records):
+            cluster = self.dedup_index.cluster_of(extract_image_uri(record))
+            # Records missing from the index form their own cluster
+            clusters.setdefault(cluster if cluster is not None else ('record', i), []).append(record)
+
+        cluster_keys = list(clusters)
+        rng.shuffle(cluster_keys)
+
+        splits = ([], [], [])
+        pinned = 0
+        for key in cluster_keys:
+            members = clusters[key]
+            if not isinstance(key, tuple) and self.dedup_index.spans_categories(key):
+                target = splits[self.pinned_split(key, train_size, validation_size, len(records))]
+                pinned += len(members)
+            elif len(splits[0]) < train_size:
+                target = splits[0]
+            elif len(splits[1]) < validation_size:
+                target = splits[1]
+            else:
+                target = splits[2]
+            target.extend(members)
+
+        duplicates = len(records) - len(clusters)
+        print(f"Kept {duplicates} duplicate record(s) with their clusters, "
+              f"{pinned} pinned across categories")
+        return splits
+
+    def pinned_split(self, cluster: int, train_size: int, validation_size: int, total: int) -> int:
+        """
+        Choose a split for a cross-category cluster from a keyed hash.
+
+        Args:
+            cluster: Cluster id in the dedup index
+            train_size: Number of records for training
+            validation_size: Number of records for validation
+            total: Number of records being split
+
+        Returns:
+            Split index (0 train, 1 validation, 2 test)
+        """
+        point = self.hash_point(self.dedup_index.uris[cluster]) * total
+        if point < train_size:
+            return 0
+        if point < train_size + validation_size:
+            return 1
+        return 2
+
+    def open_split_writer(self, output_dir: Path, split_name: str) -> ShardedJsonlWriter:
+        """Open the (possibly sharded) writer for one output split."""
+        return ShardedJsonlWriter(output_dir, split_name,
+                                  max_records=self.shard_records,
+                                  max_bytes=self.shard_bytes,
+                                  compression=self.compression)
+
+    def write_split(self, records: List[Any], output_dir: Path, split_name: str) -> Dict[str, Any]:
+        """
+        Write one split through the shard writer.
+
+        Args:
+            records: Records (dicts or raw JSON lines) to write
+            output_dir: Output directory
+            split_name: Split name (train, validation, test)
+
+        Returns:
+            Split manifest entry
+        """
+        writer = self.open_split_writer(output_dir, split_name)
+        for record in records:
+            if isinstance(record, str):
+                json_line = record
+            else:
+                json_line = json.dumps(record, ensure_ascii=False)
+            writer.write_line(json_line, extract_label_fast(json_line))
+        entry = writer.close()
+        self.print_split_written(entry, output_dir)
+        return entry
+
+    def print_split_written(self, entry: Dict[str, Any], output_dir: Path):
+        """Report where a split was written."""
+        files = [shard["file"] for shard in entry["shards"]]
+        target = output_dir / files[0] if len(files) == 1 else f"{len(files)} shards in {output_dir}"
+        print(f"Successfully wrote {entry['records']} records to {target}")
+
+    def manifest_config(self) -> Dict[str, Any]:
+        """Return the splitter configuration recorded in the split manifest."""
+        return {
+            "seed": self.random_seed,
+            "categories": self.categories,
+            "sample_size": self.sample_size,
+            "train_size": self.train_size,
+            "validation_size": self.validation_size,
+            "sampling": self.sampling,
+            "assignment": self.assignment,
+            "hash_sample_rate": self.hash_sample_rate,
+            "dedup_index": self.dedup_index is not None,
+            "shard_records": self.shard_records,
+            "shard_bytes": self.shard_bytes,
+            "compression": self.compression
+        }
+
     def write_jsonl_file(self, records: List[Dict[str, Any]], output_path: Path):
         """
         Write records to JSONL file.
 
         Args:
-            records: List of records to write
+            records: List of records (dicts or raw JSON lines) to write
             output_path: Output file path
         """
         try:
             with open(output_path, 'w', encoding='utf-8') as f:
                 for record in records:
-                    json_line = json.dumps(record, ensure_ascii=False)
+                    if isinstance(record, str):
+                        json_line = record
+                    else:
+                        json_line = json.dumps(record, ensure_ascii=False)
                     f.write(json_line + '\n')
 
             print(
@@ -148,25 +452,31 @@ class DatasetSplitter:
         print(f"\nProcessing category: {category}")
 
         # Load category data
-        input_file = Path(f"{category}.jsonl")
+        input_file = self.input_dir / f"{category}.jsonl"
         if not input_file.exists():
             print(f"Error: {input_file} not found")
             return [], [], []
 
+        if self.assignment == "hash":
+            return self.process_category_hashed(category, input_file)
+
+        if self.sampling != "memory":
+            return self.process_category_streaming(category, input_file)
+
         all_records = self.load_jsonl_file(input_file)
         if not all_records:
             return [], [], []
 
         # Step 1: Sample 200 records from category
         sampled_records = self.sample_records(
-            all_records, SAMPLE_SIZE_PER_CATEGORY)
+            all_records, self.sample_size)
         print(f"Sampled {len(sampled_records)} records from {category}")
 
         # Step 2: Split sampled records
         train_records, validation_records, test_records = self.split_records(
             sampled_records,
-            TRAIN_SIZE_PER_CATEGORY,
-            VALIDATION_SIZE_PER_CATEGORY
+            self.train_size,
+            self.validation_size
         )
 
         print(
@@ -174,6 +484,143 @@ class DatasetSplitter:
 
         return train_records, validation_records, test_records
 
+    def hash_point(self, key: str) -> float:
+        """Map a key to a stable point in [0, 1) with a hash keyed by the seed."""
+        digest = hashlib.blake2b(key.encode('utf-8'), digest_size=8,
+                                 key=str(self.random_seed).encode('utf-8')).digest()
+        return int.from_bytes(digest, 'big') / 2 ** 64
+
+    def assign_split(self, uri: str) -> Optional[int]:
+        """
+        Assign an image to a split from a keyed hash of its URI.
+
+        The hash point is compared against the configured ratios, so the
+        assignment of a record never depends on any other record. Images
+        in the same dedup cluster hash their cluster's representative URI
+        and therefore always share a split.
+
+        Args:
+            uri: Image S3 URI
+
+        Returns:
+            Split index (0 train, 1 validation, 2 test), or None if the
+            record falls outside the hash sample rate
+        """
+        if self.dedup_index is not None:
+            cluster = self.dedup_index.cluster_of(uri)
+            if cluster is not None:
+                uri = self.dedup_index.uris[cluster]
+
+        point = self.hash_point(uri)
+        if point >= self.hash_sample_rate:
+            return None
+        point = point / self.hash_sample_rate * self.sample_size
+        if point < self.train_size:
+            return 0
+        if point < self.train_size + self.validation_size:
+            return 1
+        return 2
+
+    def process_category_hashed(self, category: str, input_file: Path) -> tuple:
+        """
+        Split a category file by hash assignment in one streaming pass.
+
+        Every record is assigned independently, in the configured
+        train/validation/test ratios, so adding records to the file never
+        moves existing ones between splits.
+
+        Args:
+            category: Category name
+            input_file: Category JSONL file
+
+        Returns:
+            Tuple of (train_lines, validation_lines, test_lines)
+        """
+        splits = ([], [], [])
+        skipped = 0
+        with open(input_file, 'r', encoding='utf-8') as f:
+            for line_num, line in enumerate(f, 1):
+                line = line.rstrip('\r\n')
+                if not line.strip():
+                    continue
+                uri = extract_image_uri_fast(line)
+                if uri is None:
+                    print(f"Error: no image URI on line {line_num} in {input_file}")
+                    continue
+                split = self.assign_split(uri)
+                if split is None:
+                    skipped += 1
+                    continue
+                splits[split].append(line)
+
+        train_lines, validation_lines, test_lines = splits
+        print(
+            f"Split {category} by hash: train={len(train_lines)}, validation={len(validation_lines)}, "
+            f"test={len(test_lines)}, outside sample rate={skipped}")
+
+        return train_lines, validation_lines, test_lines
+
+    def category_rng(self, category: str) -> random.Random:
+        """Return a random generator seeded from the splitter seed and a category."""
+        return random.Random(f"{self.random_seed}:{category}")
+
+    def sample_lines_indexed(self, input_file: Path, sample_size: int,
+                             rng: random.Random) -> List[str]:
+        """
+        Sample raw lines by seeking through a cached line-offset index.
+
+        Args:
+            input_file: Category JSONL file
+            sample_size: Number of lines to select
+            rng: Seeded random generator
+
+        Returns:
+            Selected lines (decoded, without trailing newline)
+        """
+        with JsonlLineIndex.open(input_file) as index:
+            chosen = rng.sample(range(len(index)), min(sample_size, len(index)))
+            return index.read_lines(chosen)
+
+    def process_category_streaming(self, category: str, input_file: Path) -> tuple:
+        """
+        Sample and split a category file without loading it into memory.
+
+        Reservoir sampling selects sample_size raw lines in one
+        pass; index sampling seeks straight to randomly chosen lines. Only
+        the selected lines are kept, and the result depends only on the
+        seed and the file contents.
+
+        Args:
+            category: Category name
+            input_file: Category JSONL file
+
+        Returns:
+            Tuple of (train_lines, validation_lines, test_lines)
+        """
+        rng = self.category_rng(category)
+        if self.sampling == "index":
+            sampled_lines = self.sample_lines_indexed(
+                input_file, self.sample_size, rng)
+        else:
+            sampled_lines = reservoir_sample_lines(
+                input_file, self.sample_size, rng)
+        if len(sampled_lines) < self.sample_size:
+            print(
+                f"Warning: Requested {self.sample_size} samples but only {len(sampled_lines)} available")
+        print(f"Sampled {len(sampled_lines)} records from {category} ({self.sampling})")
+
+        train_lines, validation_lines, test_lines = self.split_records(
+            sampled_lines,
+            self.train_size,
+            self.validation_size,
+            rng
+        )
+
+        print(
+            f"Split {category}: train={len(train_lines)}, validation={len(validation_lines)}, test={len(test_lines)}")
+
+        return train_lines, validation_lines, test_lines
+
     def split_all_datasets(self, output_dir: Path = Path(".")):
         """
         Split all category datasets into train/validation/test sets.
@@ -184,11 +631,20 @@ class DatasetSplitter:
         print("Dataset Splitting Process")
         print("=" * 40)
         print(f"Random seed: {self.random_seed}")
-        print(f"Sample size per category: {SAMPLE_SIZE_PER_CATEGORY}")
-        print(f"Train size per category: {TRAIN_SIZE_PER_CATEGORY}")
-        print(f"Validation size per category: {VALIDATION_SIZE_PER_CATEGORY}")
+        print(f"Sampling: {self.sampling}")
+        print(f"Assignment: {self.assignment}")
+        if self.assignment == "hash":
+            print(f"Hash sample rate: {self.hash_sample_rate}")
+        print(f"Sample size per category: {self.sample_size}")
+        print(f"Train size per category: {self.train_size}")
+        print(f"Validation size per category: {self.validation_size}")
         print(
-            f"Test size per category: {SAMPLE_SIZE_PER_CATEGORY - TRAIN_SIZE_PER_CATEGORY - VALIDATION_SIZE_PER_CATEGORY}")
+            f"Test size per category: {self.sample_size - self.train_size - self.validation_size}")
+        print(f"Categories: {', '.join(self.categories)}")
+
+        if self.workers > 1:
+            self.split_all_datasets_parallel(output_dir)
+            return
 
         # Initialize combined datasets
         all_train_records = []
@@ -196,7 +652,7 @@ class DatasetSplitter:
         all_test_records = []
 
         # Process each category
-        for category in CATEGORIES:
+        for category in self.categories:
             train_records, validation_records, test_records = self.process_category(
                 category)
 
@@ -211,19 +667,20 @@ class DatasetSplitter:
         random.shuffle(all_test_records)
 
         # Write output files
-        print(f"\nWriting combined datasets...")
-
-        train_file = output_dir / "train.jsonl"
-        validation_file = output_dir / "validation.jsonl"
-        test_file = output_dir / "test.jsonl"
+        print("\nWriting combined datasets...")
 
-        self.write_jsonl_file(all_train_records, train_file)
-        self.write_jsonl_file(all_validation_records, validation_file)
-        self.write_jsonl_file(all_test_records, test_file)
+        split_entries = {}
+        for split_name, records in zip(SPLIT_NAMES, (all_train_records, all_validation_records,
+                                                      all_test_records)):
+            split_entries[split_name] = self.write_split(
+                records, output_dir, split_name)
+        manifest_path = write_split_manifest(
+            output_dir, split_entries, self.manifest_config())
+        print(f"Split manifest saved to {manifest_path}")
 
         # Print summary
-        print(f"\nDataset Split Summary:")
-        print(f"=" * 30)
+        print("\nDataset Split Summary:")
+        print("=" * 30)
         print(f"Train set: {len(all_train_records)} records")
         print(f"Validation set: {len(all_validation_records)} records")
         print(f"Test set: {len(all_test_records)} records")
@@ -234,6 +691,128 @@ class DatasetSplitter:
         self.verify_category_distribution(
             all_train_records, all_validation_records, all_test_records)
 
+    def split_category_to_files(self, category: str, work_dir: Path) -> Dict[str, int]:
+        """
+        Split one category and write each split to its own temporary file.
+
+        Runs inside a worker process. The global random module is reseeded
+        from the seed and category, so results do not depend on which
+        worker handles the category or in which order.
+
+        Args:
+            category: Category name
+            work_dir: Directory for the per-category split files
+
+        Returns:
+            Number of records written per split name
+        """
+        random.seed(f"{self.random_seed}:{category}")
+        splits = self.process_category(category)
+
+        counts = {}
+        for split_name, records in zip(SPLIT_NAMES, splits):
+            path = work_dir / f"{split_name}.{category}.jsonl"
+            with open(path, 'w', encoding='utf-8') as f:
+                for record in records:
+                    if not isinstance(record, str):
+                        record = json.dumps(record, ensure_ascii=False)
+                    f.write(record + '\n')
+            counts[split_name] = len(records)
+        return counts
+
+    def interleave_files(self, sources: Dict[str, Path], counts: Dict[str, int],
+                         writer: ShardedJsonlWriter, rng: random.Random) -> int:
+        """
+        Merge per-category files into one by a random streaming interleave.
+
+        At each step the next line is taken from a category with
+        probability proportional to its remaining lines, which yields a
+        uniformly random interleaving while holding one line per category.
+
+        Args:
+            sources: Category -> per-category split file
+            counts: Category -> number of lines in its file
+            writer: Writer for the merged split
+            rng: Seeded random generator
+
+        Returns:
+            Number of lines written
+        """
+        categories = [category for category in sources if counts[category] > 0]
+        remaining = [counts[category] for category in categories]
+        handles = [open(sources[category], 'r', encoding='utf-8')
+                   for category in categories]
+        written = 0
+        try:
+            while any(remaining):
+                i = rng.choices(range(len(handles)), weights=remaining)[0]
+                writer.write_line(handles[i].readline().rstrip('\n'), categories[i])
+                remaining[i] -= 1
+                written += 1
+        finally:
+            for handle in handles:
+                handle.close()
+
+        return written
+
+    def split_all_datasets_parallel(self, output_dir: Path):
+        """
+        Split each category in its own process and merge the outputs by streaming.
+
+        Args:
+            output_dir: Output directory for split files
+        """
+        work_dir = Path(tempfile.mkdtemp(prefix=".split_", dir=output_dir))
+        try:
+            with ProcessPoolExecutor(max_workers=min(self.workers, len(self.categories))) as executor:
+                futures = {category: executor.submit(self.split_category_to_files, category, work_dir)
+                           for category in self.categories}
+                category_counts = {category: future.result()
+                                   for category, future in futures.items()}
+
+            for category, counts in category_counts.items():
+                print(f"Split {category}: " +
+                      ", ".join(f"{name}={counts[name]}" for name in SPLIT_NAMES))
+
+            print("\nWriting combined datasets...")
+            split_entries = {}
+            for split_name in SPLIT_NAMES:
+                sources = {category: work_dir / f"{split_name}.{category}.jsonl"
+                           for category in self.categories}
+                counts = {category: category_counts[category][split_name]
+                          for category in self.categories}
+                rng = random.Random(f"{self.random_seed}:merge:{split_name}")
+                writer = self.open_split_writer(output_dir, split_name)
+                self.interleave_files(sources, counts, writer, rng)
+                split_entries[split_name] = writer.close()
+                self.print_split_written(split_entries[split_name], output_dir)
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+        manifest_path = write_split_manifest(
+            output_dir, split_entries, self.manifest_config())
+        print(f"Split manifest saved to {manifest_path}")
+        totals = {name: entry["records"] for name, entry in split_entries.items()}
+
+        print("\nDataset Split Summary:")
+        print("=" * 30)
+        print(f"Train set: {totals['train']} records")
+        print(f"Validation set: {totals['validation']} records")
+        print(f"Test set: {totals['test']} records")
+        print(f"Total: {sum(totals.values())} records")
+
+        print("\nCategory Distribution Verification:")
+        print("=" * 40)
+        split_counts = []
+        for split_name, dataset_name in zip(SPLIT_NAMES, ("Train", "Validation", "Test")):
+            counts = {category: category_counts[category][split_name]
+                      for category in self.categories}
+            print(f"{dataset_name}:")
+            for category, count in counts.items():
+                print(f"  {category}: {count}")
+            split_counts.append(counts)
+        self.print_expected_distribution(*split_counts)
+
     def verify_category_distribution(self, train_records: List[Dict],
                                      validation_records: List[Dict],
                                      test_records: List[Dict]):
@@ -245,19 +824,19 @@ class DatasetSplitter:
             validation_records: Validation records
             test_records: Test records
         """
-        print(f"\nCategory Distribution Verification:")
-        print(f"=" * 40)
+        print("\nCategory Distribution Verification:")
+        print("=" * 40)
 
         def count_categories(records: List[Dict], dataset_name: str):
-            category_counts = {category: 0 for category in CATEGORIES}
+            category_counts = {category: 0 for category in self.categories}
 
             for record in records:
                 try:
                     # Extract category from assistant response
-                    assistant_content = record['messages'][1]['content'][0]['text']
+                    assistant_content = extract_label(record)
                     if assistant_content in category_counts:
                         category_counts[assistant_content] += 1
-                except (KeyError, IndexError):
+                except (KeyError, IndexError, ValueError):
                     print(
                         f"Warning: Could not extract category from record in {dataset_name}")
 
@@ -271,19 +850,40 @@ class DatasetSplitter:
         val_counts = count_categories(validation_records, "Validation")
         test_counts = count_categories(test_records, "Test")
 
-        # Check if distribution is as expected
-        expected_train = TRAIN_SIZE_PER_CATEGORY
-        expected_val = VALIDATION_SIZE_PER_CATEGORY
-        expected_test = SAMPLE_SIZE_PER_CATEGORY - \
-            TRAIN_SIZE_PER_CATEGORY - VALIDATION_SIZE_PER_CATEGORY
+        self.print_expected_distribution(train_counts, val_counts, test_counts)
+
+    def print_expected_distribution(self, train_counts: Dict[str, int],
+                                    val_counts: Dict[str, int],
+                                    test_counts: Dict[str, int]):
+        """
+        Print expected versus actual per-category split sizes.
 
-        print(f"\nExpected vs Actual:")
+        Args:
+            train_counts: Category -> training records
+            val_counts: Category -> validation records
+            test_counts: Category -> test records
+        """
+        # Check if distribution is as expected
+        expected_train = self.train_size
+        expected_val = self.validation_size
+        expected_test = self.sample_size - \
+            self.train_size - self.validation_size
+
+        unit = "per category"
+        if self.assignment == "hash":
+            # Hash assignment keeps ratios, not absolute sizes
+            expected_train, expected_val, expected_test = (
+                f"{size / self.sample_size * self.hash_sample_rate:.1%}"
+                for size in (expected_train, expected_val, expected_test))
+            unit = "of each category"
+
+        print("\nExpected vs Actual:")
         print(
-            f"Train - Expected: {expected_train} per category, Actual: {list(train_counts.values())}")
+            f"Train - Expected: {expected_train} {unit}, Actual: {list(train_counts.values())}")
         print(
-            f"Validation - Expected: {expected_val} per category, Actual: {list(val_counts.values())}")
+            f"Validation - Expected: {expected_val} {unit}, Actual: {list(val_counts.values())}")
         print(
-            f"Test - Expected: {expected_test} per category, Actual: {list(test_counts.values())}")
+            f"Test - Expected: {expected_test} {unit}, Actual: {list(test_counts.values())}")
 
 
 def main():
@@ -294,11 +894,85 @@ def main():
                         help=f"Random seed for reproducible results (default: {RANDOM_SEED})")
     parser.add_argument("--output-dir", type=str, default=".",
                         help="Output directory for split files (default: current directory)")
+    parser.add_argument("--sampling", choices=SAMPLING_MODES, default="memory",
+                        help="memory: load each category file; reservoir: single streaming pass; "
+                             "index: seek to sampled lines via a cached <file>.idx offset index "
+                             "(default: memory)")
+    parser.add_argument("--input-dir", type=str, default=".",
+                        help="Directory holding the <category>.jsonl files (default: current directory)")
+    parser.add_argument("--categories", type=str, default=",".join(CATEGORIES),
+                        help=f"Comma-separated category names (default: {','.join(CATEGORIES)})")
+    parser.add_argument("--sample-size", type=int, default=SAMPLE_SIZE_PER_CATEGORY,
+                        help=f"Records sampled per category (default: {SAMPLE_SIZE_PER_CATEGORY})")
+    parser.add_argument("--train-size", type=int, default=TRAIN_SIZE_PER_CATEGORY,
+                        help=f"Training records per category (default: {TRAIN_SIZE_PER_CATEGORY})")
+    parser.add_argument("--validation-size", type=int, default=VALIDATION_SIZE_PER_CATEGORY,
+                        help=f"Validation records per category (default: {VALIDATION_SIZE_PER_CATEGORY})")
+    parser.add_argument("--ratios", type=str, default=None,
+                        help="Train,validation,test ratios of the sample size, summing to 1, e.g. "
+                             "0.7,0.05,0.25; overrides --train-size and --validation-size")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Worker processes; above 1 each category is split in its own process "
+                             "(default: 1)")
+    parser.add_argument("--shard-records", type=int, default=None,
+                        help="Write each split as numbered shards of at most this many records")
+    parser.add_argument("--shard-bytes", type=parse_size, default=None,
+                        help="Write each split as numbered shards of at most this many uncompressed "
+                             "bytes (accepts K/M/G suffixes)")
+    parser.add_argument("--compression", choices=list(COMPRESSIONS), default="none",
+                        help="Compress output shards (default: none)")
+    parser.add_argument("--assignment", choices=ASSIGNMENT_MODES, default="shuffle",
+                        help="shuffle: seeded random sample and split; hash: assign every record by a keyed "
+                             "hash of its image URI, stable as the dataset grows (default: shuffle)")
+    parser.add_argument("--hash-sample-rate", type=float, default=1.0,
+                        help="Fraction of records kept with --assignment hash (default: 1.0)")
+    parser.add_argument("--dedup-index", type=str, default=None,
+                        help="Dedup index built by dedup_index.py; keeps duplicate images within one split")
 
     args = parser.parse_args()
 
+    categories = [category.strip() for category in args.categories.split(",") if category.strip()]
+    train_size = args.train_size
+    validation_size = args.validation_size
+    if args.ratios:
+        try:
+            ratios = [float(ratio) for ratio in args.ratios.split(",")]
+        except ValueError:
+            parser.error(f"--ratios must be three comma-separated numbers, got {args.ratios!r}")
+        if len(ratios) != 3:
+            parser.error(f"--ratios needs three values (train,validation,test), got {len(ratios)}")
+        if min(ratios) < 0:
+            parser.error(f"--ratios must not be negative, got {args.ratios}")
+        if not math.isclose(sum(ratios), 1.0, abs_tol=1e-6):
+            parser.error(f"--ratios must sum to 1, got {sum(ratios):g}")
+        # Round cumulative boundaries so train plus validation never exceeds
+        # the sample; test gets the remainder
+        train_size = round(args.sample_size * ratios[0])
+        validation_size = min(round(args.sample_size * (ratios[0] + ratios[1])),
+                              args.sample_size) - train_size
+    if train_size < 0 or validation_size < 0 or train_size + validation_size > args.sample_size:
+        parser.error(f"train ({train_size}) plus validation ({validation_size}) records must fit "
+                     f"in --sample-size ({args.sample_size})")
+
+    dedup_index = None
+    if args.dedup_index:
+        dedup_index = DedupIndex.load(Path(args.dedup_index))
+        print(f"Loaded dedup index with {len(dedup_index)} images")
+
     # Initialize splitter
-    splitter = DatasetSplitter(random_seed=args.seed)
+    splitter = DatasetSplitter(random_seed=args.seed, dedup_index=dedup_index,
+                               sampling=args.sampling,
+                               assignment=args.assignment,
+                               hash_sample_rate=args.hash_sample_rate,
+                               categories=categories,
+                               sample_size=args.sample_size,
+                               train_size=train_size,
+                               validation_size=validation_size,
+                               input_dir=Path(args.input_dir),
+                               workers=args.workers,
+                               shard_records=args.shard_records,
+                               shard_bytes=args.shard_bytes,
+                               compression=args.compression)
 
     # Create output directory if it doesn't exist
     output_dir = Path(args.output_dir)
@@ -2,268 +2,290 @@
 """
 Test script for evaluating Amazon Nova Pro model accuracy on image classification.
 This script reads test data, queries the Nova Pro model, and calculates accuracy.
+The evaluation logic lives in nova_eval.py.
+
+Requests run concurrently under an adaptive (AIMD) concurrency limit that
+backs off on throttling; use --stub to run against a local converse stand-in.
+Each result is appended to the result file as it completes, so an interrupted
+run can continue with --resume, which skips images already evaluated.
+Large test sets can instead run as one Bedrock batch inference job (--batch).
+Responses are cached on disk (see response_cache.py), so re-running over the
+same test set only pays for requests that changed. Metrics are accumulated
+incrementally (see eval_metrics.py): per-class precision, recall and F1 are
+printed live, and bootstrap confidence intervals are reported at the end.
+With --models, several models are evaluated in a single pass over the test
+set, each with its own concurrency limiter, and compared side by side.
+With --inline-images, images are prefetched into a local disk cache (see
+image_cache.py), optionally downscaled, and sent as inline bytes instead of
+s3Location references. --prompt-cache marks the constant system prompt
+(and, in "prompt" mode, the user prompt) with Bedrock cache points so those
+tokens are read from the prompt cache instead of being reprocessed.
 """
 
+import argparse
 import boto3
 import json
 import time
-import re
-from typing import Dict, List, Tuple
 from pathlib import Path
 
+from batch_inference import BATCH_POLL_SECONDS, BedrockBatchBackend, LocalBatchBackend
+from converse_stub import StubConverseClient
+from eval_concurrency import INITIAL_CONCURRENCY, MAX_CONCURRENCY, AdaptiveConcurrencyLimiter
+from eval_metrics import (BOOTSTRAP_SAMPLES, CONFIDENCE_LEVEL, model_prices,
+                          print_usage_report, usage_summary)
+from image_cache import IMAGE_CACHE_DIR, IMAGE_CACHE_MAX_BYTES, ImageCache, s3_fetcher
+from nova_eval import (EARLY_STOP_BATCH, PRO_MODEL_ID, PROMPT_CACHE_MIN_TOKENS, PROMPT_CACHE_MODES,
+                       REGION_NAME, NovaProTester, bedrock_runtime_client, model_result_file)
+from response_cache import (CACHE_MAX_BYTES, CACHE_TTL_SECONDS, RESPONSE_CACHE_FILE,
+                            CachingConverseClient, ResponseCache)
+
 # Configuration
-PRO_MODEL_ID = "us.amazon.nova-pro-v1:0"
-REGION_NAME = "us-east-1"
 TEST_FILE = "train_dataset_full/test_micro.jsonl"
 RESULT_FILE = "train_dataset_full/nova_pro_test_result_ft.jsonl"
-BUCKET_OWNER = "xxxx"
-
-
-class NovaProTester:
-    def __init__(self):
-        """Initialize the Bedrock client."""
-        self.client = boto3.client("bedrock-runtime", region_name=REGION_NAME)
-        self.results = []
-
-    def load_test_data(self, file_path: str) -> List[Dict]:
-        """Load test data from JSONL file."""
-        test_data = []
-        with open(file_path, 'r', encoding='utf-8') as f:
-            for line in f:
-                if line.strip():
-                    test_data.append(json.loads(line.strip()))
-        print(f"Loaded {len(test_data)} test samples")
-        return test_data
-
-    def extract_image_info(self, test_item: Dict) -> Tuple[str, str, str]:
-        """Extract image URI, expected label, and user prompt from test item."""
-        # Get expected label from assistant response
-        expected_label = test_item["messages"][1]["content"][0]["text"].strip(
-        ).lower()
-
-        # Get image URI from user message
-        user_content = test_item["messages"][0]["content"]
-        image_uri = None
-        user_prompt = None
-        image_format = "jpeg"
-
-        for content in user_content:
-            if "image" in content:
-                image_uri = content["image"]["source"]["s3Location"]["uri"]
-                image_format = content["image"]["format"]
-            elif "text" in content:
-                user_prompt = content["text"]
-
-        return image_format, image_uri, expected_label, user_prompt
-
-    def query_nova_pro(self, image_format: str, image_uri: str, user_prompt: str, system_prompt: str) -> str:
-        """Query Nova Pro model with image and prompt."""
-        # Extract bucket owner from the original test data format
-        bucket_owner = BUCKET_OWNER  # From the test data
-
-        messages = [{
-            "role": "user",
-            "content": [
-                {
-                    "image": {
-                        "format": image_format,
-                        "source": {
-                            "s3Location": {
-                                "uri": image_uri,
-                                "bucketOwner": bucket_owner
-                            }
-                        }
-                    }
-                },
-                {"text": user_prompt}
-            ]
-        }]
-
-        inf_params = {
-            "maxTokens": 50,
-            "topP": 0.1,
-            "temperature": 0.1
-        }
-
-        try:
-            response = self.client.converse(
-                modelId=PRO_MODEL_ID,
-                messages=messages,
-                system=[{"text": system_prompt}],
-                inferenceConfig=inf_params
-            )
-
-            response_text = response["output"]["message"]["content"][0]["text"].strip(
-            ).lower()
-            return response_text
-
-        except Exception as e:
-            print(f"Error querying model: {e}")
-            return "error"
-
-    def normalize_prediction(self, prediction: str) -> str:
-        """Normalize model prediction to standard categories."""
-        prediction = prediction.lower().strip()
-
-        # Direct matches
-        if prediction in ["porn", "sexy", "neutral"]:
-            return prediction
-
-        # Pattern matching for common variations
-        if re.search(r'\bporn\b|\bpornographic\b', prediction):
-            return "porn"
-        elif re.search(r'\bsexy\b|\bsexual\b', prediction):
-            return "sexy"
-        elif re.search(r'\bneutral\b|\bnon-sexual\b|\bnot sexual\b', prediction):
-            return "neutral"
-
-        # If no clear match, return the original prediction
-        return prediction
-
-    def run_test(self, test_data: List[Dict]) -> List[Dict]:
-        """Run the test on all samples."""
-        results = []
-        total_samples = len(test_data)
-
-        for i, test_item in enumerate(test_data):
-            print(f"Processing sample {i+1}/{total_samples}...")
-
-            # Extract information
-            image_format, image_uri, expected_label, user_prompt = self.extract_image_info(
-                test_item)
-            system_prompt = test_item["system"][0]["text"]
-
-            # Query model
-            raw_prediction = self.query_nova_pro(
-                image_format, image_uri, user_prompt, system_prompt)
-            normalized_prediction = self.normalize_prediction(raw_prediction)
-
-            # Store result
-            result = {
-                "image_uri": image_uri,
-                "user_prompt": user_prompt,
-                "expected_label": expected_label,
-                "raw_prediction": raw_prediction,
-                "normalized_prediction": normalized_prediction,
-                "correct": normalized_prediction == expected_label
-            }
-
-            results.append(result)
-
-            # Add small delay to avoid rate limiting
-            time.sleep(0.4)
-
-            # Print progress every 10 samples
-            if (i + 1) % 10 == 0:
-                correct_so_far = sum(1 for r in results if r["correct"])
-                accuracy_so_far = correct_so_far / len(results) * 100
-                print(
-                    f"Progress: {i+1}/{total_samples}, Accuracy so far: {accuracy_so_far:.2f}%")
-
-        return results
-
-    def save_results(self, results: List[Dict], file_path: str):
-        """Save results to JSONL file."""
-        with open(file_path, 'w', encoding='utf-8') as f:
-            for result in results:
-                f.write(json.dumps(result, ensure_ascii=False) + '\n')
-        print(f"Results saved to {file_path}")
-
-    def calculate_accuracy(self, results: List[Dict]) -> Dict:
-        """Calculate overall and per-category accuracy."""
-        total_samples = len(results)
-        correct_predictions = sum(1 for r in results if r["correct"])
-        overall_accuracy = correct_predictions / total_samples * 100
-
-        # Per-category accuracy
-        categories = ["porn", "sexy", "neutral"]
-        category_stats = {}
-
-        for category in categories:
-            category_results = [
-                r for r in results if r["expected_label"] == category]
-            if category_results:
-                category_correct = sum(
-                    1 for r in category_results if r["correct"])
-                category_accuracy = category_correct / \
-                    len(category_results) * 100
-                category_stats[category] = {
-                    "total": len(category_results),
-                    "correct": category_correct,
-                    "accuracy": category_accuracy
-                }
-
-        # Confusion matrix
-        confusion_matrix = {}
-        for expected in categories:
-            confusion_matrix[expected] = {}
-            for predicted in categories:
-                count = sum(1 for r in results
-                            if r["expected_label"] == expected and r["normalized_prediction"] == predicted)
-                confusion_matrix[expected][predicted] = count
-
-        return {
-            "overall_accuracy": overall_accuracy,
-            "total_samples": total_samples,
-            "correct_predictions": correct_predictions,
-            "category_stats": category_stats,
-            "confusion_matrix": confusion_matrix
-        }
-
-    def print_results(self, accuracy_stats: Dict):
-        """Print formatted results."""
-        print("\n" + "="*60)
-        print("NOVA PRO MODEL ACCURACY RESULTS")
-        print("="*60)
-
-        print(f"\nOverall Accuracy: {accuracy_stats['overall_accuracy']:.2f}%")
-        print(
-            f"Correct Predictions: {accuracy_stats['correct_predictions']}/{accuracy_stats['total_samples']}")
-
-        print("\nPer-Category Results:")
-        print("-" * 40)
-        for category, stats in accuracy_stats['category_stats'].items():
-            print(
-                f"{category.upper():>8}: {stats['accuracy']:>6.2f}% ({stats['correct']:>3}/{stats['total']:>3})")
-
-        print("\nConfusion Matrix:")
-        print("-" * 40)
-        categories = ["porn", "sexy", "neutral"]
-        print(f"{'Actual':>8} | {'Predicted':>20}")
-        print(f"{'':>8} | {'porn':>6} {'sexy':>6} {'neutral':>8}")
-        print("-" * 40)
-
-        for actual in categories:
-            row = f"{actual:>8} |"
-            for predicted in categories:
-                count = accuracy_stats['confusion_matrix'][actual][predicted]
-                row += f"{count:>6}"
-            print(row)
 
 
 def main():
     """Main function to run the test."""
+    parser = argparse.ArgumentParser(
+        description="Evaluate Nova Pro classification accuracy on a test split")
+    parser.add_argument("--test-file", default=TEST_FILE,
+                        help=f"Test JSONL file (default: {TEST_FILE})")
+    parser.add_argument("--result-file", default=RESULT_FILE,
+                        help=f"Result JSONL file (default: {RESULT_FILE})")
+    parser.add_argument("--concurrency", type=int, default=MAX_CONCURRENCY,
+                        help=f"Max concurrent requests (default: {MAX_CONCURRENCY})")
+    parser.add_argument("--initial-concurrency", type=int, default=INITIAL_CONCURRENCY,
+                        help=f"Starting concurrency before AIMD adjusts it (default: {INITIAL_CONCURRENCY})")
+    parser.add_argument("--target-rps", type=float, default=None,
+                        help="Max requests per second (default: unpaced)")
+    parser.add_argument("--latency-target-ms", type=float, default=None,
+                        help="Reduce concurrency when request latency exceeds this")
+    parser.add_argument("--resume", action="store_true",
+                        help="Continue an interrupted run, skipping images already in the result file")
+    parser.add_argument("--cache-file", default=RESPONSE_CACHE_FILE,
+                        help=f"Response cache database (default: {RESPONSE_CACHE_FILE})")
+    parser.add_argument("--cache-ttl-hours", type=float, default=CACHE_TTL_SECONDS / 3600,
+                        help="Ignore and evict cached responses older than this (default: %(default)s)")
+    parser.add_argument("--cache-max-mb", type=float, default=CACHE_MAX_BYTES / 2 ** 20,
+                        help="Evict least recently used responses above this size (default: %(default)s)")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Bypass the response cache entirely")
+    parser.add_argument("--refresh-cache", action="store_true",
+                        help="Query the model for every sample and overwrite cached responses")
+    parser.add_argument("--batch", action="store_true",
+                        help="Evaluate with a batch inference job instead of converse calls")
+    parser.add_argument("--batch-input-uri", default=None,
+                        help="S3 URI for the batch input JSONL, e.g. s3://bucket/eval/input.jsonl")
+    parser.add_argument("--batch-output-uri", default=None,
+                        help="S3 prefix for the batch output, e.g. s3://bucket/eval/output/")
+    parser.add_argument("--batch-role-arn", default=None,
+                        help="Service role Bedrock assumes for the batch job")
+    parser.add_argument("--batch-poll-seconds", type=float, default=BATCH_POLL_SECONDS,
+                        help=f"Seconds between batch job status polls (default: {BATCH_POLL_SECONDS})")
+    parser.add_argument("--stub", action="store_true",
+                        help="Use a local converse stand-in instead of Bedrock")
+    parser.add_argument("--bootstrap-samples", type=int, default=BOOTSTRAP_SAMPLES,
+                        help=f"Bootstrap resamples for confidence intervals, 0 to skip "
+                             f"(default: {BOOTSTRAP_SAMPLES})")
+    parser.add_argument("--confidence", type=float, default=CONFIDENCE_LEVEL,
+                        help=f"Confidence level of the intervals (default: {CONFIDENCE_LEVEL})")
+    parser.add_argument("--inline-images", action="store_true",
+                        help="Prefetch images into a local cache and send them as inline bytes")
+    parser.add_argument("--max-image-edge", type=int, default=None,
+                        help="With --inline-images, downscale images to this longest edge in pixels")
+    parser.add_argument("--image-cache-dir", default=IMAGE_CACHE_DIR,
+                        help=f"Inline image cache directory (default: {IMAGE_CACHE_DIR})")
+    parser.add_argument("--image-cache-max-mb", type=float, default=IMAGE_CACHE_MAX_BYTES / 2 ** 20,
+                        help="Evict least recently used cached images above this size (default: %(default)s)")
+    parser.add_argument("--prompt-cache", choices=PROMPT_CACHE_MODES, default="off",
+                        help="Add prompt cache points after the system prompt (system) or after "
+                             "the system and user prompts, sending the user prompt before the "
+                             "image (prompt); check accuracy against off (default: off). Only "
+                             "prefixes of at least --prompt-cache-min-tokens get a cache point; "
+                             "the generated dataset's prompts are far shorter (about 60 tokens), "
+                             "so runs where no prefix reaches the minimum are rejected")
+    parser.add_argument("--prompt-cache-min-tokens", type=int, default=PROMPT_CACHE_MIN_TOKENS,
+                        help="Leave out cache points whose prefix is estimated below this many "
+                             "tokens, the model's checkpoint minimum (default: %(default)s)")
+    parser.add_argument("--input-price-per-1k", type=float, default=None,
+                        help="USD per 1,000 input tokens for the cost estimate "
+                             "(default: on-demand price of the model)")
+    parser.add_argument("--output-price-per-1k", type=float, default=None,
+                        help="USD per 1,000 output tokens for the cost estimate "
+                             "(default: on-demand price of the model)")
+    parser.add_argument("--target-ci-width", type=float, default=None,
+                        help="Stop sampling once the confidence interval on accuracy (or on the "
+                             "accuracy difference between models) is narrower than this many "
+                             "percentage points; samples are drawn stratified by category")
+    parser.add_argument("--early-stop-batch", type=int, default=EARLY_STOP_BATCH,
+                        help=f"Samples between interval checks (default: {EARLY_STOP_BATCH})")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="Sampling seed for --target-ci-width (default: 0)")
+    parser.add_argument("--models", nargs="+", default=None, metavar="MODEL_ID",
+                        help="Compare several model IDs or ARNs in one pass "
+                             "(results go to one file per model)")
+    args = parser.parse_args()
+    if args.models and (args.batch or args.resume):
+        parser.error("--models cannot be combined with --batch or --resume")
+    if args.target_ci_width is not None and (args.batch or args.resume):
+        parser.error("--target-ci-width cannot be combined with --batch or --resume")
+    if args.inline_images and args.batch:
+        parser.error("--inline-images cannot be combined with --batch")
+    if args.prompt_cache != "off" and args.batch:
+        parser.error("--prompt-cache cannot be combined with --batch")
+    if args.batch and not args.stub and not (
+            args.batch_input_uri and args.batch_output_uri and args.batch_role_arn):
+        parser.error("--batch needs --batch-input-uri, --batch-output-uri and --batch-role-arn")
+
     print("Starting Nova Pro Model Accuracy Test...")
 
     # Initialize tester
-    tester = NovaProTester()
+    if args.stub:
+        # The stub enforces the same prompt cache checkpoint minimum as the service
+        client = StubConverseClient(cache_min_tokens=args.prompt_cache_min_tokens)
+    else:
+        # Every model's limiter may fill the shared client's connection pool
+        client = bedrock_runtime_client(args.concurrency * len(args.models or [PRO_MODEL_ID]))
+    cache = ResponseCache(Path(args.cache_file), ttl_seconds=args.cache_ttl_hours * 3600,
+                          max_bytes=int(args.cache_max_mb * 2 ** 20),
+                          mode="bypass" if args.no_cache else "refresh" if args.refresh_cache else "use")
+    stub_clients = []
+    if args.stub:
+        stub_clients = [client]
+        if args.models:
+            stub_clients = [StubConverseClient(cache_min_tokens=args.prompt_cache_min_tokens)
+                            for _ in args.models]
+
+    image_cache = None
+    if args.inline_images:
+        image_cache = ImageCache(
+            client.fetch_image if args.stub else s3_fetcher(boto3.client("s3", region_name=REGION_NAME)),
+            Path(args.image_cache_dir), max_bytes=int(args.image_cache_max_mb * 2 ** 20),
+            max_edge=args.max_image_edge)
+    tester = NovaProTester(client=CachingConverseClient(client, cache), image_cache=image_cache,
+                           prompt_cache=args.prompt_cache,
+                           prompt_cache_min_tokens=args.prompt_cache_min_tokens)
+
+    def make_limiter():
+        return AdaptiveConcurrencyLimiter(initial=args.initial_concurrency,
+                                          max_limit=args.concurrency,
+                                          target_rps=args.target_rps,
+                                          latency_target_ms=args.latency_target_ms)
+
+    def prices(model_id):
+        default = model_prices(model_id) or (None, None)
+        input_price = default[0] if args.input_price_per_1k is None else args.input_price_per_1k
+        output_price = default[1] if args.output_price_per_1k is None else args.output_price_per_1k
+        return None if input_price is None or output_price is None else (input_price, output_price)
 
     # Load test data
-    test_data = tester.load_test_data(TEST_FILE)
+    test_data = tester.load_test_data(args.test_file)
+    if args.prompt_cache != "off":
+        longest = tester.longest_cache_prefix(test_data)
+        if longest < args.prompt_cache_min_tokens:
+            parser.error(f"--prompt-cache {args.prompt_cache} has no effect: the longest prefix "
+                         f"is about {longest} tokens, below the {args.prompt_cache_min_tokens}-token "
+                         f"minimum (--prompt-cache-min-tokens)")
+
+    if image_cache is not None:
+        uris = [tester.extract_image_info(item)[1] for item in test_data]
+        print(f"Prefetching {len(set(uris))} images...")
+        start_time = time.perf_counter()
+        errors = image_cache.prefetch(uris)
+        for uri, error in list(errors.items())[:10]:
+            print(f"Error fetching {uri}: {error}")
+        print(f"Prefetched {image_cache.fetched} image(s) in {time.perf_counter() - start_time:.1f}s "
+              f"({len(errors)} failed, {len(uris) - len(errors) - image_cache.fetched} cached); "
+              f"{image_cache.fetched_bytes / 2 ** 20:.1f} MiB fetched, "
+              f"{image_cache.stored_bytes / 2 ** 20:.1f} MiB stored")
+        # The stub reads labels from URIs, so tell it which URI inline bytes belong to
+        if stub_clients:
+            for uri in uris:
+                if uri not in errors:
+                    data, _ = image_cache.get(uri)
+                    for stub in stub_clients:
+                        stub.register_image(data, uri)
 
     # Run test
     print("Running inference on test samples...")
-    results = tester.run_test(test_data)
+    start_time = time.perf_counter()
+    model_ids = args.models or [PRO_MODEL_ID]
+    # Each model has its own quota, so each gets its own limiter (and stub)
+    limiters = {model_id: make_limiter() for model_id in model_ids}
+    clients = None
+    if args.stub:
+        clients = {model_id: CachingConverseClient(stub, cache)
+                   for model_id, stub in zip(model_ids, stub_clients)}
+    try:
+        if args.target_ci_width is not None:
+            runs = tester.run_until_confident(test_data, model_ids, limiters,
+                                              args.target_ci_width / 100, clients,
+                                              confidence=args.confidence,
+                                              batch_size=args.early_stop_batch, seed=args.seed)
+            results = runs[model_ids[0]]["results"]
+        elif args.models:
+            runs = tester.run_models(test_data, args.models, limiters, clients, args.result_file)
+        elif args.batch:
+            if args.stub:
+                backend = LocalBatchBackend(client, Path("batch_local"))
+                input_uri = args.batch_input_uri or "s3://stub-bucket/eval/input.jsonl"
+                output_uri = args.batch_output_uri or "s3://stub-bucket/eval/output/"
+                poll_seconds = min(args.batch_poll_seconds, 1.0)
+            else:
+                backend = BedrockBatchBackend(boto3.client("bedrock", region_name=REGION_NAME),
+                                              boto3.client("s3", region_name=REGION_NAME),
+                                              args.batch_role_arn)
+                input_uri, output_uri = args.batch_input_uri, args.batch_output_uri
+                poll_seconds = args.batch_poll_seconds
+            results = tester.run_batch(test_data, backend, input_uri, output_uri, poll_seconds)
+        else:
+            results = tester.run_test(test_data, limiters[PRO_MODEL_ID], args.result_file, args.resume)
+    finally:
+        cache.close()
+        if image_cache is not None:
+            image_cache.save()
+    elapsed = time.perf_counter() - start_time
+    if cache.mode != "bypass":
+        print(f"Response cache: {cache.hits} hit(s), {cache.misses} miss(es)")
+
+    def early_stop_stats(run):
+        return {"target_ci_width": args.target_ci_width, "stopped_early": run["stopped_early"],
+                "samples": run["samples"], "test_samples": len(test_data),
+                "interval": run["interval"]}
 
-    # Save results
-    tester.save_results(results, RESULT_FILE)
+    stats_file = "train_dataset/accuracy_stats.json"
+    if args.models:
+        accuracy_stats = {}
+        for model_id, run in runs.items():
+            accuracy_stats[model_id] = run["metrics"].summary(args.bootstrap_samples, args.confidence)
+            accuracy_stats[model_id]["usage"] = usage_summary(run["results"], run["elapsed"],
+                                                              prices(model_id))
+            if args.target_ci_width is not None:
+                accuracy_stats[model_id]["early_stop"] = early_stop_stats(run)
+                tester.save_results(run["results"], model_result_file(args.result_file, model_id))
+            else:
+                print(f"Results for {model_id} saved to {model_result_file(args.result_file, model_id)}")
+        tester.print_comparison(runs, accuracy_stats, args.confidence)
+        with open(stats_file, 'w', encoding='utf-8') as f:
+            json.dump(accuracy_stats, f, indent=2, ensure_ascii=False)
+        print(f"\nDetailed accuracy statistics saved to {stats_file}")
+        return
+
+    # Rewrite the streamed results in test order, one line per image
+    tester.save_results(results, args.result_file)
 
     # Calculate and print accuracy
-    accuracy_stats = tester.calculate_accuracy(results)
+    accuracy_stats = tester.calculate_accuracy(results, args.bootstrap_samples, args.confidence)
     tester.print_results(accuracy_stats)
 
+    # Latency, throughput and cost; batch jobs only report tokens
+    accuracy_stats["usage"] = usage_summary(results, None if args.batch else elapsed,
+                                            prices(PRO_MODEL_ID))
+    print_usage_report(accuracy_stats["usage"])
+    if args.target_ci_width is not None:
+        accuracy_stats["early_stop"] = early_stop_stats(runs[PRO_MODEL_ID])
+
     # Save accuracy stats
-    stats_file = "train_dataset/accuracy_stats.json"
     with open(stats_file, 'w', encoding='utf-8') as f:
         json.dump(accuracy_stats, f, indent=2, ensure_ascii=False)
     print(f"\nDetailed accuracy statistics saved to {stats_file}")
@@ -0,0 +1,52 @@
+"""Tests for batch_inference.py."""
+
+import json
+
+import pytest
+
+from batch_inference import (BatchBackend, converse_to_model_input, model_input_to_converse,
+                             write_batch_input)
+
+
+def converse_request(uri="s3://bucket/nova-finetune/porn/porn_00001.jpg"):
+    return {
+        "modelId": "us.amazon.nova-pro-v1:0",
+        "messages": [{"role": "user", "content": [
+            {"image": {"format": "jpeg", "source": {"s3Location": {"uri": uri, "bucketOwner": "0"}}}},
+            {"text": "Classify this image."}]}],
+        "system": [{"text": "You are a classifier."}],
+        "inferenceConfig": {"maxTokens": 50, "topP": 0.1, "temperature": 0.1}
+    }
+
+
+def test_write_batch_input_record_shape(tmp_path):
+    request = converse_request()
+    samples = [(request, "s3://bucket/a.jpg", "porn", "Classify this image."),
+               (converse_request("s3://bucket/b.jpg"), "s3://bucket/b.jpg", "sexy", "Classify this image.")]
+    input_path = tmp_path / "input.jsonl"
+
+    records = write_batch_input(samples, input_path)
+
+    lines = [json.loads(line) for line in input_path.read_text(encoding="utf-8").splitlines()]
+    assert [line["recordId"] for line in lines] == list(records) == ["00000000000", "00000000001"]
+    assert records["00000000001"] == ("s3://bucket/b.jpg", "sexy", "Classify this image.")
+    assert lines[0]["modelInput"] == {
+        "schemaVersion": "messages-v1",
+        "system": request["system"],
+        "messages": request["messages"],
+        "inferenceConfig": {"max_new_tokens": 50, "top_p": 0.1, "temperature": 0.1}
+    }
+
+
+def test_model_input_round_trips_to_converse():
+    request = converse_request()
+    assert model_input_to_converse(request["modelId"], converse_to_model_input(request)) == request
+
+
+def test_partial_backend_fails_at_construction():
+    class UploadOnly(BatchBackend):
+        def upload_input(self, local_path, input_uri):
+            pass
+
+    with pytest.raises(TypeError):
+        UploadOnly()
@@ -0,0 +1,47 @@
+"""Tests for conversation_schema.py."""
+
+import json
+
+import pytest
+
+from conversation_schema import FAST_PATH_PATTERN, compile_line_validator
+
+SYSTEM = "You are a content moderation classifier."
+PROMPT = "Classify this image into one of the categories: porn, sexy, neutral."
+
+
+def sample_line(system=SYSTEM, prompt=PROMPT, label="neutral"):
+    """Serialize a record in the canonical layout written by generate_dataset.py."""
+    return json.dumps({
+        "schemaVersion": "bedrock-conversation-2024",
+        "system": [{"text": system}],
+        "messages": [
+            {"role": "user", "content": [
+                {"image": {"format": "jpeg", "source": {"s3Location": {
+                    "uri": "s3://bucket/nova-finetune/neutral/neutral_00001.jpg",
+                    "bucketOwner": "123456789012"}}}},
+                {"text": prompt}]},
+            {"role": "assistant", "content": [{"text": label}]}]
+    })
+
+
+@pytest.mark.parametrize("line", [
+    sample_line(),
+    sample_line(system=""),
+    sample_line(system="   "),
+    sample_line(prompt=""),
+    sample_line(prompt=" \t "),
+    sample_line(prompt="\n"),
+    sample_line(prompt="\u00a0"),
+    sample_line(prompt="été \"quoted\""),
+    sample_line(label="unknown"),
+])
+def test_fast_path_agrees_with_full_validation(line):
+    assert FAST_PATH_PATTERN.fullmatch(line)
+    assert compile_line_validator()(line) == compile_line_validator(fast_path=False)(line)
+
+
+def test_blank_text_is_rejected_on_the_fast_path():
+    assert compile_line_validator()(sample_line()) is None
+    assert "non-empty" in compile_line_validator()(sample_line(system=""))
+    assert "non-empty" in compile_line_validator()(sample_line(prompt="  "))
@@ -0,0 +1,70 @@
+"""Tests for dedup_index.py."""
+
+import dedup_index
+from dedup_index import DedupIndex, hamming_distance
+
+CATEGORIES = ["neutral", "porn", "sexy"]
+
+
+def build_index():
+    index = DedupIndex(CATEGORIES)
+    index.add("s3://b/neutral/a.jpg", "ea", "neutral", content_hash=1, perceptual_hash=0xFFFF0000FFFF0000)
+    index.add("s3://b/neutral/b.jpg", "eb", "neutral", content_hash=2, perceptual_hash=0x0123456789ABCDEF)
+    index.add("s3://b/sexy/a_copy.jpg", "ec", "sexy", content_hash=1, perceptual_hash=0x1111111111111111)
+    # Two bits away from b: a near duplicate
+    index.add("s3://b/neutral/b_resized.jpg", "ed", "neutral", content_hash=3,
+              perceptual_hash=0x0123456789ABCDEF ^ 0b101)
+    index.add("s3://b/porn/c.jpg", "ee", "porn", content_hash=4, perceptual_hash=0xFEDCBA9876543210)
+    index.build_clusters(threshold=3)
+    return index
+
+
+def test_hamming_distance():
+    assert hamming_distance(0, 0) == 0
+    assert hamming_distance(0b1011, 0b0001) == 2
+    assert hamming_distance(0, 2 ** 64 - 1) == 64
+
+
+def test_exact_and_near_duplicates_share_clusters():
+    index = build_index()
+    assert index.cluster_of("s3://b/neutral/a.jpg") == index.cluster_of("s3://b/sexy/a_copy.jpg") == 0
+    assert index.cluster_of("s3://b/neutral/b.jpg") == index.cluster_of("s3://b/neutral/b_resized.jpg") == 1
+    assert index.cluster_of("s3://b/porn/c.jpg") == 4
+    assert index.duplicate_clusters() == {0: [0, 2], 1: [1, 3]}
+
+
+def test_clusters_spanning_categories():
+    index = build_index()
+    assert index.spans_categories(0)
+    assert not index.spans_categories(1)
+    assert not index.spans_categories(4)
+
+
+def test_position_lookup():
+    index = build_index()
+    for i, uri in enumerate(index.uris):
+        assert index.position(uri) == i
+    assert index.cluster_of("s3://b/neutral/missing.jpg") is None
+
+
+def test_position_lookup_checks_uris_on_hash_collisions(monkeypatch):
+    # Every URI collides, so only the URI comparison tells entries apart
+    monkeypatch.setattr(dedup_index, "uri_hash", lambda uri: 42)
+    index = build_index()
+    for i, uri in enumerate(index.uris):
+        assert index.position(uri) == i
+    assert index.position("s3://b/neutral/missing.jpg") is None
+
+
+def test_save_and_load_round_trip(tmp_path):
+    index = build_index()
+    path = tmp_path / "dedup_index.json"
+    index.save(path)
+
+    loaded = DedupIndex.load(path)
+    assert loaded.uris == index.uris
+    assert loaded.etags == index.etags
+    assert list(loaded.cluster_ids) == list(index.cluster_ids)
+    assert list(loaded.perceptual_hashes) == list(index.perceptual_hashes)
+    assert loaded.spans_categories(0)
+    assert loaded.hashes_by_etag()["ed"] == (3, 0x0123456789ABCDEF ^ 0b101)
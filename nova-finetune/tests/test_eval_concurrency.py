@@ -0,0 +1,72 @@
+"""Tests for eval_concurrency.py."""
+
+import eval_concurrency
+from converse_stub import StubConverseClient
+from eval_concurrency import AdaptiveConcurrencyLimiter, ConcurrentEvaluator, is_throttling_error
+
+
+def converse_requests(count):
+    return [{"modelId": "stub-model",
+             "messages": [{"role": "user", "content": [
+                 {"image": {"format": "jpeg", "source": {"s3Location": {
+                     "uri": f"s3://bucket/neutral/neutral_{i:05d}.jpg", "bucketOwner": "0"}}}},
+                 {"text": "Classify this image."}]}]}
+            for i in range(count)]
+
+
+def test_is_throttling_error():
+    class ClientError(Exception):
+        def __init__(self, code):
+            self.response = {"Error": {"Code": code}}
+
+    assert is_throttling_error(ClientError("ThrottlingException"))
+    assert not is_throttling_error(ClientError("ValidationException"))
+    assert not is_throttling_error(ValueError("ThrottlingException"))
+
+
+def test_limit_cut_once_per_round_trip_and_grows_additively():
+    limiter = AdaptiveConcurrencyLimiter(initial=8, max_limit=16)
+    for _ in range(3):
+        limiter.acquire()
+    limiter.release(latency=10.0, throttled=True)
+    limiter.release(latency=10.0, throttled=True)  # Same round trip: no second cut
+    assert limiter.limit == 4
+    assert limiter.throttled == 2
+
+    limiter.release(latency=0.01)
+    assert limiter.limit == 4.25
+
+
+def test_limit_stays_within_bounds():
+    limiter = AdaptiveConcurrencyLimiter(initial=2, min_limit=2, max_limit=3)
+    for _ in range(20):
+        limiter.acquire()
+        limiter.release(latency=0.0)
+    assert limiter.limit == 3
+    limiter.acquire()
+    limiter.release(latency=1.0, throttled=True)
+    assert limiter.limit == 2
+
+
+def test_window_shrinks_under_throttling_and_recovers(monkeypatch):
+    monkeypatch.setattr(eval_concurrency, "BACKOFF_BASE_SECONDS", 0.001)
+    stub = StubConverseClient(latency_ms=5, jitter_ms=0, max_concurrency=2)
+    limiter = AdaptiveConcurrencyLimiter(initial=8, max_limit=8)
+    evaluator = ConcurrentEvaluator(limiter, max_retries=50)
+
+    def call(request):
+        return stub.converse(**request)
+
+    outcomes = list(evaluator.map(call, converse_requests(60)))
+    assert all(outcome["error"] is None for outcome in outcomes)
+    assert stub.throttled > 0
+    assert limiter.throttled == sum(outcome["retries"] for outcome in outcomes)
+    assert limiter.limit <= 4
+    shrunk = limiter.limit
+
+    # Capacity returns: the limit climbs back to its maximum
+    stub.max_concurrency = 8
+    outcomes = list(evaluator.map(call, converse_requests(200)))
+    assert all(outcome["error"] is None and outcome["retries"] == 0 for outcome in outcomes)
+    assert limiter.limit > shrunk
+    assert limiter.limit == 8
@@ -0,0 +1,145 @@
+"""Tests for generate_dataset.py."""
+
+import json
+import random
+from types import SimpleNamespace
+
+import pytest
+
+import generate_dataset
+from generate_dataset import DatasetGenerator, SampleEmitter, merge_sorted_entries
+
+PREFIX = "nova-finetune"
+
+# Keys exercising extension handling and JSON escaping
+EDGE_CASE_KEYS = [
+    "image.PNG",
+    "image.JPEG",
+    'with space/and "quotes".jpg',
+    "back\\slash.png",
+    'quote"and\\backslash\\".jpg',
+    "tab\tand\nnewline.jpg",
+    "unicode_图像_é.png",
+    "emoji_😀.jpg",
+    "control\x01char.jpg",
+    "\x00uri\x00.jpg",
+]
+
+
+@pytest.fixture
+def generator():
+    return DatasetGenerator("bucket", "123456789012", PREFIX)
+
+
+def keys_for(names):
+    categories = generate_dataset.CATEGORIES
+    return [(f"{PREFIX}/{categories[i % len(categories)]}/{name}", categories[i % len(categories)])
+            for i, name in enumerate(names)]
+
+
+def check_identical(generator, keys, seed=42):
+    """Both serialization paths give byte-identical lines for the same seed."""
+    random.seed(seed)
+    expected = [json.dumps(generator.create_conversation_sample(key, category), ensure_ascii=False)
+                for key, category in keys]
+    random.seed(seed)
+    actual = [generator.emitter.emit(key, category) for key, category in keys]
+    assert [line.encode("utf-8") for line in actual] == [line.encode("utf-8") for line in expected]
+
+
+def test_emitter_matches_json_dumps(generator):
+    names = [f"img_{i:05d}{'.png' if i % 3 == 0 else '.jpg'}" for i in range(300)]
+    check_identical(generator, keys_for(names + EDGE_CASE_KEYS))
+
+
+def test_emitter_escapes_special_uris(generator):
+    keys = keys_for(EDGE_CASE_KEYS)
+    for (key, _), line in zip(keys, (generator.emitter.emit(key, category) for key, category in keys)):
+        record = json.loads(line)
+        uri = record["messages"][0]["content"][0]["image"]["source"]["s3Location"]["uri"]
+        assert uri == f"s3://bucket/{key}"
+
+
+def test_emitter_with_placeholder_in_prompt(generator, monkeypatch):
+    monkeypatch.setattr(generate_dataset, "USER_PROMPTS",
+                        [SampleEmitter._URI_PLACEHOLDER, f"Classify {SampleEmitter._URI_PLACEHOLDER}"])
+    generator.emitter = SampleEmitter(generator)
+    check_identical(generator, keys_for(EDGE_CASE_KEYS + ["plain.jpg"] * 20))
+
+
+def entry(key, etag="e"):
+    return [key, etag, "2024-01-01T00:00:00"]
+
+
+def listed(key, etag="e"):
+    return {"Key": key, "ETag": f'"{etag}"'}
+
+
+def test_merge_sorted_entries_joins_by_key():
+    previous = [entry("a"), entry("b"), entry("d", "old")]
+    current = [listed("b"), listed("c"), listed("d", "new"), listed("e")]
+
+    merged = list(merge_sorted_entries(iter(previous), iter(current)))
+
+    assert [key for key, _, _ in merged] == ["a", "b", "c", "d", "e"]
+    assert merged[0] == ("a", previous[0], None)  # Deleted
+    assert merged[1] == ("b", previous[1], current[0])  # Unchanged
+    assert merged[2] == ("c", None, current[1])  # New
+    assert merged[3] == ("d", previous[2], current[2])  # Changed
+    assert merged[4] == ("e", None, current[3])
+
+
+def test_merge_sorted_entries_empty_sides():
+    assert list(merge_sorted_entries(iter([]), iter([]))) == []
+    assert list(merge_sorted_entries(iter([entry("a")]), iter([]))) == [("a", entry("a"), None)]
+    assert list(merge_sorted_entries(iter([]), iter([listed("a")]))) == [("a", None, listed("a"))]
+
+
+def test_merge_sorted_entries_rejects_unsorted_listing():
+    with pytest.raises(ValueError):
+        list(merge_sorted_entries(iter([]), iter([listed("b"), listed("a")])))
+
+
+def test_empty_category_truncates_stale_output(generator, tmp_path, monkeypatch):
+    output_file = tmp_path / "neutral.jsonl"
+    output_file.write_text('{"stale": true}\n', encoding="utf-8")
+    monkeypatch.setattr(generator, "iter_s3_objects_prefetched", lambda category: iter([]))
+
+    assert generator.generate_category_dataset("neutral", output_file) == 0
+
+    assert output_file.read_bytes() == b""
+    footer = generator.manifest_for(output_file).read_footer()
+    assert footer["count"] == 0 and footer["jsonl_size"] == 0
+
+
+def test_failed_generation_keeps_previous_output(generator, tmp_path, monkeypatch):
+    output_file = tmp_path / "neutral.jsonl"
+    output_file.write_text('{"previous": true}\n', encoding="utf-8")
+    manifest = generator.manifest_for(output_file)
+    manifest.path.write_text('{"previous": true}\n', encoding="utf-8")
+
+    def failing_listing(category):
+        yield {"Key": f"{PREFIX}/neutral/a.jpg", "ETag": '"a"', "Size": 1, "LastModified": "x"}
+        raise RuntimeError("listing failed")
+    monkeypatch.setattr(generator, "iter_s3_objects_prefetched", failing_listing)
+
+    with pytest.raises(RuntimeError, match="listing failed"):
+        generator.generate_category_dataset("neutral", output_file)
+
+    assert output_file.read_text(encoding="utf-8") == '{"previous": true}\n'
+    assert manifest.path.read_text(encoding="utf-8") == '{"previous": true}\n'
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["neutral.jsonl", manifest.path.name]
+
+
+def test_preflight_cache_is_saved_when_a_category_fails(generator, tmp_path, monkeypatch):
+    closed = []
+    generator.preflight = SimpleNamespace(write_report=lambda path: None,
+                                          close=lambda: closed.append(True))
+
+    def fail(category, output_file):
+        raise RuntimeError("listing failed")
+    monkeypatch.setattr(generator, "generate_category_dataset", fail)
+
+    with pytest.raises(RuntimeError):
+        generator.generate_all_datasets(tmp_path)
+    assert closed == [True]
@@ -0,0 +1,107 @@
+"""Tests for image_preflight.py."""
+
+import io
+import struct
+import zlib
+
+import pytest
+from botocore.exceptions import ClientError, EndpointConnectionError
+
+import image_preflight
+from image_preflight import ImagePreflight, check_image_header
+
+
+def png(width, height):
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+    return (b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", struct.pack(">IIBBBBB", width, height, 8, 0, 0, 0, 0))
+            + chunk(b"IDAT", zlib.compress(bytes(width + 1) * height)) + chunk(b"IEND", b""))
+
+
+class FakeS3:
+    """get_object that fails with the queued errors before returning the body."""
+
+    def __init__(self, body, errors=()):
+        self.body = body
+        self.errors = list(errors)
+        self.calls = 0
+
+    def get_object(self, Bucket, Key, Range=None):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return {"Body": io.BytesIO(self.body)}
+
+
+def client_error(code, status=400):
+    return ClientError({"Error": {"Code": code, "Message": code},
+                        "ResponseMetadata": {"HTTPStatusCode": status}}, "GetObject")
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(image_preflight, "PREFLIGHT_BACKOFF_SECONDS", 0)
+
+
+def checker(tmp_path, s3):
+    return ImagePreflight(s3, "bucket", tmp_path / "preflight_cache.json", max_workers=2)
+
+
+def listed(body, etag="etag1"):
+    return {"Key": "nova-finetune/neutral/a.png", "ETag": f'"{etag}"', "Size": len(body)}
+
+
+def test_check_image_header_limits():
+    assert check_image_header(png(16, 16), 1000)["ok"]
+    assert check_image_header(png(9000, 10), 1000)["reason"].startswith("dimensions")
+    assert check_image_header(b"GIF89a" + bytes(100), 10)["reason"].startswith("object too small")
+    assert check_image_header(b"not an image" * 10, 1000)["format"] is None
+
+
+def test_transient_errors_are_retried(tmp_path):
+    body = png(16, 16)
+    s3 = FakeS3(body, [client_error("SlowDown", 503), EndpointConnectionError(endpoint_url="s3")])
+    preflight = checker(tmp_path, s3)
+
+    [result] = preflight.check_many([listed(body)])
+
+    assert result["ok"] and s3.calls == 3
+    assert "etag1" in preflight.cache
+
+
+def test_persistent_s3_errors_raise_and_are_not_cached(tmp_path):
+    body = png(16, 16)
+    s3 = FakeS3(body, [client_error("InternalError", 500)] * (image_preflight.PREFLIGHT_RETRIES + 1))
+    preflight = checker(tmp_path, s3)
+
+    with pytest.raises(ClientError):
+        preflight.check_many([listed(body)])
+    assert preflight.cache == {}
+
+
+def test_access_errors_are_not_retried(tmp_path):
+    body = png(16, 16)
+    s3 = FakeS3(body, [client_error("AccessDenied", 403)])
+    with pytest.raises(ClientError):
+        checker(tmp_path, s3).check_many([listed(body)])
+    assert s3.calls == 1
+
+
+def test_missing_object_is_rejected_without_caching(tmp_path):
+    body = png(16, 16)
+    preflight = checker(tmp_path, FakeS3(body, [client_error("NoSuchKey", 404)]))
+
+    [result] = preflight.check_many([listed(body)])
+
+    assert not result["ok"]
+    assert preflight.cache == {}
+
+
+def test_content_rejects_are_cached(tmp_path):
+    body = b"\x89PNG\r\n\x1a\n" + bytes(100)  # PNG magic without an IHDR chunk
+    preflight = checker(tmp_path, FakeS3(body))
+
+    [result] = preflight.check_many([listed(body)])
+
+    assert not result["ok"] and "corrupt png" in result["reason"]
+    assert preflight.cache["etag1"] == result
@@ -0,0 +1,84 @@
+"""Tests for nova_eval.py."""
+
+from converse_stub import StubConverseClient
+from nova_eval import NovaProTester, bedrock_runtime_client
+
+
+def test_runtime_client_leaves_retries_to_the_limiter():
+    client = bedrock_runtime_client(max_concurrency=48)
+    assert client.meta.config.retries["total_max_attempts"] == 1
+    assert client.meta.config.max_pool_connections == 48
+
+
+SYSTEM = "You are a content moderation classifier that determines if an image is porn, sexy, or neutral."
+PROMPT = "Classify this image into one of the categories: porn, sexy, neutral. Reply only porn, sexy, or neutral"
+IMAGE_URI = "s3://bucket/nova-finetune/porn/porn_00001.jpg"
+CACHE_POINT = {"cachePoint": {"type": "default"}}
+
+
+def sent_request(mode, min_tokens=0):
+    """Send one request through the stub and return (request received, response)."""
+    stub = StubConverseClient(latency_ms=1, jitter_ms=0)
+    tester = NovaProTester(client=stub, prompt_cache=mode, prompt_cache_min_tokens=min_tokens)
+    response = tester.converse_response(tester.build_converse_request("jpeg", IMAGE_URI, PROMPT, SYSTEM))
+    return stub.requests[-1], response
+
+
+def layout(request):
+    return [next(iter(block)) for block in request["messages"][0]["content"]]
+
+
+def test_no_cache_points_when_off():
+    request, response = sent_request("off")
+    assert request["system"] == [{"text": SYSTEM}]
+    assert layout(request) == ["image", "text"]
+    assert "cacheReadInputTokens" not in response["usage"]
+
+
+def test_system_mode_caches_after_system_prompt():
+    request, response = sent_request("system")
+    assert request["system"] == [{"text": SYSTEM}, CACHE_POINT]
+    assert layout(request) == ["image", "text"]
+    assert response["usage"]["cacheWriteInputTokens"] > 0
+
+
+def test_prompt_mode_caches_system_and_user_prompt():
+    request, response = sent_request("prompt")
+    assert request["system"] == [{"text": SYSTEM}, CACHE_POINT]
+    assert request["messages"][0]["content"][:2] == [{"text": PROMPT}, CACHE_POINT]
+    assert layout(request) == ["text", "cachePoint", "image"]
+    # Both prefixes written: the system prompt and the system plus user prompt
+    assert response["usage"]["cacheWriteInputTokens"] == len(SYSTEM) // 4 + len(PROMPT) // 4
+
+
+def test_short_prefixes_get_no_cache_point(capsys):
+    request, _ = sent_request("prompt", min_tokens=1000)
+    assert request["system"] == [{"text": SYSTEM}]
+    assert layout(request) == ["image", "text"]
+    assert "below the 1000-token prompt cache minimum" in capsys.readouterr().out
+
+
+def test_prompt_mode_skips_only_the_short_system_checkpoint():
+    # The system prompt alone is about 23 tokens; with the user prompt about 50
+    request, _ = sent_request("prompt", min_tokens=40)
+    assert request["system"] == [{"text": SYSTEM}]
+    assert layout(request) == ["text", "cachePoint", "image"]
+
+
+def test_repeated_requests_read_the_cached_prefix():
+    stub = StubConverseClient(latency_ms=1, jitter_ms=0)
+    tester = NovaProTester(client=stub, prompt_cache="system", prompt_cache_min_tokens=0)
+    usages = [tester.converse_response(tester.build_converse_request(
+        "jpeg", f"s3://bucket/neutral/neutral_{i}.jpg", PROMPT, SYSTEM))["usage"] for i in range(3)]
+    assert [usage["cacheReadInputTokens"] for usage in usages] == [0, len(SYSTEM) // 4, len(SYSTEM) // 4]
+    assert [usage["cacheWriteInputTokens"] for usage in usages] == [len(SYSTEM) // 4, 0, 0]
+
+
+def test_longest_cache_prefix_follows_the_mode():
+    item = {"system": [{"text": SYSTEM}], "messages": [{"role": "user", "content": [
+        {"image": {"format": "jpeg", "source": {"s3Location": {"uri": IMAGE_URI}}}},
+        {"text": PROMPT}]}, {"role": "assistant", "content": [{"text": "porn"}]}]}
+    system = NovaProTester(client=object(), prompt_cache="system")
+    prompt = NovaProTester(client=object(), prompt_cache="prompt")
+    assert system.longest_cache_prefix([item]) == len(SYSTEM) // 4
+    assert prompt.longest_cache_prefix([item]) == len(SYSTEM + PROMPT) // 4
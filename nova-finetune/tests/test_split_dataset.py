@@ -0,0 +1,63 @@
+"""Tests for split_dataset.py hash assignment."""
+
+from dedup_index import DedupIndex
+from split_dataset import DatasetSplitter
+
+URIS = [f"s3://bucket/nova-finetune/neutral/neutral_{i:06d}.jpg" for i in range(20000)]
+
+
+def hash_splitter(**kwargs):
+    return DatasetSplitter(assignment="hash", sample_size=1000, train_size=700,
+                           validation_size=50, **kwargs)
+
+
+def test_assignment_follows_ratios():
+    splitter = hash_splitter()
+    counts = [0, 0, 0]
+    for uri in URIS:
+        counts[splitter.assign_split(uri)] += 1
+    assert abs(counts[0] / len(URIS) - 0.70) < 0.02
+    assert abs(counts[1] / len(URIS) - 0.05) < 0.01
+    assert abs(counts[2] / len(URIS) - 0.25) < 0.02
+
+
+def test_assignment_is_stable_and_independent_of_other_records():
+    first = [hash_splitter().assign_split(uri) for uri in URIS[:500]]
+    # A different splitter instance, queried in reverse order
+    second = hash_splitter()
+    assert [second.assign_split(uri) for uri in reversed(URIS[:500])] == first[::-1]
+
+
+def test_assignment_depends_on_seed():
+    a = [hash_splitter(random_seed=1).assign_split(uri) for uri in URIS[:500]]
+    b = [hash_splitter(random_seed=2).assign_split(uri) for uri in URIS[:500]]
+    assert a != b
+
+
+def test_hash_point_range():
+    splitter = hash_splitter()
+    points = [splitter.hash_point(uri) for uri in URIS[:1000]]
+    assert all(0 <= point < 1 for point in points)
+
+
+def test_sample_rate_drops_records_consistently():
+    full = hash_splitter()
+    sampled = hash_splitter(hash_sample_rate=0.5)
+    kept = [uri for uri in URIS if sampled.assign_split(uri) is not None]
+    assert abs(len(kept) / len(URIS) - 0.5) < 0.02
+    # Lowering the rate only removes records; it never adds new ones
+    smaller = hash_splitter(hash_sample_rate=0.25)
+    assert {uri for uri in URIS if smaller.assign_split(uri) is not None} <= set(kept)
+    assert all(full.assign_split(uri) is not None for uri in URIS[:100])
+
+
+def test_duplicate_cluster_shares_a_split():
+    index = DedupIndex(["neutral"])
+    for i, uri in enumerate(URIS[:200]):
+        # Every block of 10 consecutive images is one exact-duplicate cluster
+        index.add(uri, f"e{i}", "neutral", content_hash=i // 10,
+                  perceptual_hash=i * 0x9E3779B97F4A7C15 % 2 ** 64)
+    index.build_clusters(threshold=0)
+    splitter = hash_splitter(dedup_index=index)
+    for start in range(0, 200, 10):
+        assert len({splitter.assign_split(uri) for uri in URIS[start:start + 10]}) == 1
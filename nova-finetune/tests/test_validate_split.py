@@ -0,0 +1,31 @@
+"""Tests for validate_split.py."""
+
+import gzip
+import hashlib
+
+import pytest
+
+from validate_split import SplitVerifier
+
+LINE = ('{"schemaVersion": "bedrock-conversation-2024", "system": [{"text": "Classify."}], '
+        '"messages": [{"role": "user", "content": [{"image": {"format": "jpeg", "source": '
+        '{"s3Location": {"uri": "s3://bucket/neutral/%d.jpg", "bucketOwner": "123456789012"}}}}, '
+        '{"text": "Label this image."}]}, {"role": "assistant", "content": [{"text": "neutral"}]}]}\n')
+
+
+@pytest.mark.parametrize("name, compress", [("train.jsonl", bytes), ("train-00000.jsonl.gz", gzip.compress)])
+def test_scan_shard_checksums_raw_bytes_in_the_same_pass(tmp_path, name, compress):
+    path = tmp_path / name
+    path.write_bytes(compress("".join(LINE % i for i in range(5)).encode("utf-8")))
+    sha256 = hashlib.sha256(path.read_bytes()).hexdigest()
+
+    result = SplitVerifier(["neutral"]).scan_shard(path, "train", set(), sha256)
+    assert result["sha256"] == sha256
+    assert result["records"] == 5 and result["errors"] == 0
+    assert result["categories"] == {"neutral": 5}
+
+
+def test_scan_shard_skips_the_checksum_without_a_manifest_entry(tmp_path):
+    path = tmp_path / "train.jsonl"
+    path.write_text(LINE % 0, encoding="utf-8")
+    assert SplitVerifier(["neutral"]).scan_shard(path, "train", set(), None)["sha256"] is None
@@ -0,0 +1,68 @@
+"""Tests for validation_cache.py."""
+
+import os
+
+from validation_cache import FINGERPRINT_BLOCK, FINGERPRINT_SAMPLES, ValidationCache, file_fingerprint
+
+LINE = b'{"image": "s3://bucket/neutral/neutral_00001.jpg", "label": "neutral"}\n'
+
+
+def write_lines(path, count):
+    path.write_bytes(LINE * count)
+
+
+def cached(tmp_path, path):
+    cache = ValidationCache(tmp_path / "cache.json")
+    cache.store(path, "key", {"valid": True}, path.stat())
+    return cache
+
+
+def test_unchanged_file_is_answered_from_the_cache(tmp_path):
+    path = tmp_path / "data.jsonl"
+    write_lines(path, 10)
+    cache = cached(tmp_path, path)
+    assert cache.lookup(path, "key") == {"result": {"valid": True}, "offset": len(LINE) * 10}
+    assert cache.lookup(path, "other key") is None
+
+
+def test_appended_file_resumes_after_the_cached_prefix(tmp_path):
+    path = tmp_path / "data.jsonl"
+    write_lines(path, 10)
+    cache = cached(tmp_path, path)
+    with open(path, 'ab') as f:
+        f.write(LINE)
+    assert cache.lookup(path, "key")["offset"] == len(LINE) * 10
+
+
+def test_replaced_file_is_validated_from_the_start(tmp_path):
+    path = tmp_path / "data.jsonl"
+    write_lines(path, 10)
+    cache = cached(tmp_path, path)
+    replacement = tmp_path / "new.jsonl"
+    write_lines(replacement, 11)
+    os.replace(replacement, path)
+    assert cache.lookup(path, "key") is None
+
+
+def test_fingerprint_samples_the_middle_of_large_files(tmp_path):
+    path = tmp_path / "data.jsonl"
+    length = FINGERPRINT_BLOCK * FINGERPRINT_SAMPLES * 3
+    path.write_bytes(b"x" * length)
+    before = file_fingerprint(path, length)
+    with open(path, 'r+b') as f:
+        # Inside the block sampled just past the middle
+        f.seek((length - FINGERPRINT_BLOCK) * (FINGERPRINT_SAMPLES // 2) // (FINGERPRINT_SAMPLES - 1) + 1)
+        f.write(b"y")
+    assert file_fingerprint(path, length) != before
+
+
+def test_edit_inside_an_appended_prefix_is_detected(tmp_path):
+    path = tmp_path / "data.jsonl"
+    write_lines(path, 10)
+    cache = cached(tmp_path, path)
+    with open(path, 'r+b') as f:
+        f.seek(len(LINE) * 5)
+        f.write(b'[')
+    with open(path, 'ab') as f:
+        f.write(LINE)
+    assert cache.lookup(path, "key") is None
@@ -1,70 +1,270 @@
 #!/usr/bin/env python3
 """
 Validate the generated JSONL dataset files.
+
+Every record is checked against the full bedrock-conversation-2024 schema
+(see conversation_schema.py): role alternation, content blocks, image format,
+S3 URI, bucket owner and the label.
+
+Files are split into byte-range chunks aligned on newlines and validated in a
+process pool. Counters from all chunks are merged, and only a capped number of
+error samples (with their line numbers) is printed per file.
 """
 
+import argparse
 import json
+import os
+from collections import Counter
+from concurrent.futures import Executor, ProcessPoolExecutor
 from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from conversation_schema import (DEFAULT_CATEGORIES, IMAGE_FORMATS,
+                                 compile_line_validator)
+from validation_cache import VALIDATION_CACHE_FILE, ValidationCache
+
+CHUNK_SIZE = 64 * 1024 * 1024  # Bytes per validation chunk
+MAX_ERROR_SAMPLES = 20  # Error lines printed per file
+
+
+def find_chunks(file_path: Path, chunk_size: int = CHUNK_SIZE, start: int = 0,
+                size: Optional[int] = None) -> List[Tuple[int, int]]:
+    """
+    Split a file into byte ranges that start and end on line boundaries.
+
+    Args:
+        file_path: File to split
+        chunk_size: Target chunk size in bytes
+        start: Offset to start from (at a line boundary)
+        size: Offset to stop at; defaults to the file size
+
+    Returns:
+        List of (start, end) byte offsets
+    """
+    if size is None:
+        size = file_path.stat().st_size
+    chunks = []
+    with open(file_path, 'rb') as f:
+        while start < size:
+            end = min(start + chunk_size, size)
+            if end < size:
+                f.seek(end)
+                f.readline()
+                end = min(f.tell(), size)
+            chunks.append((start, end))
+            start = end
+    return chunks
+
+
+def validate_chunk(file_path: str, start: int, end: int,
+                   max_errors: int = MAX_ERROR_SAMPLES,
+                   schema: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Validate the lines in one byte range of a file.
+
+    Args:
+        file_path: File to validate
+        start: Start offset (at a line boundary)
+        end: End offset (at a line boundary)
+        max_errors: Max error samples to keep
+        schema: Keyword arguments for compile_line_validator()
+
+    Returns:
+        Dictionary with line count, valid count, error counts by message
+        type and error samples as (chunk-local line number, message)
+    """
+    lines = valid = 0
+    error_counts: Counter = Counter()
+    error_samples: List[Tuple[int, str]] = []
+    schema = schema or {}
+    validate_line = compile_line_validator(**schema)
+
+    with open(file_path, 'rb') as f:
+        f.seek(start)
+        position = start
+        while position < end:
+            line = f.readline()
+            if not line:
+                break
+            position += len(line)
+            lines += 1
+
+            try:
+                error = validate_line(line.decode('utf-8'))
+            except UnicodeDecodeError as e:
+                error = f"Encoding error - {e}"
+            if error is None:
+                valid += 1
+                continue
+
+            error_counts[error.split(' - ')[0]] += 1
+            if len(error_samples) < max_errors:
+                error_samples.append((lines, error))
+
+    return {"lines": lines, "valid": valid,
+            "error_counts": error_counts, "error_samples": error_samples}
+
 
+def merge_results(results: List[Dict[str, Any]], max_errors: int) -> Dict[str, Any]:
+    """
+    Merge consecutive chunk results into one result for the whole range.
 
-def validate_jsonl_file(file_path: Path):
+    Args:
+        results: Chunk results in file order
+        max_errors: Max error samples to keep
+
+    Returns:
+        Merged result with line numbers relative to the first chunk
+    """
+    merged = {"lines": 0, "valid": 0, "error_counts": Counter(), "error_samples": []}
+    for result in results:
+        # Chunk-local line numbers continue from the lines before the chunk
+        for local_line, error in result["error_samples"]:
+            if len(merged["error_samples"]) < max_errors:
+                merged["error_samples"].append((merged["lines"] + local_line, error))
+        merged["lines"] += result["lines"]
+        merged["valid"] += result["valid"]
+        merged["error_counts"].update(result["error_counts"])
+    return merged
+
+
+def cache_key(max_errors: int, schema: Optional[Dict[str, Any]]) -> str:
+    """Build the validation cache key for a validator configuration."""
+    return json.dumps({"validator": "validate_dataset", "max_errors": max_errors,
+                       "schema": schema or {}}, sort_keys=True)
+
+
+def validate_jsonl_file(file_path: Path, executor: Optional[Executor] = None,
+                        chunk_size: int = CHUNK_SIZE,
+                        max_errors: int = MAX_ERROR_SAMPLES,
+                        schema: Optional[Dict[str, Any]] = None,
+                        cache: Optional[ValidationCache] = None):
     """Validate a JSONL file."""
     print(f"\nValidating {file_path.name}...")
 
-    valid_count = 0
-    total_count = 0
-
     try:
-        with open(file_path, 'r', encoding='utf-8') as f:
-            for line_num, line in enumerate(f, 1):
-                total_count += 1
-                try:
-                    # Parse JSON
-                    data = json.loads(line.strip())
-
-                    # Basic validation
-                    required_fields = ['schemaVersion', 'system', 'messages']
-                    if all(field in data for field in required_fields):
-                        if data['schemaVersion'] == 'bedrock-conversation-2024':
-                            valid_count += 1
-                        else:
-                            print(f"  Line {line_num}: Invalid schema version")
-                    else:
-                        print(f"  Line {line_num}: Missing required fields")
-
-                except json.JSONDecodeError as e:
-                    print(f"  Line {line_num}: JSON decode error - {e}")
+        stat = file_path.stat()
+        key = cache_key(max_errors, schema)
+        cached = cache.lookup(file_path, key) if cache is not None else None
+        start = cached["offset"] if cached is not None else 0
+
+        chunks = find_chunks(file_path, chunk_size, start, stat.st_size)
+        if executor is None or len(chunks) <= 1:
+            results = [validate_chunk(str(file_path), start, end, max_errors, schema)
+                       for start, end in chunks]
+        else:
+            futures = [executor.submit(validate_chunk, str(file_path), start, end,
+                                       max_errors, schema)
+                       for start, end in chunks]
+            results = [future.result() for future in futures]
 
     except Exception as e:
         print(f"Error reading {file_path}: {e}")
         return 0, 0
 
+    if cached is not None:
+        if chunks:
+            print(f"  Cached up to byte {start}, validating appended "
+                  f"{stat.st_size - start} bytes")
+        else:
+            print("  Unchanged since last validation (cached)")
+        results.insert(0, cached["result"])
+
+    result = merge_results(results, max_errors)
+    if cache is not None and (chunks or cached is None):
+        cache.store(file_path, key, result, stat)
+
+    for line_number, error in result["error_samples"]:
+        print(f"  Line {line_number}: {error}")
+
+    valid_count = result["valid"]
+    total_count = result["lines"]
+    invalid_count = total_count - valid_count
+    if invalid_count > len(result["error_samples"]):
+        print(f"  ... {invalid_count - len(result['error_samples'])} more invalid line(s) not shown")
+    for error, count in Counter(result["error_counts"]).most_common():
+        print(f"  {error}: {count}")
+
     print(f"  Valid samples: {valid_count}/{total_count}")
     return valid_count, total_count
 
 
+def collect_jsonl_files(paths: List[str]) -> List[Path]:
+    """Expand files and directories into a sorted list of JSONL files."""
+    files = set()
+    for path in map(Path, paths):
+        if path.is_dir():
+            files.update(path.glob('*.jsonl'))
+        elif path.exists():
+            files.add(path)
+        else:
+            print(f"Not found: {path}")
+    return sorted(files)
+
+
 def main():
     """Main validation function."""
+    parser = argparse.ArgumentParser(
+        description="Validate JSONL dataset files in parallel")
+    parser.add_argument("paths", nargs="*", default=["."],
+                        help="JSONL files or directories to scan for *.jsonl (default: current directory)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1,
+                        help="Worker processes (default: number of CPUs)")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE,
+                        help=f"Bytes per validation chunk (default: {CHUNK_SIZE})")
+    parser.add_argument("--max-errors", type=int, default=MAX_ERROR_SAMPLES,
+                        help=f"Error lines printed per file (default: {MAX_ERROR_SAMPLES})")
+    parser.add_argument("--categories", nargs="+", default=list(DEFAULT_CATEGORIES),
+                        help="Allowed assistant labels (default: %(default)s)")
+    parser.add_argument("--image-formats", nargs="+", default=list(IMAGE_FORMATS),
+                        help="Allowed image formats (default: %(default)s)")
+    parser.add_argument("--bucket-owner", default=None,
+                        help="Required bucketOwner account ID (default: any non-empty value)")
+    parser.add_argument("--no-fast-path", action="store_true",
+                        help="Always parse with json.loads instead of trying the canonical-layout regex")
+    parser.add_argument("--cache-file", default=VALIDATION_CACHE_FILE,
+                        help=f"Validation result cache (default: {VALIDATION_CACHE_FILE})")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Validate every file from the start and do not update the cache; the cache "
+                             "trusts size, mtime, inode and sampled blocks, so use this after "
+                             "in-place edits that keep the size")
+    args = parser.parse_args()
+
     print("Dataset Validation Report")
     print("=" * 30)
 
-    jsonl_files = list(Path('.').glob('*.jsonl'))
+    jsonl_files = collect_jsonl_files(args.paths)
 
     if not jsonl_files:
         print("No JSONL files found!")
         return
 
+    schema = {
+        "categories": tuple(args.categories),
+        "image_formats": tuple(args.image_formats),
+        "bucket_owner": args.bucket_owner,
+        "fast_path": not args.no_fast_path
+    }
+
+    cache = None if args.no_cache else ValidationCache(Path(args.cache_file))
+
     total_valid = 0
     total_samples = 0
 
-    for file_path in sorted(jsonl_files):
-        valid, total = validate_jsonl_file(file_path)
-        total_valid += valid
-        total_samples += total
+    with ProcessPoolExecutor(max_workers=max(1, args.workers)) as executor:
+        for file_path in jsonl_files:
+            valid, total = validate_jsonl_file(
+                file_path, executor, args.chunk_size, args.max_errors, schema, cache)
+            total_valid += valid
+            total_samples += total
+
+    if cache is not None:
+        cache.save()
 
-    print(f"\nOverall Summary:")
+    print("\nOverall Summary:")
     print(f"Total valid samples: {total_valid}/{total_samples}")
-    print(f"Success rate: {(total_valid/total_samples)*100:.1f}%")
+    if total_samples:
+        print(f"Success rate: {(total_valid/total_samples)*100:.1f}%")
 
 
 if __name__ == "__main__":
@@ -1,123 +1,431 @@
 #!/usr/bin/env python3
 """
 Validate the split dataset files to ensure correct distribution and format.
+
+The splits are streamed once, shard by shard, using the split manifest written
+by split_dataset.py (or <split>.jsonl files and the splitter defaults when no
+manifest exists). The pass checks record counts, category distribution,
+schema, shard checksums, exact image-URI leakage between splits and, when a
+dedup index is available, duplicate-cluster leakage.
+
+Leakage is tracked with 64-bit URI hashes: an exact set by default, or a
+fixed-size Bloom filter for splits with many millions of records.
 """
 
-import json
+import argparse
+import hashlib
+import math
+import sys
+from collections import Counter, defaultdict
+from contextlib import nullcontext
 from pathlib import Path
-from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+from conversation_schema import compile_line_validator
+from dedup_index import DEDUP_INDEX_FILE, DedupIndex, uri_hash
+from shard_writer import SPLIT_MANIFEST_FILE, HashingReader, load_split_manifest, open_shard
+from split_dataset import (CATEGORIES, SAMPLE_SIZE_PER_CATEGORY, SPLIT_NAMES,
+                           TRAIN_SIZE_PER_CATEGORY, VALIDATION_SIZE_PER_CATEGORY,
+                           extract_image_uri_fast, extract_label_fast)
+from validation_cache import VALIDATION_CACHE_FILE, ValidationCache
+
+SPLIT_DIR = Path("train_dataset")
+LEAKAGE_MODES = ("exact", "bloom")
+BLOOM_ERROR_RATE = 1e-6
+BYTES_PER_RECORD_ESTIMATE = 256  # Sizes the Bloom filter when no manifest is available
+MAX_REPORTED = 10  # Leaks and errors printed per check
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings, using double hashing."""
+
+    def __init__(self, capacity: int, error_rate: float = BLOOM_ERROR_RATE):
+        """
+        Initialize an empty filter.
+
+        Args:
+            capacity: Expected number of items
+            error_rate: Target false-positive rate at capacity
+        """
+        capacity = max(1, capacity)
+        self.num_bits = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+
+    def _positions(self, item: str):
+        digest = hashlib.blake2b(item.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    def add(self, item: str):
+        """Add an item."""
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item: str) -> bool:
+        return all(self.bits[position >> 3] & (1 << (position & 7))
+                   for position in self._positions(item))
+
+    def update(self, other: 'BloomFilter'):
+        """Add every item of a filter with the same size and hash count."""
+        merged = int.from_bytes(self.bits, 'little') | int.from_bytes(other.bits, 'little')
+        self.bits = bytearray(merged.to_bytes(len(self.bits), 'little'))
+
+
+def expected_split_counts(config: Dict[str, Any]) -> Optional[Dict[str, Dict[str, int]]]:
+    """
+    Derive the exact per-category split sizes from a splitter configuration.
+
+    Args:
+        config: Splitter configuration (split manifest "config")
+
+    Returns:
+        Split name -> category -> expected count, or None when the
+        configuration only fixes ratios (hash assignment, dedup grouping)
+    """
+    if config.get("assignment", "shuffle") != "shuffle" or config.get("dedup_index"):
+        return None
+    test_size = config["sample_size"] - config["train_size"] - config["validation_size"]
+    sizes = {"train": config["train_size"], "validation": config["validation_size"],
+             "test": test_size}
+    return {split: {category: size for category in config["categories"]}
+            for split, size in sizes.items()}
+
+
+class SplitVerifier:
+    """Single-pass verifier for a set of train/validation/test splits."""
+
+    def __init__(self, categories: List[str], leakage: str = "exact",
+                 capacity: int = 0, dedup_index: Optional[DedupIndex] = None,
+                 cache: Optional[ValidationCache] = None):
+        """
+        Initialize verifier.
+
+        Args:
+            categories: Allowed category labels
+            leakage: exact (set of URI hashes) or bloom (Bloom filter)
+            capacity: Expected total records, used to size the Bloom filter
+            dedup_index: Optional dedup index for cluster leakage
+            cache: Optional cache of per-shard schema and category results
+        """
+        if leakage not in LEAKAGE_MODES:
+            raise ValueError(f"Unknown leakage mode: {leakage}")
+        self.categories = categories
+        self.leakage = leakage
+        self.capacity = capacity
+        self.dedup_index = dedup_index
+        self.cache = cache
+        self.validate_line = compile_line_validator(tuple(categories))
+        self.cache_key = f"validate_split|{','.join(categories)}"
+
+        # URI hashes (exact) or filter (bloom) of the splits already scanned
+        self.previous = set() if leakage == "exact" else BloomFilter(capacity)
+        self.leaks: List[Tuple[str, str]] = []
+        self.leak_count = 0
+        self.cluster_splits: Dict[int, set] = defaultdict(set)
+        self.stats: Dict[str, Dict[str, Any]] = {}
+
+    def scan_shard(self, path: Path, split_name: str, current,
+                   expected_sha256: Optional[str]) -> Dict[str, Any]:
+        """
+        Stream one shard: schema and labels (unless cached), URIs always.
+
+        Args:
+            path: Shard path
+            split_name: Split the shard belongs to
+            current: URI hash set or Bloom filter of the split being scanned
+            expected_sha256: Checksum recorded in the manifest, if any
+
+        Returns:
+            Shard result with records, categories, errors and checksum status
+        """
+        stat = path.stat()
+        cached = self.cache.lookup(path, self.cache_key) if self.cache is not None else None
+        if cached is not None and cached["offset"] != stat.st_size:
+            # Shards are rewritten, not appended to
+            cached = None
+        result = cached["result"] if cached is not None else {
+            "records": 0, "categories": {}, "errors": 0, "error_samples": [], "sha256": None}
+
+        categories = Counter()
+        exact = self.leakage == "exact"
+        # The checksum is taken from the raw bytes in the same pass as the lines
+        hashing = cached is None and expected_sha256
+        with (HashingReader(path) if hashing else nullcontext()) as raw, open_shard(path, raw) as f:
+            for line_number, line in enumerate(f, 1):
+                line = line.rstrip('\n')
+                if cached is None:
+                    result["records"] += 1
+                    error = self.validate_line(line)
+                    if error is not None:
+                        result["errors"] += 1
+                        if len(result["error_samples"]) < MAX_REPORTED:
+                            result["error_samples"].append((line_number, error))
+                    categories[extract_label_fast(line)] += 1
+
+                uri = extract_image_uri_fast(line)
+                if uri is None:
+                    continue
+                key = uri_hash(uri) if exact else uri
+                if key in self.previous:
+                    self.leak_count += 1
+                    if len(self.leaks) < MAX_REPORTED:
+                        self.leaks.append((uri, split_name))
+                current.add(key)
+
+                if self.dedup_index is not None:
+                    cluster = self.dedup_index.cluster_of(uri)
+                    if cluster is not None:
+                        self.cluster_splits[cluster].add(split_name)
+
+        if cached is None:
+            if hashing:
+                result["sha256"] = raw.sha256.hexdigest()
+            result["categories"] = {str(label): count for label, count in categories.items()}
+            if self.cache is not None:
+                self.cache.store(path, self.cache_key, result, stat)
+        return result
+
+    def scan_split(self, split_name: str, shards: List[Tuple[Path, Optional[Dict[str, Any]]]]):
+        """
+        Stream every shard of a split and record its statistics.
+
+        Args:
+            split_name: Split name
+            shards: (path, manifest shard entry or None) in shard order
+        """
+        current = set() if self.leakage == "exact" else BloomFilter(self.capacity)
+        stats = {"records": 0, "categories": Counter(), "errors": 0, "error_samples": [],
+                 "missing": [], "mismatched": []}
 
+        for path, entry in shards:
+            if not path.exists():
+                stats["missing"].append(path.name)
+                continue
+            try:
+                result = self.scan_shard(path, split_name, current,
+                                         entry.get("sha256") if entry else None)
+            except Exception as e:
+                stats["mismatched"].append(f"{path.name}: error reading shard: {e}")
+                continue
+            stats["records"] += result["records"]
+            stats["categories"].update(result["categories"])
+            stats["errors"] += result["errors"]
+            for line_number, error in result["error_samples"]:
+                if len(stats["error_samples"]) < MAX_REPORTED:
+                    stats["error_samples"].append((path.name, line_number, error))
+
+            if entry is not None:
+                if entry.get("sha256") and result["sha256"] != entry["sha256"]:
+                    stats["mismatched"].append(f"{path.name}: checksum differs from manifest")
+                if result["records"] != entry["records"]:
+                    stats["mismatched"].append(
+                        f"{path.name}: {result['records']} records, manifest says {entry['records']}")
+
+        self.previous.update(current)
+        self.stats[split_name] = stats
+
+    def report(self, expected: Optional[Dict[str, Dict[str, int]]],
+               manifest_splits: Optional[Dict[str, Any]] = None) -> bool:
+        """
+        Print the per-split and cross-split results.
+
+        Args:
+            expected: Split -> category -> exact expected count, or None
+            manifest_splits: Split entries of the manifest, if one was used
+
+        Returns:
+            True if every check passed
+        """
+        passed = True
+        totals = Counter()
+
+        for split_name, stats in self.stats.items():
+            print(f"\n{split_name.capitalize()} Dataset:")
+            for name in stats["missing"]:
+                print(f"  ❌ Shard not found: {name}")
+                passed = False
+            for problem in stats["mismatched"]:
+                print(f"  ❌ {problem}")
+                passed = False
+
+            records = stats["records"]
+            if expected is not None:
+                expected_total = sum(expected[split_name].values())
+            elif manifest_splits is not None:
+                expected_total = manifest_splits[split_name]["records"]
+            else:
+                expected_total = None
+            if expected_total is None:
+                print(f"  📄 Record count: {records}")
+            elif records == expected_total:
+                print(f"  ✅ Record count: {records}/{expected_total}")
+            else:
+                print(f"  ❌ Record count: {records}/{expected_total}")
+                passed = False
+
+            print("  📊 Category distribution:")
+            for category in self.categories:
+                count = stats["categories"].get(category, 0)
+                share = f" ({count / records:.1%})" if records else ""
+                if expected is not None:
+                    target = expected[split_name][category]
+                    status = "✅" if count == target else "❌"
+                    passed &= count == target
+                    print(f"     {category}: {count}/{target}{share} {status}")
+                else:
+                    print(f"     {category}: {count}{share}")
+
+            valid = records - stats["errors"]
+            print(f"  {'✅' if stats['errors'] == 0 else '❌'} Valid schema: {valid}/{records}")
+            for name, line_number, error in stats["error_samples"]:
+                print(f"     {name} line {line_number}: {error}")
+            passed &= stats["errors"] == 0
+            totals.update(stats["categories"])
+
+        print(f"\nURI Leakage Check ({self.leakage}):")
+        if self.leak_count:
+            qualifier = "" if self.leakage == "exact" else " (possible; Bloom filter false positives)"
+            print(f"  ❌ {self.leak_count} record(s) reuse an image from an earlier split{qualifier}")
+            for uri, split_name in self.leaks:
+                print(f"     {uri} (in {split_name})")
+            passed = False
+        else:
+            print("  ✅ No image URI appears in more than one split")
+
+        if self.dedup_index is not None:
+            print(f"\nDuplicate Leakage Check ({len(self.dedup_index)} indexed images):")
+            leaking = {cluster: names for cluster, names in self.cluster_splits.items()
+                       if len(names) > 1}
+            if leaking:
+                print(f"  ❌ {len(leaking)} duplicate cluster(s) appear in several splits")
+                for cluster, names in list(leaking.items())[:MAX_REPORTED]:
+                    print(f"     {self.dedup_index.uris[cluster]}: {', '.join(sorted(names))}")
+                passed = False
+            else:
+                print("  ✅ No duplicate cluster appears in more than one split")
+
+        print("\n" + "=" * 40)
+        print("Overall Summary:")
+        print(f"Total records: {sum(stats['records'] for stats in self.stats.values())}")
+        print("Overall category distribution:")
+        for category in self.categories:
+            print(f"  {category}: {totals.get(category, 0)}")
+
+        return passed
 
-def validate_split_files():
-    """Validate the split dataset files."""
+
+def validate_split_files(split_dir: Path = SPLIT_DIR, config: Optional[Dict[str, Any]] = None,
+                         leakage: str = "exact", bloom_capacity: Optional[int] = None,
+                         dedup_index_file: Path = Path(DEDUP_INDEX_FILE),
+                         cache: Optional[ValidationCache] = None) -> bool:
+    """
+    Validate the split dataset files.
+
+    Args:
+        split_dir: Directory with the split shards (and split_manifest.json)
+        config: Splitter configuration used when there is no manifest
+        leakage: URI leakage tracking, exact or bloom
+        bloom_capacity: Bloom filter capacity; estimated when omitted
+        dedup_index_file: Dedup index for cluster leakage, used if it exists
+        cache: Optional cache of per-shard results
+
+    Returns:
+        True if every check passed
+    """
     print("Split Dataset Validation Report")
     print("=" * 40)
 
-    # File paths
-    train_file = Path("train_dataset/train.jsonl")
-    validation_file = Path("train_dataset/validation.jsonl")
-    test_file = Path("train_dataset/test.jsonl")
-
-    files_info = [
-        ("Train", train_file, 300),
-        ("Validation", validation_file, 60),
-        ("Test", test_file, 240)
-    ]
-
-    total_records = 0
-    all_categories = []
-
-    for dataset_name, file_path, expected_count in files_info:
-        print(f"\n{dataset_name} Dataset ({file_path}):")
-
-        if not file_path.exists():
-            print(f"  ❌ File not found!")
-            continue
-
-        # Load and count records
-        records = []
-        categories = []
-
-        try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                for line_num, line in enumerate(f, 1):
-                    try:
-                        record = json.loads(line.strip())
-                        records.append(record)
-
-                        # Extract category from assistant response
-                        category = record['messages'][1]['content'][0]['text']
-                        categories.append(category)
-
-                    except (json.JSONDecodeError, KeyError, IndexError) as e:
-                        print(f"  ⚠️  Error in line {line_num}: {e}")
-
-        except Exception as e:
-            print(f"  ❌ Error reading file: {e}")
-            continue
-
-        # Validate count
-        actual_count = len(records)
-        if actual_count == expected_count:
-            print(f"  ✅ Record count: {actual_count}/{expected_count}")
+    manifest_path = split_dir / SPLIT_MANIFEST_FILE
+    manifest_splits = None
+    if manifest_path.exists():
+        manifest = load_split_manifest(manifest_path)
+        config = manifest["config"]
+        manifest_splits = manifest["splits"]
+        split_shards = {split: [(split_dir / shard["file"], shard) for shard in entry["shards"]]
+                        for split, entry in manifest_splits.items()}
+        capacity = sum(entry["records"] for entry in manifest_splits.values())
+        print(f"Using split manifest {manifest_path} (created {manifest['created']})")
+    else:
+        split_shards = {split: [(split_dir / f"{split}.jsonl", None)] for split in SPLIT_NAMES}
+        capacity = sum(path.stat().st_size // BYTES_PER_RECORD_ESTIMATE
+                       for shards in split_shards.values() for path, _ in shards if path.exists())
+        print(f"No split manifest in {split_dir}; using the split configuration")
+
+    expected = expected_split_counts(config)
+    if expected is None:
+        if config.get("assignment", "shuffle") != "shuffle":
+            reason = f"Assignment '{config['assignment']}' fixes ratios only"
         else:
-            print(f"  ❌ Record count: {actual_count}/{expected_count}")
-
-        # Validate category distribution
-        category_counts = Counter(categories)
-        print(f"  📊 Category distribution:")
-        for category in ['neutral', 'porn', 'sexy']:
-            count = category_counts.get(category, 0)
-            print(f"     {category}: {count}")
-
-        # Validate format
-        valid_format = 0
-        for record in records:
-            try:
-                if (record.get('schemaVersion') == 'bedrock-conversation-2024' and
-                        'system' in record and 'messages' in record):
-                    valid_format += 1
-            except:
-                pass
-
-        print(f"  ✅ Valid format: {valid_format}/{actual_count}")
-
-        total_records += actual_count
-        all_categories.extend(categories)
-
-    # Overall summary
-    print(f"\n" + "=" * 40)
-    print(f"Overall Summary:")
-    print(f"Total records: {total_records}")
-    print(f"Expected total: 600")
-
-    overall_category_counts = Counter(all_categories)
-    print(f"Overall category distribution:")
-    for category in ['neutral', 'porn', 'sexy']:
-        count = overall_category_counts.get(category, 0)
-        print(f"  {category}: {count}")
-
-    # Expected distribution check
-    expected_dist = {
-        'neutral': 200,  # 100 + 20 + 80
-        'porn': 200,     # 100 + 20 + 80
-        'sexy': 200      # 100 + 20 + 80
-    }
+            reason = "Dedup grouping moves whole duplicate clusters between splits"
+        check = "checking counts against the manifest" if manifest_splits is not None \
+            else "reporting counts without checking them"
+        print(f"{reason}; {check}")
+
+    dedup_index = None
+    if dedup_index_file.exists():
+        dedup_index = DedupIndex.load(dedup_index_file)
 
-    print(f"\nExpected vs Actual Distribution:")
-    all_correct = True
-    for category, expected in expected_dist.items():
-        actual = overall_category_counts.get(category, 0)
-        status = "✅" if actual == expected else "❌"
-        print(f"  {category}: {actual}/{expected} {status}")
-        if actual != expected:
-            all_correct = False
-
-    if all_correct and total_records == 600:
-        print(f"\n🎉 All validations passed! Dataset split is correct.")
+    verifier = SplitVerifier(config["categories"], leakage, bloom_capacity or capacity,
+                             dedup_index, cache)
+    for split_name, shards in split_shards.items():
+        verifier.scan_split(split_name, shards)
+
+    passed = verifier.report(expected, manifest_splits)
+    if cache is not None:
+        cache.save()
+
+    if passed:
+        print("\n🎉 All validations passed! Dataset split is correct.")
     else:
-        print(f"\n⚠️  Some validations failed. Please check the results above.")
+        print("\n⚠️  Some validations failed. Please check the results above.")
+    return passed
+
+
+def main():
+    """Main validation function."""
+    parser = argparse.ArgumentParser(
+        description="Validate split dataset counts, distribution, schema and leakage in one pass")
+    parser.add_argument("--split-dir", type=str, default=str(SPLIT_DIR),
+                        help=f"Directory holding the splits (default: {SPLIT_DIR})")
+    parser.add_argument("--categories", type=str, default=",".join(CATEGORIES),
+                        help="Comma-separated categories, used without a split manifest")
+    parser.add_argument("--sample-size", type=int, default=SAMPLE_SIZE_PER_CATEGORY,
+                        help="Records per category, used without a split manifest")
+    parser.add_argument("--train-size", type=int, default=TRAIN_SIZE_PER_CATEGORY,
+                        help="Training records per category, used without a split manifest")
+    parser.add_argument("--validation-size", type=int, default=VALIDATION_SIZE_PER_CATEGORY,
+                        help="Validation records per category, used without a split manifest")
+    parser.add_argument("--leakage", choices=LEAKAGE_MODES, default="exact",
+                        help="exact: set of 64-bit URI hashes; bloom: fixed-size Bloom filter "
+                             "for very large splits (default: exact)")
+    parser.add_argument("--bloom-capacity", type=int, default=None,
+                        help="Bloom filter capacity (default: total records)")
+    parser.add_argument("--dedup-index", type=str, default=DEDUP_INDEX_FILE,
+                        help=f"Dedup index for cluster leakage, used if present (default: {DEDUP_INDEX_FILE})")
+    parser.add_argument("--cache-file", default=VALIDATION_CACHE_FILE,
+                        help=f"Validation result cache (default: {VALIDATION_CACHE_FILE})")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="Re-check every shard and do not update the cache; the cache trusts size, "
+                             "mtime, inode and sampled blocks, so use this after in-place edits "
+                             "that keep the size")
+    args = parser.parse_args()
+
+    config = {
+        "categories": [category.strip() for category in args.categories.split(",")
+                       if category.strip()],
+        "sample_size": args.sample_size,
+        "train_size": args.train_size,
+        "validation_size": args.validation_size,
+        "assignment": "shuffle"
+    }
+    cache = None if args.no_cache else ValidationCache(Path(args.cache_file))
+
+    passed = validate_split_files(Path(args.split_dir), config, args.leakage,
+                                  args.bloom_capacity, Path(args.dedup_index), cache)
+    sys.exit(0 if passed else 1)
 
 
 if __name__ == "__main__":
-    validate_split_files()
+    main()
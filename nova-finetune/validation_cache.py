@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+"""
+Per-file cache of validation results.
+
+Entries are keyed by the absolute file path and a validator configuration
+key, and store the file size, modification time, inode and a fast content
+fingerprint of the validated bytes. An unchanged file (same size, mtime and
+inode) is answered from the cache after re-checking the fingerprint. When a
+file has only grown and its validated prefix still has the same
+fingerprint, the cached result is returned together with the offset where
+validation should resume, so append-only files only have their new tail
+validated.
+
+The fingerprint hashes the length plus FINGERPRINT_SAMPLES blocks spread
+evenly across the prefix (the whole prefix when it is small), so it costs a
+bounded number of small reads regardless of file size. The trade-off: an
+in-place edit that keeps the size and falls between sampled blocks is only
+caught by the mtime and inode checks, and an edit that also restores the
+mtime goes unnoticed. Run the validators with --no-cache after such edits.
+"""
+
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+VALIDATION_CACHE_FILE = ".validation_cache.json"
+FINGERPRINT_BLOCK = 64 * 1024  # Bytes hashed per sampled block
+FINGERPRINT_SAMPLES = 32  # Blocks sampled across the prefix, first and last included
+
+
+def file_fingerprint(path: Path, length: int) -> str:
+    """
+    Hash the first `length` bytes of a file by sampling blocks across them.
+
+    Args:
+        path: File path
+        length: Prefix length to fingerprint
+
+    Returns:
+        Hex digest
+    """
+    digest = hashlib.blake2b(str(length).encode(), digest_size=16)
+    with open(path, 'rb') as f:
+        if length <= FINGERPRINT_BLOCK * FINGERPRINT_SAMPLES:
+            digest.update(f.read(length))
+            return digest.hexdigest()
+        span = length - FINGERPRINT_BLOCK
+        for i in range(FINGERPRINT_SAMPLES):
+            f.seek(span * i // (FINGERPRINT_SAMPLES - 1))
+            digest.update(f.read(FINGERPRINT_BLOCK))
+    return digest.hexdigest()
+
+
+def ends_with_newline(path: Path, size: int) -> bool:
+    """Return True if the file is empty or its last byte is a newline."""
+    if size == 0:
+        return True
+    with open(path, 'rb') as f:
+        f.seek(size - 1)
+        return f.read(1) == b'\n'
+
+
+class ValidationCache:
+    """JSON-backed cache of per-file validation results."""
+
+    def __init__(self, cache_file: Path = Path(VALIDATION_CACHE_FILE)):
+        """
+        Initialize cache.
+
+        Args:
+            cache_file: JSON file holding the cached entries
+        """
+        self.cache_file = cache_file
+        self.entries: Dict[str, Dict[str, Any]] = self._load()
+        self.dirty = False
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        """Load cached entries."""
+        if not self.cache_file.exists():
+            return {}
+        try:
+            with open(self.cache_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Ignoring unreadable validation cache {self.cache_file}: {e}")
+            return {}
+
+    @staticmethod
+    def _entry_key(path: Path, key: str) -> str:
+        return f"{path.resolve()}|{key}"
+
+    def lookup(self, path: Path, key: str) -> Optional[Dict[str, Any]]:
+        """
+        Find a usable cached result for a file.
+
+        Args:
+            path: Validated file
+            key: Validator configuration key
+
+        Returns:
+            Dictionary with the cached "result" and the "offset" up to which it
+            is valid (equal to the file size for an unchanged file), or None
+            if the file must be validated from the start
+        """
+        entry = self.entries.get(self._entry_key(path, key))
+        if entry is None:
+            return None
+
+        stat = path.stat()
+        offset = entry["offset"]
+        # A replaced file (new inode) is validated from the start, even if it grew
+        if stat.st_ino != entry.get("inode"):
+            return None
+        if stat.st_size == offset:
+            if stat.st_mtime_ns != entry["mtime_ns"]:
+                return None
+        elif stat.st_size < offset or not entry["appendable"]:
+            return None
+
+        if file_fingerprint(path, offset) != entry["fingerprint"]:
+            return None
+        return {"result": entry["result"], "offset": offset}
+
+    def store(self, path: Path, key: str, result: Dict[str, Any], stat: os.stat_result):
+        """
+        Cache the result of validating a file.
+
+        Args:
+            path: Validated file
+            key: Validator configuration key
+            result: JSON-serializable validation result
+            stat: File status taken before validation; the result covers
+                the first stat.st_size bytes
+        """
+        self.entries[self._entry_key(path, key)] = {
+            "offset": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "inode": stat.st_ino,
+            "fingerprint": file_fingerprint(path, stat.st_size),
+            # A trailing partial line may still be growing, so never resume mid-line
+            "appendable": ends_with_newline(path, stat.st_size),
+            "result": result
+        }
+        self.dirty = True
+
+    def save(self):
+        """Atomically write the cache if it changed."""
+        if not self.dirty:
+            return
+        tmp_file = self.cache_file.with_name(self.cache_file.name + '.tmp')
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(self.entries, f, separators=(',', ':'))
+        os.replace(tmp_file, self.cache_file)
+        self.dirty = False